@@ -5,31 +5,97 @@ from dataclasses import dataclass
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.typing import ConfigType
 
-from custom_components.delayed_charging.coordinator import ElectricityPriceCoordinator
+from custom_components.delayed_charging.api import async_register_api
+from custom_components.delayed_charging.arbitrage import Battery
+from custom_components.delayed_charging.coordinator import (
+    BatteryCoordinator,
+    ElectricityPriceCoordinator,
+    PriceCoordinatorRegistry,
+)
+from custom_components.delayed_charging.services import async_setup_services
 
-from .const import DOMAIN
+from .const import (
+    CONF_BATTERY_CAPACITY,
+    CONF_BATTERY_EFFICIENCY,
+    CONF_BATTERY_POWER,
+    CONF_BATTERY_SOC_ENTITY,
+    CONF_COUNTRY_ID,
+    DEFAULT_BATTERY_CAPACITY,
+    DEFAULT_BATTERY_EFFICIENCY,
+    DEFAULT_BATTERY_POWER,
+    DEFAULT_COUNTRY_ID,
+    DOMAIN,
+)
 
 PLATFORMS = [Platform.SENSOR, Platform.BINARY_SENSOR]
 
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)  # pyright: ignore[reportUnknownMemberType, reportUnknownVariableType]
 
-async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+
+@dataclass
+class DelayedChargingRuntimeData:
+    coordinator: ElectricityPriceCoordinator
+    battery: BatteryCoordinator | None = None
+
+
+type DelayedChargingConfigEntry = ConfigEntry[DelayedChargingRuntimeData]
+
+
+def get_registry(hass: HomeAssistant) -> PriceCoordinatorRegistry:
+    """Return the coordinator registry shared by all config entries of this hass instance."""
+    if DOMAIN not in hass.data:
+        hass.data[DOMAIN] = PriceCoordinatorRegistry(hass)
+    return hass.data[DOMAIN]
+
+
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Set up the service actions and the price API of Delayed Charging."""
+    get_registry(hass)
+    async_setup_services(hass)
+    async_register_api(hass)
+    return True
+
+
+async def async_setup_entry(hass: HomeAssistant, entry: DelayedChargingConfigEntry) -> bool:
     """Set up Delayed Charging from a config entry."""
-    hass.data.setdefault(DOMAIN, {})
-    hass.data[DOMAIN][entry.entry_id] = entry.data
+    country_id = entry.options.get(CONF_COUNTRY_ID, DEFAULT_COUNTRY_ID)
+
+    # Entries of the same bidding zone share one coordinator, so SMARD is polled once per zone.
+    registry = get_registry(hass)
+    coordinator = await registry.async_acquire(country_id, entry.entry_id)
+    entry.runtime_data = DelayedChargingRuntimeData(coordinator=coordinator)
+
+    try:
+        capacity = entry.options.get(CONF_BATTERY_CAPACITY, DEFAULT_BATTERY_CAPACITY)
+        if capacity > 0:
+            power = entry.options.get(CONF_BATTERY_POWER, DEFAULT_BATTERY_POWER)
+            battery = BatteryCoordinator(
+                hass,
+                entry,
+                coordinator,
+                Battery(capacity, power, power, entry.options.get(CONF_BATTERY_EFFICIENCY, DEFAULT_BATTERY_EFFICIENCY)),
+                entry.options.get(CONF_BATTERY_SOC_ENTITY),
+            )
+            # a failing optimization only makes the battery sensors unavailable
+            await battery.async_refresh()
+            battery.async_start()
+            entry.runtime_data.battery = battery
 
-    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+        await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    except Exception:
+        # a failed setup is never unloaded, so the shared coordinator would keep polling for it
+        await registry.async_release(country_id, entry.entry_id)
+        raise
     return True
 
 
-async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+async def async_unload_entry(hass: HomeAssistant, entry: DelayedChargingConfigEntry) -> bool:
     """Unload a config entry."""
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        coordinator = entry.runtime_data.coordinator
+        await get_registry(hass).async_release(coordinator.country_id, entry.entry_id)
     return unload_ok
-
-
-@dataclass
-class DelayedChargingRuntimeData:
-    coordinator: ElectricityPriceCoordinator
@@ -0,0 +1,137 @@
+"""WebSocket command and HTTP view serving price ranges of a bidding zone on demand."""
+
+from http import HTTPStatus
+from typing import Any, cast
+
+import numpy as np
+import numpy.typing as npt
+import voluptuous as vol
+from aiohttp import web
+from homeassistant.components.websocket_api import async_register_command
+from homeassistant.components.websocket_api.connection import ActiveConnection
+from homeassistant.components.websocket_api.const import ERR_INVALID_FORMAT
+from homeassistant.components.websocket_api.decorators import async_response, websocket_command
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.http import KEY_HASS, HomeAssistantView
+
+from custom_components.delayed_charging.const import DOMAIN
+from custom_components.delayed_charging.coordinator import PriceCoordinatorRegistry
+from custom_components.delayed_charging.service import RESOLUTION_MS, PriceSeries, day_ranges, lttb
+from custom_components.delayed_charging.smard import SMARD_COUNTRIES
+from custom_components.delayed_charging.store import PriceStore, merged_range
+
+WS_TYPE_PRICES = f"{DOMAIN}/prices"
+RESOLUTIONS = ("quarterhour", "hour", "day")
+DEFAULT_LIMIT = 2000
+MAX_LIMIT = 10000
+
+QUERY_SCHEMA = {
+    vol.Required("country_id"): vol.In(SMARD_COUNTRIES),
+    vol.Required("start"): vol.Coerce(int),
+    vol.Required("end"): vol.Coerce(int),
+    vol.Optional("resolution", default="quarterhour"): vol.In(RESOLUTIONS),
+    vol.Optional("max_points", default=0): vol.All(vol.Coerce(int), vol.Any(0, vol.Range(min=3, max=MAX_LIMIT))),
+    vol.Optional("limit", default=DEFAULT_LIMIT): vol.All(vol.Coerce(int), vol.Range(min=1, max=MAX_LIMIT)),
+}
+
+
+def _resample(
+    timestamps: npt.NDArray[np.int64], prices: npt.NDArray[np.float64], resolution: str
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float64]]:
+    """Average the prices per slot of `resolution`; days start at local midnight."""
+    if not len(timestamps):
+        return timestamps, prices
+    if resolution == "day":
+        days = day_ranges(timestamps.tolist())
+        starts: npt.NDArray[np.intp] = np.array([lo for lo, _ in days], dtype=np.intp)
+        return timestamps[starts], np.add.reduceat(prices, starts) / np.diff([*starts, len(prices)])
+    keys = timestamps - timestamps % RESOLUTION_MS[resolution]
+    buckets, inverse = cast(tuple[npt.NDArray[np.int64], npt.NDArray[np.intp]], np.unique(keys, return_inverse=True))
+    return buckets, np.bincount(inverse, weights=prices) / np.bincount(inverse)
+
+
+def query_prices(
+    series: PriceSeries | None,
+    store: PriceStore | None,
+    start: int,
+    end: int,
+    resolution: str = "quarterhour",
+    max_points: int = 0,
+    limit: int = DEFAULT_LIMIT,
+) -> dict[str, Any]:
+    """Return the prices of `[start, end)` (epoch ms) as compact arrays, one page at a time.
+
+    Slots come from the on-disk history and the coordinator's in-memory series and are averaged to
+    `resolution`. With `max_points`, the whole range is downsampled by LTTB into a single response;
+    otherwise at most `limit` slots are returned and `next_start` is where the next page starts (None
+    on the last one). Reads memory-mapped columns and is CPU bound, so run it in an executor.
+    """
+    if start >= end:
+        raise ValueError("The range must start before it ends.")
+    timestamps, prices = _resample(*merged_range(series, store, start, end), resolution)
+    next_start = None
+    if max_points and len(timestamps) > max_points:
+        indexes = lttb(timestamps, prices, max_points)
+        timestamps, prices = timestamps[indexes], prices[indexes]
+    elif len(timestamps) > limit:
+        next_start = int(timestamps[limit])
+        timestamps, prices = timestamps[:limit], prices[:limit]
+    return {
+        "resolution": resolution,
+        "timestamps": timestamps.tolist(),
+        "prices": prices.tolist(),
+        "next_start": next_start,
+    }
+
+
+async def _async_query(hass: HomeAssistant, query: dict[str, Any]) -> dict[str, Any]:
+    registry: PriceCoordinatorRegistry = hass.data[DOMAIN]
+    country_id = query["country_id"]
+    coordinator = registry.get(country_id)
+    store = registry.open_store(country_id)
+    result = await hass.async_add_executor_job(
+        query_prices,
+        coordinator.data if coordinator is not None else None,
+        store,
+        query["start"],
+        query["end"],
+        query["resolution"],
+        query["max_points"],
+        query["limit"],
+    )
+    return {"country_id": country_id, **result}
+
+
+@websocket_command({vol.Required("type"): WS_TYPE_PRICES, **QUERY_SCHEMA})
+@async_response
+async def websocket_prices(hass: HomeAssistant, connection: ActiveConnection, msg: dict[str, Any]) -> None:
+    """Send the prices of a bidding zone and range."""
+    try:
+        result = await _async_query(hass, msg)
+    except ValueError as err:
+        connection.send_error(msg["id"], ERR_INVALID_FORMAT, str(err))
+        return
+    connection.send_result(msg["id"], result)
+
+
+class PricesView(HomeAssistantView):
+    """Prices of a bidding zone, e.g. `GET /api/delayed_charging/prices/4169?start=...&end=...&resolution=hour`."""
+
+    url = f"/api/{DOMAIN}/prices/{{country_id}}"
+    name = f"api:{DOMAIN}:prices"
+
+    async def get(self, request: web.Request, country_id: str) -> web.Response:
+        try:
+            query = cast(dict[str, Any], vol.Schema(QUERY_SCHEMA)({**request.query, "country_id": country_id}))
+            result = await _async_query(request.app[KEY_HASS], query)
+        except (vol.Invalid, ValueError) as err:
+            return self.json_message(str(err), HTTPStatus.BAD_REQUEST)
+        return self.json(result)
+
+
+@callback
+def async_register_api(hass: HomeAssistant) -> None:
+    """Register the websocket command and, if the HTTP server is set up, the view."""
+    async_register_command(hass, websocket_prices)
+    if "http" in hass.config.components:
+        hass.http.register_view(PricesView)
@@ -0,0 +1,141 @@
+"""Charge and discharge schedules of a stationary battery trading on the spot price."""
+
+import datetime
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+
+from custom_components.delayed_charging.service import SYSTEM_TZ, PriceSeries, dt2ts, ts2dt
+
+
+@dataclass(frozen=True)
+class Battery:
+    """Usable `capacity` (kWh), power limits at the grid side (kW) and one-way `efficiency`.
+
+    The state of charge is discretized into `soc_steps` equal steps; finer steps give better schedules
+    at a quadratic cost.
+    """
+
+    capacity: float
+    charge_power: float
+    discharge_power: float
+    efficiency: float = 0.95
+    soc_steps: int = 100
+
+
+@dataclass
+class ArbitrageSchedule:
+    """Grid power (kW, positive when charging) per slot and the state of charge (kWh) after it."""
+
+    timestamps: npt.NDArray[np.int64]
+    power: npt.NDArray[np.float64]
+    soc: npt.NDArray[np.float64]
+    resolution_ms: int
+    cost: float
+
+    @property
+    def profit(self) -> float:
+        """Earnings (€) compared to leaving the battery idle."""
+        return -self.cost
+
+    def index_at(self, ts: int) -> int | None:
+        """Return the index of the slot covering `ts` (epoch ms), if any."""
+        i = int(np.searchsorted(self.timestamps, ts, side="right")) - 1
+        if i < 0 or ts >= self.timestamps[i] + self.resolution_ms:
+            return None
+        return i
+
+    def power_at(self, ts: int) -> float | None:
+        """Return the planned grid power of the slot covering `ts` (epoch ms)."""
+        i = self.index_at(ts)
+        return float(self.power[i]) if i is not None else None
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "cost": self.cost,
+            "profit": self.profit,
+            "slots": [
+                {"start": ts2dt(int(ts)).isoformat(), "power": round(float(power), 3), "soc": round(float(soc), 3)}
+                for ts, power, soc in zip(self.timestamps, self.power, self.soc, strict=True)
+            ],
+        }
+
+
+# €/kWh of throughput, only to prefer idling among equally priced schedules
+_TIE_BREAK = 1e-9
+
+
+def _grid_energy(battery: Battery, hours: float) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.bool_]]:
+    """Grid energy (kWh) of going from one SoC step to another within a slot and whether the power limits allow it."""
+    step = battery.capacity / battery.soc_steps
+    levels = np.arange(battery.soc_steps + 1)
+    stored = (levels[None, :] - levels[:, None]) * step
+    grid = np.where(stored > 0, stored / battery.efficiency, stored * battery.efficiency)
+    feasible = (grid <= battery.charge_power * hours + 1e-9) & (-grid <= battery.discharge_power * hours + 1e-9)
+    return grid, feasible
+
+
+def optimize_battery(
+    timeseries: PriceSeries,
+    battery: Battery,
+    soc: float,
+    horizon: datetime.timedelta = datetime.timedelta(hours=48),
+    final_soc: float | None = None,
+    now: datetime.datetime | None = None,
+) -> ArbitrageSchedule:
+    """Return the cost-optimal schedule from the current slot on, buying and selling at the spot price.
+
+    A dynamic program over slots × SoC steps, vectorized over the SoC: going backwards, the cost of each
+    state is the cheapest transition into the next slot's states, i.e. one (S × S) NumPy minimum per
+    slot. 48 hours of quarter hours with 100 steps take about 10 ms. `soc` is the current and
+    `final_soc` (default: the current) the minimum state of charge at the end, both in kWh.
+
+    The DP assumes consecutive slots, so the schedule ends at the first gap in the series (e.g. prices
+    that are not published yet).
+    """
+    if battery.capacity <= 0 or battery.soc_steps < 1 or not 0 < battery.efficiency <= 1:
+        raise ValueError("Capacity, SoC steps and efficiency must be positive, efficiency at most 1.")
+    if final_soc is not None and final_soc > battery.capacity:
+        raise ValueError("The final state of charge exceeds the capacity.")
+    timestamps = np.asarray(timeseries.timestamps, dtype=np.int64)
+    prices = np.asarray(timeseries.prices, dtype=np.float64)
+    start_ts = dt2ts(now if now is not None else datetime.datetime.now(SYSTEM_TZ))
+    # the first slot that has not ended yet
+    lo = int(np.searchsorted(timestamps, start_ts - timeseries.resolution_ms, side="right"))
+    hi = max(int(np.searchsorted(timestamps, start_ts + horizon.total_seconds() * 1000, side="left")), lo)
+    timestamps, prices = timestamps[lo:hi], prices[lo:hi]
+    gaps = np.flatnonzero(np.diff(timestamps) != timeseries.resolution_ms)
+    if len(gaps):
+        timestamps, prices = timestamps[: gaps[0] + 1], prices[: gaps[0] + 1]
+
+    step = battery.capacity / battery.soc_steps
+    initial = int(round(min(max(soc, 0.0), battery.capacity) / step))
+    final = initial if final_soc is None else int(np.ceil(min(max(final_soc, 0.0), battery.capacity) / step - 1e-9))
+    grid, feasible = _grid_energy(battery, timeseries.resolution_ms / 3_600_000)
+    infeasible = np.where(feasible, _TIE_BREAK * np.abs(grid), np.inf)
+
+    # cost-to-go per state and the best next state per slot and state
+    value = np.where(np.arange(battery.soc_steps + 1) >= final, 0.0, np.inf)
+    policy = np.empty((len(prices), battery.soc_steps + 1), dtype=np.int32)
+    for t in range(len(prices) - 1, -1, -1):
+        total = grid * (prices[t] / 1000) + infeasible + value[None, :]
+        policy[t] = np.argmin(total, axis=1)
+        value = np.take_along_axis(total, policy[t][:, None], axis=1)[:, 0]
+    if not np.isfinite(value[initial]):
+        raise ValueError("The final state of charge cannot be reached within the horizon.")
+
+    states = np.empty(len(prices) + 1, dtype=np.int32)
+    states[0] = initial
+    for t in range(len(prices)):
+        states[t + 1] = policy[t, states[t]]
+    energy = grid[states[:-1], states[1:]] if len(prices) else np.empty(0)
+    cost = float(np.sum(energy * prices / 1000)) if len(prices) else 0.0
+    return ArbitrageSchedule(
+        timestamps=timestamps,
+        power=energy / (timeseries.resolution_ms / 3_600_000),
+        soc=(states[1:] * step).astype(np.float64),
+        resolution_ms=timeseries.resolution_ms,
+        cost=cost,
+    )
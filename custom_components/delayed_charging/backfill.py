@@ -0,0 +1,121 @@
+"""Download the price history of SMARD bidding zones."""
+
+import asyncio
+import datetime
+import logging
+import os
+from dataclasses import dataclass, field
+
+import aiohttp
+
+from custom_components.delayed_charging.service import dt2ts
+from custom_components.delayed_charging.smard import (
+    REQUEST_TIMEOUT,
+    SMARD_BASE_URL,
+    SMARD_COUNTRIES,
+    SmardError,
+    chunk_url,
+    find_chunks,
+    get_index,
+    get_session,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+RESOLUTIONS = ("quarterhour", "hour")
+
+
+@dataclass
+class BackfillResult:
+    downloaded: list[int] = field(default_factory=list[int])
+    skipped: list[int] = field(default_factory=list[int])
+    failed: dict[int, Exception] = field(default_factory=dict[int, Exception])
+
+
+def chunk_path(directory: str, country_id: str, resolution: str, chunk_ts: int) -> str:
+    return os.path.join(directory, country_id, resolution, f"{chunk_ts}.json")
+
+
+def _write_atomically(path: str, body: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "wb") as file:
+        file.write(body)
+    os.replace(f"{path}.tmp", path)
+
+
+async def list_chunks(
+    country_id: str,
+    start: datetime.datetime,
+    end: datetime.datetime,
+    resolution: str = "quarterhour",
+    session: aiohttp.ClientSession | None = None,
+    base_url: str = SMARD_BASE_URL,
+) -> list[int]:
+    """List the start timestamps (epoch ms) of all chunks covering `[start, end)`."""
+    timestamps = await get_index(session or get_session(), country_id, resolution=resolution, base_url=base_url)
+    return find_chunks(timestamps, dt2ts(start), dt2ts(end))
+
+
+async def backfill(
+    country_id: str,
+    start: datetime.datetime,
+    end: datetime.datetime,
+    directory: str,
+    resolution: str = "quarterhour",
+    session: aiohttp.ClientSession | None = None,
+    max_concurrency: int = 4,
+    base_url: str = SMARD_BASE_URL,
+) -> BackfillResult:
+    """Download all chunks covering `[start, end)` to `directory`, one SMARD JSON file per chunk.
+
+    At most `max_concurrency` chunks are downloaded at the same time. Chunks already on disk are
+    skipped, except the latest one, which SMARD keeps extending. Files are only moved into place once
+    complete, so running an interrupted backfill again resumes where it stopped.
+    """
+    if country_id not in SMARD_COUNTRIES:
+        raise SmardError(f"Country ID {country_id} not supported.")
+    if resolution not in RESOLUTIONS:
+        raise SmardError(f"Resolution {resolution} not supported.")
+    if session is None:
+        session = get_session()
+
+    timestamps = await get_index(session, country_id, resolution=resolution, base_url=base_url)
+    if not timestamps:
+        raise SmardError("No timestamps found in response.")
+    latest = timestamps[-1]
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    result = BackfillResult()
+
+    async def download(chunk_ts: int) -> None:
+        path = chunk_path(directory, country_id, resolution, chunk_ts)
+        if chunk_ts != latest and await loop.run_in_executor(None, os.path.exists, path):
+            result.skipped.append(chunk_ts)
+            return
+        async with semaphore:
+            try:
+                async with session.get(
+                    chunk_url(country_id, chunk_ts, resolution, base_url), timeout=REQUEST_TIMEOUT
+                ) as response:
+                    response.raise_for_status()
+                    body = await response.read()
+            except (aiohttp.ClientError, TimeoutError) as e:
+                _LOGGER.warning("Error downloading chunk %s of %s from SMARD: %s", chunk_ts, country_id, e)
+                result.failed[chunk_ts] = e
+                return
+        await loop.run_in_executor(None, _write_atomically, path, body)
+        result.downloaded.append(chunk_ts)
+
+    await asyncio.gather(*(download(chunk_ts) for chunk_ts in find_chunks(timestamps, dt2ts(start), dt2ts(end))))
+    result.downloaded.sort()
+    result.skipped.sort()
+    _LOGGER.info(
+        "Backfill of %s (%s): %d downloaded, %d skipped, %d failed",
+        country_id,
+        resolution,
+        len(result.downloaded),
+        len(result.skipped),
+        len(result.failed),
+    )
+    return result
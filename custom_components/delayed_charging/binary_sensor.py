@@ -1,5 +1,4 @@
 from functools import cached_property
-from typing import cast
 
 from homeassistant.components.binary_sensor import (
     BinarySensorDeviceClass,
@@ -10,23 +9,22 @@ from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
-from custom_components.delayed_charging.const import DEFAULT_THRESH
+from custom_components.delayed_charging import DelayedChargingConfigEntry
 from custom_components.delayed_charging.coordinator import ElectricityPriceCoordinator
-from custom_components.delayed_charging.service import delayed_charging_is_active_today
+from custom_components.delayed_charging.service import delayed_charging_is_active_today, get_threshold, today_range
 
 
 async def async_setup_entry(
     hass: HomeAssistant,
-    config_entry: ConfigEntry,
+    config_entry: DelayedChargingConfigEntry,
     async_add_entities: AddEntitiesCallback,
 ):
-    coordinator = ElectricityPriceCoordinator(hass, config_entry)
+    coordinator = config_entry.runtime_data.coordinator
     async_add_entities(
         [
-            DelayedChargingActive(coordinator),
+            DelayedChargingActive(coordinator, config_entry),
         ]
     )
-    await coordinator.async_config_entry_first_refresh()
 
 
 class DelayedChargingActive(  # type: ignore[override]
@@ -36,12 +34,13 @@ class DelayedChargingActive(  # type: ignore[override]
     def __init__(
         self,
         coordinator: ElectricityPriceCoordinator,
+        config_entry: ConfigEntry,
         name: str = "Delayed Charging Active",
     ):
         super().__init__(coordinator)
         self._name = name
         self._attr_is_on = None
-        self._config_entry = cast(ConfigEntry, coordinator.config_entry)
+        self._config_entry = config_entry
 
     @cached_property
     def name(self):
@@ -55,9 +54,17 @@ class DelayedChargingActive(  # type: ignore[override]
     def device_class(self):
         return BinarySensorDeviceClass.POWER
 
+    async def async_added_to_hass(self) -> None:
+        """Populate the state from the already refreshed coordinator."""
+        await super().async_added_to_hass()
+        self._handle_coordinator_update()
+
     @callback
     def _handle_coordinator_update(self) -> None:
         """Handle updated data from the coordinator."""
-        threshold = self._config_entry.options.get("threshold", DEFAULT_THRESH)
-        self._attr_is_on = delayed_charging_is_active_today(self.coordinator.data, threshold)
+        # a relative threshold refers to today's slots, not to those of the lookback; as some of them are
+        # always below it, the delay is active while one of them is still ahead
+        series = self.coordinator.data
+        threshold = get_threshold(series, self._config_entry.options, *today_range(series))
+        self._attr_is_on = delayed_charging_is_active_today(series, threshold, today_only=True, upcoming=True)
         self.async_write_ha_state()
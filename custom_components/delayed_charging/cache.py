@@ -0,0 +1,130 @@
+"""Persistent cache for SMARD chart data files."""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any
+
+_LOGGER = logging.getLogger(__name__)
+
+# (country_id, resolution, chunk_ts); chunk_ts is None for the index file
+type CacheKey = tuple[str, str, int | None]
+
+# Chunks cover one week; once they are a day past their end they are not revised anymore.
+CHUNK_SETTLED_AFTER = timedelta(days=8)
+
+
+@dataclass
+class CacheEntry:
+    data: dict[str, Any]
+    fetched_at: float
+    etag: str | None = None
+    last_modified: str | None = None
+
+
+class SmardCache:
+    """LRU cache of decoded SMARD responses, optionally persisted to a directory.
+
+    Entries younger than their TTL are served without any request. Older ones are revalidated
+    with `If-None-Match` / `If-Modified-Since`, so unchanged files cost a 304 response and no parsing.
+    """
+
+    def __init__(
+        self,
+        directory: str | None = None,
+        max_entries: int = 64,
+        index_ttl: timedelta = timedelta(minutes=30),
+        chunk_ttl: timedelta = timedelta(minutes=15),
+    ):
+        self._directory = directory
+        self._max_entries = max_entries
+        self._index_ttl = index_ttl.total_seconds()
+        self._chunk_ttl = chunk_ttl.total_seconds()
+        self._entries: OrderedDict[CacheKey, CacheEntry] = OrderedDict()
+
+    def is_fresh(self, key: CacheKey, entry: CacheEntry, now: float | None = None, max_age: timedelta | None = None) -> bool:
+        """Whether an entry can be served without asking the server.
+
+        `max_age` shortens the TTLs, e.g. while new prices are expected; settled chunks stay fresh.
+        """
+        now = time.time() if now is None else now
+        chunk_ts = key[2]
+        ttl = self._index_ttl if chunk_ts is None else self._chunk_ttl
+        if max_age is not None:
+            ttl = min(ttl, max_age.total_seconds())
+        if chunk_ts is None:
+            return now - entry.fetched_at < ttl
+        if entry.fetched_at >= chunk_ts / 1e3 + CHUNK_SETTLED_AFTER.total_seconds():
+            return True
+        return now - entry.fetched_at < ttl
+
+    async def async_get(self, key: CacheKey) -> CacheEntry | None:
+        """Return the cached entry from memory or, after a restart, from disk."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+        if self._directory is None:
+            return None
+        entry = await asyncio.get_running_loop().run_in_executor(None, self._load, key)
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    async def async_put(self, key: CacheKey, entry: CacheEntry) -> None:
+        """Store an entry in memory and persist it."""
+        self._remember(key, entry)
+        if self._directory is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._save, key, entry)
+
+    def touch(self, key: CacheKey, fetched_at: float | None = None) -> None:
+        """Mark an entry as revalidated without rewriting it to disk."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.fetched_at = time.time() if fetched_at is None else fetched_at
+
+    def _remember(self, key: CacheKey, entry: CacheEntry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, key: CacheKey) -> str:
+        country_id, resolution, chunk_ts = key
+        name = "index" if chunk_ts is None else str(chunk_ts)
+        return os.path.join(str(self._directory), f"{country_id}_{resolution}_{name}.json")
+
+    def _load(self, key: CacheKey) -> CacheEntry | None:
+        try:
+            with open(self._path(key), encoding="utf-8") as file:
+                return CacheEntry(**json.load(file))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            _LOGGER.warning("Ignoring unreadable cache file for %s: %s", key, e)
+            return None
+
+    def _save(self, key: CacheKey, entry: CacheEntry) -> None:
+        directory = str(self._directory)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            path = self._path(key)
+            with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+                json.dump(entry.__dict__, file)
+            os.replace(f"{path}.tmp", path)
+            self._evict_files(directory)
+        except OSError as e:
+            _LOGGER.warning("Could not persist cache file for %s: %s", key, e)
+
+    def _evict_files(self, directory: str) -> None:
+        files = [entry for entry in os.scandir(directory) if entry.name.endswith(".json")]
+        if len(files) <= self._max_entries:
+            return
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in files[: len(files) - self._max_entries]:
+            os.remove(entry.path)
@@ -3,13 +3,38 @@ from typing import Any
 import voluptuous as vol
 from homeassistant import config_entries
 from homeassistant.core import callback
+from homeassistant.helpers import selector
 
 from .const import (
+    CONF_BATTERY_CAPACITY,
+    CONF_BATTERY_EFFICIENCY,
+    CONF_BATTERY_POWER,
+    CONF_BATTERY_SOC_ENTITY,
+    CONF_CHART_COLUMNAR,
+    CONF_CHART_MAX_POINTS,
+    CONF_CHEAPEST,
+    CONF_CONTIGUOUS,
     CONF_COUNTRY_ID,
+    CONF_DEADLINE,
+    CONF_ENERGY,
+    CONF_POWER,
     CONF_THRESH,
+    CONF_THRESH_MODE,
+    DEFAULT_BATTERY_CAPACITY,
+    DEFAULT_BATTERY_EFFICIENCY,
+    DEFAULT_BATTERY_POWER,
+    DEFAULT_CHART_COLUMNAR,
+    DEFAULT_CHART_MAX_POINTS,
+    DEFAULT_CHEAPEST,
+    DEFAULT_CONTIGUOUS,
     DEFAULT_COUNTRY_ID,
+    DEFAULT_DEADLINE,
+    DEFAULT_ENERGY,
+    DEFAULT_POWER,
     DEFAULT_THRESH,
+    DEFAULT_THRESH_MODE,
     DOMAIN,
+    THRESH_MODES,
 )
 from .smard import SMARD_COUNTRIES
 
@@ -20,11 +45,72 @@ SCHEMA = vol.Schema(
             default=DEFAULT_COUNTRY_ID,
             description={"translation_key": CONF_COUNTRY_ID},
         ): vol.In(SMARD_COUNTRIES),
+        vol.Required(
+            CONF_THRESH_MODE,
+            default=DEFAULT_THRESH_MODE,
+            description={"translation_key": CONF_THRESH_MODE},
+        ): selector.SelectSelector(  # pyright: ignore[reportUnknownMemberType]
+            selector.SelectSelectorConfig(options=THRESH_MODES, translation_key=CONF_THRESH_MODE)
+        ),
         vol.Required(
             CONF_THRESH,
             default=DEFAULT_THRESH,
             description={"translation_key": CONF_THRESH},
         ): vol.Coerce(float),
+        vol.Required(
+            CONF_CHEAPEST,
+            default=DEFAULT_CHEAPEST,
+            description={"translation_key": CONF_CHEAPEST},
+        ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Required(
+            CONF_ENERGY,
+            default=DEFAULT_ENERGY,
+            description={"translation_key": CONF_ENERGY},
+        ): vol.All(vol.Coerce(float), vol.Range(min=0, min_included=False)),
+        vol.Required(
+            CONF_POWER,
+            default=DEFAULT_POWER,
+            description={"translation_key": CONF_POWER},
+        ): vol.All(vol.Coerce(float), vol.Range(min=0, min_included=False)),
+        vol.Required(
+            CONF_DEADLINE,
+            default=DEFAULT_DEADLINE,
+            description={"translation_key": CONF_DEADLINE},
+        ): selector.TimeSelector(),  # pyright: ignore[reportUnknownMemberType]
+        vol.Required(
+            CONF_CONTIGUOUS,
+            default=DEFAULT_CONTIGUOUS,
+            description={"translation_key": CONF_CONTIGUOUS},
+        ): bool,
+        vol.Required(
+            CONF_CHART_COLUMNAR,
+            default=DEFAULT_CHART_COLUMNAR,
+            description={"translation_key": CONF_CHART_COLUMNAR},
+        ): bool,
+        vol.Required(
+            CONF_CHART_MAX_POINTS,
+            default=DEFAULT_CHART_MAX_POINTS,
+            description={"translation_key": CONF_CHART_MAX_POINTS},
+        ): vol.All(vol.Coerce(int), vol.Any(0, vol.Range(min=3))),
+        vol.Required(
+            CONF_BATTERY_CAPACITY,
+            default=DEFAULT_BATTERY_CAPACITY,
+            description={"translation_key": CONF_BATTERY_CAPACITY},
+        ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Required(
+            CONF_BATTERY_POWER,
+            default=DEFAULT_BATTERY_POWER,
+            description={"translation_key": CONF_BATTERY_POWER},
+        ): vol.All(vol.Coerce(float), vol.Range(min=0, min_included=False)),
+        vol.Required(
+            CONF_BATTERY_EFFICIENCY,
+            default=DEFAULT_BATTERY_EFFICIENCY,
+            description={"translation_key": CONF_BATTERY_EFFICIENCY},
+        ): vol.All(vol.Coerce(float), vol.Range(min=0, max=1, min_included=False)),
+        vol.Optional(
+            CONF_BATTERY_SOC_ENTITY,
+            description={"translation_key": CONF_BATTERY_SOC_ENTITY},
+        ): selector.EntitySelector(selector.EntitySelectorConfig(domain="sensor")),  # pyright: ignore[reportUnknownMemberType]
     }
 )
 
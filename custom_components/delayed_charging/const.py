@@ -5,3 +5,39 @@ CONF_THRESH = "threshold"
 CONF_COUNTRY_ID = "country_id"
 DEFAULT_THRESH = 0.0
 DEFAULT_COUNTRY_ID = "4169"
+DEFAULT_LOOKBACK_HOURS = 24
+
+# Threshold mode: an absolute price (CONF_THRESH) or the cheapest slots of the price window (CONF_CHEAPEST)
+CONF_THRESH_MODE = "threshold_mode"
+CONF_CHEAPEST = "cheapest"
+THRESH_MODE_ABSOLUTE = "absolute"
+THRESH_MODE_PERCENT = "percent"
+THRESH_MODE_SLOTS = "slots"
+THRESH_MODES = [THRESH_MODE_ABSOLUTE, THRESH_MODE_PERCENT, THRESH_MODE_SLOTS]
+DEFAULT_THRESH_MODE = THRESH_MODE_ABSOLUTE
+DEFAULT_CHEAPEST = 25.0
+
+# Chart attributes of the current price sensor: points for ApexCharts Card or columns, optionally downsampled
+CONF_CHART_COLUMNAR = "chart_columnar"
+CONF_CHART_MAX_POINTS = "chart_max_points"
+DEFAULT_CHART_COLUMNAR = False
+DEFAULT_CHART_MAX_POINTS = 0
+
+# Charging planner: energy to charge (kWh) at a power (kW) until a time of day
+CONF_ENERGY = "energy"
+CONF_POWER = "power"
+CONF_DEADLINE = "deadline"
+CONF_CONTIGUOUS = "contiguous"
+DEFAULT_ENERGY = 10.0
+DEFAULT_POWER = 5.0
+DEFAULT_DEADLINE = "18:00:00"
+DEFAULT_CONTIGUOUS = False
+
+# Battery arbitrage: the schedule sensors are only created for a capacity above 0
+CONF_BATTERY_CAPACITY = "battery_capacity"
+CONF_BATTERY_POWER = "battery_power"
+CONF_BATTERY_EFFICIENCY = "battery_efficiency"
+CONF_BATTERY_SOC_ENTITY = "battery_soc_entity"
+DEFAULT_BATTERY_CAPACITY = 0.0
+DEFAULT_BATTERY_POWER = 5.0
+DEFAULT_BATTERY_EFFICIENCY = 0.95
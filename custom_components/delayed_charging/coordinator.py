@@ -1,37 +1,356 @@
-import datetime
+import asyncio
 import logging
-from datetime import timedelta
-from typing import cast
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Any
 
+import aiohttp
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.exceptions import ConfigEntryNotReady, HomeAssistantError
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.event import async_track_point_in_time
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.util import dt as dt_util
 
-from custom_components.delayed_charging.const import CONF_COUNTRY_ID, DEFAULT_COUNTRY_ID
-from custom_components.delayed_charging.smard import get_pricing_info
+from custom_components.delayed_charging.arbitrage import ArbitrageSchedule, Battery, optimize_battery
+from custom_components.delayed_charging.cache import SmardCache
+from custom_components.delayed_charging.const import DEFAULT_LOOKBACK_HOURS, DOMAIN
+from custom_components.delayed_charging.polling import (
+    MISSING_INTERVAL,
+    CircuitBreaker,
+    awaiting_publication,
+    next_poll,
+    zone_offset,
+)
+from custom_components.delayed_charging.service import PriceSeries, dt2ts, ts2dt
+from custom_components.delayed_charging.smard import SmardError, get_price_range, pricing_window
+from custom_components.delayed_charging.statistics import PriceStatistics
+from custom_components.delayed_charging.store import PriceStore
 
 _LOGGER = logging.getLogger(__name__)
 
+SNAPSHOT_VERSION = 1
+# seconds to coalesce writes of the last series, which HA flushes on shutdown anyway
+SNAPSHOT_DELAY = 10
 
-class ElectricityPriceCoordinator(DataUpdateCoordinator[list[tuple[datetime.datetime, float]]]):
-    """Coordinator to fetch electricity prices from a REST API."""
 
-    def __init__(self, hass: HomeAssistant, config_entry: ConfigEntry):
+class ElectricityPriceCoordinator(DataUpdateCoordinator[PriceSeries]):
+    """Coordinator to fetch electricity prices of one SMARD bidding zone from a REST API."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        country_id: str,
+        cache: SmardCache | None = None,
+        session: aiohttp.ClientSession | None = None,
+        lookback: timedelta = timedelta(hours=DEFAULT_LOOKBACK_HOURS),
+        store: PriceStore | None = None,
+        statistics: PriceStatistics | None = None,
+        snapshot: Store[dict[str, Any]] | None = None,
+    ):
         """Initialize the coordinator."""
         super().__init__(
             hass,
             _LOGGER,
-            config_entry=config_entry,
-            name="Electricity Price Coordinator",
-            update_interval=timedelta(minutes=2),
+            config_entry=None,
+            name=f"Electricity Price Coordinator ({country_id})",
+            # adapted after every fetch to when new prices are expected, see `next_poll`
+            update_interval=MISSING_INTERVAL,
             always_update=True,
         )
+        self.country_id = country_id
+        self.cache = cache
+        self.session = session or async_get_clientsession(hass)
+        # rolling window from `now - lookback` to the end of tomorrow's day-ahead prices
+        self.lookback = lookback
+        # every fetched slot is kept in the on-disk price history
+        self.store = store
+        # and added to the long-term statistics once its hour is complete
+        self.statistics = statistics
+        # the last fetched series, restored at startup before SMARD answers
+        self.snapshot = snapshot
+        self._unsub_tick: CALLBACK_TYPE | None = None
+        self._poll_offset = zone_offset(country_id)
+        self.breaker = CircuitBreaker()
+        # time of the last successful fetch, i.e. of the data
+        self.last_success: datetime | None = None
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Update the listeners and schedule the next update at the next slot boundary."""
+        super().async_update_listeners()
+        self._schedule_tick()
+
+    @callback
+    def _schedule_tick(self) -> None:
+        """Update the listeners again when the current slot of the cached series changes, without a fetch."""
+        if self._unsub_tick is not None:
+            self._unsub_tick()
+            self._unsub_tick = None
+        boundary = self.data.next_boundary(dt2ts(dt_util.utcnow())) if self.data else None
+        if boundary is not None:
+            self._unsub_tick = async_track_point_in_time(self.hass, self._handle_tick, ts2dt(boundary))
+
+    @callback
+    def _handle_tick(self, _now: datetime) -> None:
+        self._unsub_tick = None
+        self.async_update_listeners()
+        if self.statistics is not None:
+            # hours are imported once they have ended
+            self._start_statistics_import(self.statistics, self.data)
+
+    async def async_shutdown(self) -> None:
+        """Cancel the tick along with the polling."""
+        await super().async_shutdown()
+        if self._unsub_tick is not None:
+            self._unsub_tick()
+            self._unsub_tick = None
+
+    async def _async_update_data(self) -> PriceSeries:
+        """Fetch data from API, keeping the last prices while they last if that fails."""
+        now = dt_util.utcnow()
+        if not self.breaker.allow(now):
+            self.update_interval = self.breaker.retry_in(now)
+            return self._stale(now, f"requests paused after {self.breaker.failures} failures")
+        try:
+            start, end = pricing_window(self.lookback)
+            # while tomorrow's prices are due, every poll revalidates the cached files with SMARD
+            max_age = timedelta(0) if awaiting_publication(self.data, now, self._poll_offset) else None
+            series = await get_price_range(
+                self.country_id, start, end, cache=self.cache, session=self.session, max_age=max_age
+            )
+            if not series:
+                raise SmardError(f"No prices published for {self.country_id}")
+        except (aiohttp.ClientError, TimeoutError, SmardError) as err:
+            if self.breaker.record_failure(now):
+                _LOGGER.warning("SMARD failed %d times, pausing requests for %s", self.breaker.failures, self.country_id)
+            self.update_interval = self.breaker.retry_in(now) or next_poll(
+                self.data, now, self.breaker.failures, self._poll_offset
+            )
+            return self._stale(now, err)
+        self.breaker.record_success()
+        self.last_success = now
+        self.update_interval = next_poll(series, now, offset=self._poll_offset)
+        if self.snapshot is not None:
+            self.snapshot.async_delay_save(lambda: self._snapshot_data(series, now), SNAPSHOT_DELAY)
+        if series == self.data:
+            # unchanged prices keep their series and with it all indexes and payloads computed on it
+            return self.data
+        if self.store is not None:
+            await self.hass.async_add_executor_job(self._append_history, self.store, series)
+        if self.statistics is not None:
+            self._start_statistics_import(self.statistics, series)
+        return series
+
+    async def async_restore(self) -> bool:
+        """Load the last fetched series if it still covers the current time and return whether it did."""
+        if self.snapshot is None:
+            return False
+        try:
+            data = await self.snapshot.async_load()
+        except HomeAssistantError as err:
+            _LOGGER.warning("Could not load the last prices of %s: %s", self.country_id, err)
+            return False
+        if not data:
+            return False
+        try:
+            series = PriceSeries(data["timestamps"], data["prices"], data["resolution_ms"])
+            fetched_at = dt_util.parse_datetime(data["fetched_at"])
+        except (KeyError, TypeError, ValueError) as err:
+            _LOGGER.warning("Ignoring the invalid last prices of %s: %s", self.country_id, err)
+            return False
+        now = dt_util.utcnow()
+        if series.next_boundary(dt2ts(now)) is None:
+            return False
+        self.data = series
+        self.last_success = fetched_at
+        self.update_interval = next_poll(series, now, offset=self._poll_offset)
+        self._schedule_tick()
+        return True
+
+    def _snapshot_data(self, series: PriceSeries, fetched_at: datetime) -> dict[str, Any]:
+        return {
+            "country_id": self.country_id,
+            "fetched_at": fetched_at.isoformat(),
+            "resolution_ms": series.resolution_ms,
+            "timestamps": series.timestamps.tolist(),
+            "prices": series.prices.tolist(),
+        }
+
+    def _stale(self, now: datetime, err: Exception | str) -> PriceSeries:
+        """Return the last prices if they still cover the current time, otherwise fail the update."""
+        if self.data and self.data.next_boundary(dt2ts(now)) is not None:
+            _LOGGER.info("Fetching prices of %s failed, keeping the last ones: %s", self.country_id, err)
+            return self.data
+        raise UpdateFailed(f"API error: {err}")
+
+    def diagnostics(self) -> dict[str, Any]:
+        """Return the state of the data and the requests for the diagnostics."""
+        now = dt_util.utcnow()
+        series = self.data
+        return {
+            "country_id": self.country_id,
+            "slots": len(series) if series else 0,
+            "first_slot": ts2dt(series.timestamps[0]).isoformat() if series else None,
+            "last_slot": ts2dt(series.timestamps[-1]).isoformat() if series else None,
+            "last_success": self.last_success.isoformat() if self.last_success is not None else None,
+            "data_age_seconds": (now - self.last_success).total_seconds() if self.last_success is not None else None,
+            "last_update_success": self.last_update_success,
+            "update_interval_seconds": self.update_interval.total_seconds() if self.update_interval else None,
+            "circuit_breaker": self.breaker.as_dict(now),
+        }
+
+    def _append_history(self, store: PriceStore, series: PriceSeries) -> None:
+        try:
+            store.append(series.timestamps, series.prices)
+        except (OSError, ValueError) as err:
+            _LOGGER.warning("Could not extend the price history of %s: %s", self.country_id, err)
+
+    @callback
+    def _start_statistics_import(self, statistics: PriceStatistics, series: PriceSeries) -> None:
+        self.hass.async_create_background_task(
+            self._async_import_statistics(statistics, series), f"{DOMAIN} statistics import {self.country_id}"
+        )
+
+    async def _async_import_statistics(self, statistics: PriceStatistics, series: PriceSeries) -> None:
+        try:
+            await statistics.async_import(series)
+        except (OSError, ValueError, HomeAssistantError) as err:
+            _LOGGER.warning("Could not import the price statistics of %s: %s", self.country_id, err)
+
+
+class PriceCoordinatorRegistry:
+    """Reference-counted price coordinators, one per bidding zone, shared by all config entries.
+
+    Config entries only differ in how they evaluate the prices (e.g. their threshold), so every
+    entry subscribing to the same `country_id` reuses one coordinator and thereby one SMARD poll.
+    The SMARD cache and the price history are kept in `directory`, by default in .storage.
+    """
+
+    def __init__(self, hass: HomeAssistant, directory: str | None = None):
+        self._hass = hass
+        directory = hass.config.path(".storage", DOMAIN) if directory is None else directory
+        # SMARD files survive restarts and are revalidated instead of downloaded again
+        self.cache = SmardCache(directory=directory)
+        self.history_directory = os.path.join(directory, "history")
+        self._coordinators: dict[str, ElectricityPriceCoordinator] = {}
+        self._subscribers: dict[str, set[str]] = defaultdict(set)
+        self._locks: dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def async_acquire(self, country_id: str, entry_id: str) -> ElectricityPriceCoordinator:
+        """Subscribe a config entry to the prices of a bidding zone, fetching them on first use."""
+        async with self._locks[country_id]:
+            coordinator = self._coordinators.get(country_id)
+            if coordinator is None:
+                coordinator = ElectricityPriceCoordinator(
+                    self._hass,
+                    country_id,
+                    self.cache,
+                    store=PriceStore(self.history_directory, country_id),
+                    statistics=PriceStatistics(self._hass, country_id, partial(self.open_store, country_id)),
+                    snapshot=Store(self._hass, SNAPSHOT_VERSION, f"{DOMAIN}.prices_{country_id}"),
+                )
+                if await coordinator.async_restore():
+                    # entities start from the last prices right away, SMARD is asked in the background
+                    self._hass.async_create_background_task(coordinator.async_refresh(), f"{DOMAIN} refresh {country_id}")
+                else:
+                    await coordinator.async_refresh()
+                    if not coordinator.last_update_success:
+                        await coordinator.async_shutdown()
+                        raise ConfigEntryNotReady(f"Fetching prices for {country_id} failed") from coordinator.last_exception
+                self._coordinators[country_id] = coordinator
+            self._subscribers[country_id].add(entry_id)
+            return coordinator
+
+    async def async_release(self, country_id: str, entry_id: str) -> None:
+        """Unsubscribe a config entry and shut the coordinator down once nobody uses it anymore."""
+        async with self._locks[country_id]:
+            subscribers = self._subscribers[country_id]
+            subscribers.discard(entry_id)
+            if subscribers:
+                return
+            del self._subscribers[country_id]
+            coordinator = self._coordinators.pop(country_id, None)
+            if coordinator is not None:
+                await coordinator.async_shutdown()
+
+    def open_store(self, country_id: str, resolution: str = "quarterhour") -> PriceStore:
+        """Open the price history of a bidding zone for reading.
+
+        Readers get a store of their own rather than the coordinator's: a store is not thread-safe, and the
+        coordinator's may be appended to in an executor while they read in another. A new store maps the
+        files as they are, so it sees everything appended before it was opened.
+        """
+        return PriceStore(self.history_directory, country_id, resolution)
+
+    def get(self, country_id: str) -> ElectricityPriceCoordinator | None:
+        """Return the coordinator of a bidding zone if any config entry subscribes to it."""
+        return self._coordinators.get(country_id)
+
+    @property
+    def country_ids(self) -> list[str]:
+        """Bidding zones that currently have at least one subscriber."""
+        return list(self._coordinators)
+
+
+class BatteryCoordinator(DataUpdateCoordinator[ArbitrageSchedule | None]):
+    """Re-optimizes the battery schedule of a config entry whenever its prices are updated.
+
+    The schedule is None while the first optimization, which may fail without failing the setup, has not succeeded.
+    """
+
+    config_entry: ConfigEntry
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        config_entry: ConfigEntry,
+        prices: ElectricityPriceCoordinator,
+        battery: Battery,
+        soc_entity_id: str | None = None,
+    ):
+        super().__init__(
+            hass,
+            _LOGGER,
+            config_entry=config_entry,
+            name=f"Battery Arbitrage Coordinator ({config_entry.title})",
+            update_interval=None,
+        )
+        self.prices = prices
+        self.battery = battery
+        # sensor reporting the state of charge in %; without one, the battery is assumed to be empty
+        self.soc_entity_id = soc_entity_id
+
+    @callback
+    def async_start(self) -> None:
+        """Follow the updates of the price coordinator until the config entry is unloaded."""
+
+        @callback
+        def _handle_prices_update() -> None:
+            self.hass.async_create_task(self.async_request_refresh())
+
+        self.config_entry.async_on_unload(self.prices.async_add_listener(_handle_prices_update))
+
+    def _current_soc(self) -> float:
+        if self.soc_entity_id is None:
+            return 0.0
+        state = self.hass.states.get(self.soc_entity_id)
+        try:
+            percent = float(state.state) if state is not None else None
+        except ValueError:
+            percent = None
+        if percent is None:
+            raise UpdateFailed(f"State of charge {self.soc_entity_id} is not available")
+        return self.battery.capacity * min(max(percent, 0.0), 100.0) / 100
 
-    async def _async_update_data(self):
-        """Fetch data from API."""
+    async def _async_update_data(self) -> ArbitrageSchedule:
+        """Optimize in an executor, as the DP takes several milliseconds."""
+        soc = self._current_soc()
         try:
-            config_entry = cast(ConfigEntry, self.config_entry)
-            country_id = config_entry.options.get(CONF_COUNTRY_ID, DEFAULT_COUNTRY_ID)
-            return await get_pricing_info(country_id)
-        except Exception as err:
-            raise UpdateFailed(f"API error: {err}") from err
+            return await self.hass.async_add_executor_job(optimize_battery, self.prices.data, self.battery, soc)
+        except ValueError as err:
+            raise UpdateFailed(f"Battery schedule could not be optimized: {err}") from err
@@ -0,0 +1,18 @@
+"""Diagnostics of the Delayed Charging integration."""
+
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.delayed_charging import DelayedChargingConfigEntry
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: DelayedChargingConfigEntry) -> dict[str, Any]:
+    """Return the options, the age of the prices and the state of the requests to SMARD."""
+    runtime_data = entry.runtime_data
+    battery = runtime_data.battery
+    return {
+        "options": dict(entry.options),
+        "prices": runtime_data.coordinator.diagnostics(),
+        "battery": {"last_update_success": battery.last_update_success} if battery is not None else None,
+    }
@@ -0,0 +1,132 @@
+"""When to fetch prices next, based on when SMARD publishes them."""
+
+import datetime
+import random
+import zlib
+from typing import Any
+
+from custom_components.delayed_charging.service import SYSTEM_TZ, PriceSeries, dt2ts
+
+# The day-ahead auction closes at 12:00 CET; its prices for tomorrow appear on SMARD from about 13:00.
+PUBLICATION_TIME = datetime.time(12, 30)
+# while tomorrow's prices are expected
+PUBLICATION_INTERVAL = datetime.timedelta(minutes=5)
+# while tomorrow's prices are known, as a safety net for corrections
+IDLE_INTERVAL = datetime.timedelta(hours=6)
+# while even today's prices are incomplete, e.g. after an outage
+MISSING_INTERVAL = datetime.timedelta(minutes=15)
+RETRY_BASE = datetime.timedelta(minutes=1)
+RETRY_MAX = datetime.timedelta(minutes=30)
+# bidding zones are spread over this period, so that their polls do not coincide
+SPREAD = datetime.timedelta(minutes=5)
+
+
+def zone_offset(country_id: str) -> datetime.timedelta:
+    """Return a stable offset within `SPREAD` for the polls of a bidding zone."""
+    return datetime.timedelta(seconds=zlib.crc32(country_id.encode()) % int(SPREAD.total_seconds()))
+
+
+def _midnight(day: datetime.date) -> int:
+    return dt2ts(datetime.datetime.combine(day, datetime.time(tzinfo=SYSTEM_TZ)))
+
+
+def awaiting_publication(
+    series: PriceSeries | None, now: datetime.datetime, offset: datetime.timedelta = datetime.timedelta(0)
+) -> bool:
+    """Return whether tomorrow's prices are due, i.e. it is past the publication time and `series` ends today."""
+    now = now.astimezone(SYSTEM_TZ)
+    today = now.date()
+    end = series.timestamps[-1] + series.resolution_ms if series else None
+    publication = datetime.datetime.combine(today, PUBLICATION_TIME, tzinfo=SYSTEM_TZ) + offset
+    return (
+        now >= publication
+        and end is not None
+        and _midnight(today + datetime.timedelta(days=1)) <= end < _midnight(today + datetime.timedelta(days=2))
+    )
+
+
+def next_poll(
+    series: PriceSeries | None,
+    now: datetime.datetime,
+    failures: int = 0,
+    offset: datetime.timedelta = datetime.timedelta(0),
+    rng: random.Random | None = None,
+) -> datetime.timedelta:
+    """Return how long to wait before the next fetch.
+
+    After `failures` consecutive failed fetches (an empty answer counts as one), the wait doubles from
+    `RETRY_BASE` up to `RETRY_MAX`, randomized to between half and all of it. Otherwise, it depends on
+    how far `series` reaches: polls are rare once tomorrow's prices are known, start at the publication
+    time (shifted by the zone's `offset`) and are frequent until tomorrow's prices arrive.
+    """
+    if failures > 0:
+        delay = min(RETRY_BASE * 2 ** (failures - 1), RETRY_MAX)
+        return delay * (rng or random).uniform(0.5, 1.0)
+
+    now = now.astimezone(SYSTEM_TZ)
+    today = now.date()
+    end = series.timestamps[-1] + series.resolution_ms if series else None
+    publication = datetime.datetime.combine(today, PUBLICATION_TIME, tzinfo=SYSTEM_TZ) + offset
+    if end is not None and end >= _midnight(today + datetime.timedelta(days=2)):
+        return min(publication + datetime.timedelta(days=1) - now, IDLE_INTERVAL)
+    if end is not None and end >= _midnight(today + datetime.timedelta(days=1)):
+        return min(publication - now, IDLE_INTERVAL) if now < publication else PUBLICATION_INTERVAL
+    return MISSING_INTERVAL
+
+
+class CircuitBreaker:
+    """Stops requests to SMARD during an outage.
+
+    Closed, requests pass. After `threshold` consecutive failures, it opens for `cooldown` and rejects
+    requests. Then, half open, it lets one request through: success closes it, failure opens it again for
+    twice as long, up to `max_cooldown`.
+    """
+
+    def __init__(
+        self,
+        threshold: int = 5,
+        cooldown: datetime.timedelta = datetime.timedelta(minutes=30),
+        max_cooldown: datetime.timedelta = datetime.timedelta(hours=4),
+    ):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures = 0
+        self.opened_until: datetime.datetime | None = None
+        self._current_cooldown = cooldown
+
+    def state(self, now: datetime.datetime) -> str:
+        if self.opened_until is None:
+            return "closed"
+        return "open" if now < self.opened_until else "half_open"
+
+    def allow(self, now: datetime.datetime) -> bool:
+        """Return whether a request may be made now."""
+        return self.state(now) != "open"
+
+    def retry_in(self, now: datetime.datetime) -> datetime.timedelta | None:
+        """Return how long the breaker stays open, or None if it is not open."""
+        return self.opened_until - now if self.state(now) == "open" and self.opened_until is not None else None
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_until = None
+        self._current_cooldown = self.cooldown
+
+    def record_failure(self, now: datetime.datetime) -> bool:
+        """Count a failed request; returns whether the breaker (re)opened."""
+        self.failures += 1
+        if self.opened_until is not None:
+            # the trial request of the half-open breaker failed
+            self._current_cooldown = min(self._current_cooldown * 2, self.max_cooldown)
+        elif self.failures < self.threshold:
+            return False
+        self.opened_until = now + self._current_cooldown
+        return True
+
+    def as_dict(self, now: datetime.datetime) -> dict[str, Any]:
+        return {
+            "state": self.state(now),
+            "failures": self.failures,
+            "opened_until": self.opened_until.isoformat() if self.opened_until is not None else None,
+        }
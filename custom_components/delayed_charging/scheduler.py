@@ -0,0 +1,164 @@
+"""Schedule several loads behind one grid connection at minimum cost."""
+
+import datetime
+from bisect import bisect_left, bisect_right
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any
+
+from custom_components.delayed_charging.service import SYSTEM_TZ, PriceSeries, dt2ts, ts2dt
+
+# kWh below which energy is considered fully scheduled
+_EPS = 1e-9
+
+
+@dataclass(frozen=True)
+class Load:
+    """Energy (kWh) to draw at up to `power` (kW) from `start` (default: now) until `deadline`."""
+
+    name: str
+    energy: float
+    power: float
+    deadline: datetime.datetime
+    start: datetime.datetime | None = None
+
+
+@dataclass(frozen=True)
+class ScheduledSlot:
+    start: datetime.datetime
+    end: datetime.datetime
+    price: float
+    power: float
+
+
+@dataclass
+class LoadSchedule:
+    """Slots of one load in chronological order, with the energy (kWh) that could not be scheduled."""
+
+    name: str
+    slots: list[ScheduledSlot] = field(default_factory=list[ScheduledSlot])
+    energy: float = 0.0
+    cost: float = 0.0
+    missing: float = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "energy": self.energy,
+            "cost": self.cost,
+            "missing": self.missing,
+            "slots": [
+                {"start": slot.start.isoformat(), "end": slot.end.isoformat(), "price": slot.price, "power": slot.power}
+                for slot in self.slots
+            ],
+        }
+
+
+class _Allocation:
+    """Energy per load and slot as a bipartite flow from slots to loads."""
+
+    def __init__(self, windows: list[tuple[int, int]], slot_limits: list[float], remaining: list[float]):
+        self.windows = windows
+        self.slot_limits = slot_limits
+        self.remaining = remaining
+        self.energy: list[dict[int, float]] = [{} for _ in windows]
+
+    def _path(self, slot: int) -> list[tuple[int, int, int]] | None:
+        """Find the shortest path from `slot` to a load with remaining energy.
+
+        Steps are `(slot, load, direction)`: +1 gives the load more energy in that slot, -1 takes some
+        away, which another load then uses instead. Only the final load's total changes, so neither the
+        cost nor the usage of the slots in between does.
+        """
+        parents: dict[int, tuple[int, int]] = {}  # load -> (slot, previous load or -1)
+        seen_slots = {slot}
+        queue = deque([(slot, -1)])
+        while queue:
+            current_slot, via = queue.popleft()
+            for load, (lo, hi) in enumerate(self.windows):
+                if load in parents or not lo <= current_slot < hi:
+                    continue
+                if self.energy[load].get(current_slot, 0.0) >= self.slot_limits[load] - _EPS:
+                    continue
+                parents[load] = (current_slot, via)
+                if self.remaining[load] > _EPS:
+                    return self._unwind(parents, load)
+                for other_slot, energy in self.energy[load].items():
+                    if energy > _EPS and other_slot not in seen_slots:
+                        seen_slots.add(other_slot)
+                        queue.append((other_slot, load))
+        return None
+
+    def _unwind(self, parents: dict[int, tuple[int, int]], load: int) -> list[tuple[int, int, int]]:
+        steps: list[tuple[int, int, int]] = []
+        while load != -1:
+            slot, via = parents[load]
+            steps.append((slot, load, 1))
+            if via != -1:
+                steps.append((slot, via, -1))
+            load = via
+        return steps
+
+    def fill(self, slot: int, capacity: float) -> None:
+        """Route up to `capacity` kWh of `slot` to the loads, rearranging earlier slots where needed."""
+        while capacity > _EPS:
+            steps = self._path(slot)
+            if steps is None:
+                return
+            amount = capacity
+            for step_slot, load, direction in steps:
+                energy = self.energy[load].get(step_slot, 0.0)
+                amount = min(amount, self.slot_limits[load] - energy if direction > 0 else energy)
+            amount = min(amount, self.remaining[steps[0][1]])
+            for step_slot, load, direction in steps:
+                self.energy[load][step_slot] = self.energy[load].get(step_slot, 0.0) + direction * amount
+            self.remaining[steps[0][1]] -= amount
+            capacity -= amount
+
+
+def schedule_loads(
+    timeseries: PriceSeries,
+    loads: list[Load],
+    grid_limit: float,
+    now: datetime.datetime | None = None,
+) -> list[LoadSchedule]:
+    """Schedule `loads` so that together they never exceed `grid_limit` (kW), at minimum total cost.
+
+    Slots are taken cheapest first, each as far as the loads can use it. Loads may draw any power up to
+    their maximum in a slot. When a slot is only usable by loads that are already done, energy of other
+    slots is shifted between loads to make room (an augmenting path in the flow from slots to loads).
+    As the cost only depends on how much of each slot is used, this greedy allocation is optimal.
+
+    Runs in O(n * m * (n + m)) in the worst case for n slots and m loads and is CPU bound, so call it
+    from an executor in Home Assistant. Energy that cannot be scheduled in time is reported as `missing`.
+    """
+    timestamps, prices, resolution_ms = timeseries.timestamps, timeseries.prices, timeseries.resolution_ms
+    if grid_limit <= 0 or any(load.energy < 0 or load.power <= 0 for load in loads):
+        raise ValueError("Grid limit and powers must be positive, energies non-negative.")
+    hours = resolution_ms / 3_600_000
+    now_ts = dt2ts(now if now is not None else datetime.datetime.now(SYSTEM_TZ))
+
+    windows: list[tuple[int, int]] = []
+    for load in loads:
+        lo = bisect_left(timestamps, dt2ts(load.start) if load.start is not None else now_ts)
+        windows.append((lo, max(bisect_right(timestamps, dt2ts(load.deadline) - resolution_ms), lo)))
+    allocation = _Allocation(windows, [load.power * hours for load in loads], [load.energy for load in loads])
+
+    first = min((lo for lo, _ in windows), default=0)
+    last = max((hi for _, hi in windows), default=0)
+    for slot in sorted(range(first, last), key=lambda slot: (prices[slot], slot)):
+        if sum(allocation.remaining) <= _EPS:
+            break
+        allocation.fill(slot, grid_limit * hours)
+
+    schedules: list[LoadSchedule] = []
+    for load, energies, remaining in zip(loads, allocation.energy, allocation.remaining, strict=True):
+        schedule = LoadSchedule(load.name, missing=max(remaining, 0.0))
+        for slot in sorted(slot for slot, energy in energies.items() if energy > _EPS):
+            energy = energies[slot]
+            start = timestamps[slot]
+            schedule.slots.append(ScheduledSlot(ts2dt(start), ts2dt(start + resolution_ms), prices[slot], energy / hours))
+            schedule.energy += energy
+            schedule.cost += prices[slot] * energy / 1000
+        schedules.append(schedule)
+    return schedules
@@ -1,36 +1,58 @@
+import datetime
 from functools import cached_property
-from typing import cast
 
 from homeassistant.components.sensor import SensorDeviceClass, SensorEntity
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CURRENCY_EURO, UnitOfEnergy
+from homeassistant.const import CURRENCY_EURO, UnitOfEnergy, UnitOfPower
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
-from custom_components.delayed_charging import DelayedChargingRuntimeData
-from custom_components.delayed_charging.const import DEFAULT_THRESH
-from custom_components.delayed_charging.coordinator import ElectricityPriceCoordinator
+from custom_components.delayed_charging import DelayedChargingConfigEntry
+from custom_components.delayed_charging.const import (
+    CONF_CHART_COLUMNAR,
+    CONF_CHART_MAX_POINTS,
+    CONF_CONTIGUOUS,
+    CONF_DEADLINE,
+    CONF_ENERGY,
+    CONF_POWER,
+    DEFAULT_CHART_COLUMNAR,
+    DEFAULT_CHART_MAX_POINTS,
+    DEFAULT_CONTIGUOUS,
+    DEFAULT_DEADLINE,
+    DEFAULT_ENERGY,
+    DEFAULT_POWER,
+)
+from custom_components.delayed_charging.coordinator import BatteryCoordinator, ElectricityPriceCoordinator
 from custom_components.delayed_charging.service import (
+    SYSTEM_TZ,
+    dt2ts,
     get_charging_start,
-    get_current_price,
+    get_current_index,
+    get_current_slot,
+    get_threshold,
+    next_time_of_day,
+    plan_charging,
+    upcoming_range,
 )
 
 
 async def async_setup_entry(
     hass: HomeAssistant,
-    config_entry: ConfigEntry,
+    config_entry: DelayedChargingConfigEntry,
     async_add_entities: AddEntitiesCallback,
 ):
-    coordinator = ElectricityPriceCoordinator(hass, config_entry)
-    async_add_entities(
-        [
-            DelayedChargingStart(coordinator),
-            CurrentPriceSensor(coordinator),
-        ]
-    )
-    config_entry.runtime_data = DelayedChargingRuntimeData(coordinator=coordinator)
-    await coordinator.async_config_entry_first_refresh()
+    coordinator = config_entry.runtime_data.coordinator
+    entities: list[SensorEntity] = [
+        DelayedChargingStart(coordinator, config_entry),
+        CurrentPriceSensor(coordinator, config_entry),
+        CurrentPriceRank(coordinator, config_entry),
+        PlannedChargingStart(coordinator, config_entry),
+    ]
+    battery = config_entry.runtime_data.battery
+    if battery is not None:
+        entities += [BatteryPlannedPower(battery), BatteryArbitrageProfit(battery)]
+    async_add_entities(entities)
 
 
 class DelayedChargingStart(  # type: ignore[override]
@@ -40,13 +62,14 @@ class DelayedChargingStart(  # type: ignore[override]
     def __init__(
         self,
         coordinator: ElectricityPriceCoordinator,
+        config_entry: ConfigEntry,
         name: str = "Delayed Charging Start",
     ):
         """Pass coordinator to CoordinatorEntity."""
         super().__init__(coordinator)
         self._name = name
         self._attr_native_value = None
-        self._config_entry = cast(ConfigEntry, coordinator.config_entry)
+        self._config_entry = config_entry
 
     @cached_property
     def name(self):
@@ -64,11 +87,74 @@ class DelayedChargingStart(  # type: ignore[override]
     def state_class(self):
         return None
 
+    async def async_added_to_hass(self) -> None:
+        """Populate the state from the already refreshed coordinator."""
+        await super().async_added_to_hass()
+        self._handle_coordinator_update()
+
     @callback
     def _handle_coordinator_update(self) -> None:
         """Handle updated data from the coordinator."""
-        threshold = self._config_entry.options.get("threshold", DEFAULT_THRESH)
-        self._attr_native_value = get_charging_start(self.coordinator.data, threshold)
+        # a relative threshold refers to the slots still to come
+        threshold = get_threshold(self.coordinator.data, self._config_entry.options, *upcoming_range(self.coordinator.data))
+        self._attr_native_value = get_charging_start(self.coordinator.data, threshold, upcoming=True)
+        self.async_write_ha_state()
+
+
+class PlannedChargingStart(  # type: ignore[override]
+    CoordinatorEntity[ElectricityPriceCoordinator],
+    SensorEntity,
+):
+    """Start of the cheapest charging plan for the energy, power and deadline of the config entry."""
+
+    def __init__(
+        self,
+        coordinator: ElectricityPriceCoordinator,
+        config_entry: ConfigEntry,
+        name: str = "Planned Charging Start",
+    ):
+        super().__init__(coordinator)
+        self._name = name
+        self._attr_native_value = None
+        self._attr_extra_state_attributes = {}
+        self._config_entry = config_entry
+
+    @cached_property
+    def name(self):
+        return self._name
+
+    @property
+    def native_value(self):  # type: ignore[override]
+        return self._attr_native_value
+
+    @cached_property
+    def device_class(self):
+        return SensorDeviceClass.TIMESTAMP
+
+    @property
+    def extra_state_attributes(self):  # type: ignore[override]
+        """Expose end, cost and slots of the plan."""
+        return self._attr_extra_state_attributes
+
+    async def async_added_to_hass(self) -> None:
+        """Populate the state from the already refreshed coordinator."""
+        await super().async_added_to_hass()
+        self._handle_coordinator_update()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Plan charging on the updated prices."""
+        options = self._config_entry.options
+        deadline = next_time_of_day(datetime.time.fromisoformat(options.get(CONF_DEADLINE, DEFAULT_DEADLINE)))
+        plan = plan_charging(
+            self.coordinator.data,
+            options.get(CONF_ENERGY, DEFAULT_ENERGY),
+            options.get(CONF_POWER, DEFAULT_POWER),
+            deadline,
+            contiguous=options.get(CONF_CONTIGUOUS, DEFAULT_CONTIGUOUS),
+        )
+        self._attr_native_value = plan.start if plan is not None else None
+        self._attr_extra_state_attributes = plan.as_dict() if plan is not None else {}
         self.async_write_ha_state()
 
 
@@ -76,9 +162,13 @@ class CurrentPriceSensor(  # type: ignore[override]
     CoordinatorEntity[ElectricityPriceCoordinator],
     SensorEntity,
 ):
+    # the recorder would store the whole price window again with every state change
+    _unrecorded_attributes = frozenset({"apexchart_series", "chart_series"})
+
     def __init__(
         self,
         coordinator: ElectricityPriceCoordinator,
+        config_entry: ConfigEntry,
         name: str = "Current Price",
         unit: str = f"{CURRENCY_EURO}/{UnitOfEnergy.MEGA_WATT_HOUR}",
     ):
@@ -86,7 +176,7 @@ class CurrentPriceSensor(  # type: ignore[override]
         self._name = name
         self._attr_native_value = None
         self._attr_extra_state_attributes = {}
-        self._config_entry = cast(ConfigEntry, coordinator.config_entry)
+        self._config_entry = config_entry
         self._attr_native_unit_of_measurement = unit
 
     @cached_property
@@ -103,20 +193,177 @@ class CurrentPriceSensor(  # type: ignore[override]
 
     @property
     def extra_state_attributes(self):  # type: ignore[override]
-        """Expose the daily price series for ApexCharts Card."""
+        """Expose the current slot and the price series of the rolling window, e.g. for ApexCharts Card."""
         return self._attr_extra_state_attributes or {"apexchart_series": []}
 
+    async def async_added_to_hass(self) -> None:
+        """Populate the state from the already refreshed coordinator."""
+        await super().async_added_to_hass()
+        self._handle_coordinator_update()
+
     @callback
     def _handle_coordinator_update(self) -> None:
         """Handle updated data from the coordinator."""
-        self._attr_native_value = get_current_price(self.coordinator.data)
+        series = self.coordinator.data
+        slot = get_current_slot(series)
+        self._attr_native_value = slot.price if slot is not None else None
+        options = self._config_entry.options
+        columnar = options.get(CONF_CHART_COLUMNAR, DEFAULT_CHART_COLUMNAR)
+        # built once per series version, i.e. only when the prices have changed
+        chart = series.chart_payload(columnar, options.get(CONF_CHART_MAX_POINTS, DEFAULT_CHART_MAX_POINTS))
         self._attr_extra_state_attributes = {
-            "apexchart_series": [
-                {
-                    "x": dt.isoformat(),
-                    "y": price,
-                }
-                for dt, price in (self.coordinator.data or [])
-            ]
+            "slot_start": slot.start.isoformat() if slot is not None else None,
+            "slot_end": slot.end.isoformat() if slot is not None else None,
+            "chart_series" if columnar else "apexchart_series": chart,
         }
         self.async_write_ha_state()
+
+
+class CurrentPriceRank(  # type: ignore[override]
+    CoordinatorEntity[ElectricityPriceCoordinator],
+    SensorEntity,
+):
+    """Rank of the current slot's price among today's slots, 1 being the cheapest.
+
+    Percentile, z-score and the ranks of all of today's slots are attributes, so templates can ask
+    whether a slot is among the cheapest without iterating over the price series.
+    """
+
+    # the ranks of today's slots change with every day and are no use in the history
+    _unrecorded_attributes = frozenset({"ranks"})
+
+    def __init__(
+        self,
+        coordinator: ElectricityPriceCoordinator,
+        config_entry: ConfigEntry,
+        name: str = "Current Price Rank",
+    ):
+        super().__init__(coordinator)
+        self._name = name
+        self._attr_native_value = None
+        self._attr_extra_state_attributes = {}
+        self._config_entry = config_entry
+
+    @cached_property
+    def name(self):
+        return self._name
+
+    @property
+    def native_value(self):  # type: ignore[override]
+        return self._attr_native_value
+
+    @property
+    def extra_state_attributes(self):  # type: ignore[override]
+        """Expose percentile, z-score and today's ranks by start time (ISO 8601, unique on DST days)."""
+        return self._attr_extra_state_attributes
+
+    async def async_added_to_hass(self) -> None:
+        """Populate the state from the already refreshed coordinator."""
+        await super().async_added_to_hass()
+        self._handle_coordinator_update()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Look the current slot up in the statistics of the updated series."""
+        series = self.coordinator.data
+        i = get_current_index(series) if series else None
+        if i is None:
+            self._attr_native_value = None
+            self._attr_extra_state_attributes = {}
+        else:
+            stats = series.slot_stats()
+            lo, hi = stats.day_of(i)
+            self._attr_native_value = int(stats.rank[i])
+            self._attr_extra_state_attributes = {
+                "percentile": round(float(stats.percentile[i]), 1),
+                "zscore": round(float(stats.zscore[i]), 2),
+                "slots_today": hi - lo,
+                "ranks": {series[j][0].isoformat(): int(rank) for j, rank in enumerate(stats.rank[lo:hi], start=lo)},
+            }
+        self.async_write_ha_state()
+
+
+class BatteryPlannedPower(  # type: ignore[override]
+    CoordinatorEntity[BatteryCoordinator],
+    SensorEntity,
+):
+    """Grid power the battery schedule plans for the current slot, positive when charging."""
+
+    def __init__(self, coordinator: BatteryCoordinator, name: str = "Battery Planned Power"):
+        super().__init__(coordinator)
+        self._name = name
+        self._attr_native_value = None
+        self._attr_extra_state_attributes = {}
+        self._attr_native_unit_of_measurement = UnitOfPower.KILO_WATT
+
+    @cached_property
+    def name(self):
+        return self._name
+
+    @cached_property
+    def device_class(self):
+        return SensorDeviceClass.POWER
+
+    @property
+    def native_value(self):  # type: ignore[override]
+        return self._attr_native_value
+
+    @property
+    def extra_state_attributes(self):  # type: ignore[override]
+        """Expose the planned state of charge at the end of the current slot."""
+        return self._attr_extra_state_attributes
+
+    async def async_added_to_hass(self) -> None:
+        """Populate the state from the already refreshed coordinator."""
+        await super().async_added_to_hass()
+        self._handle_coordinator_update()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Read the current slot from the updated schedule."""
+        schedule = self.coordinator.data
+        i = schedule.index_at(dt2ts(datetime.datetime.now(SYSTEM_TZ))) if schedule is not None else None
+        if schedule is not None and i is not None:
+            self._attr_native_value = round(float(schedule.power[i]), 3)
+            self._attr_extra_state_attributes = {"soc": round(float(schedule.soc[i]), 3)}
+        else:
+            self._attr_native_value = None
+            self._attr_extra_state_attributes = {"soc": None}
+        self.async_write_ha_state()
+
+
+class BatteryArbitrageProfit(  # type: ignore[override]
+    CoordinatorEntity[BatteryCoordinator],
+    SensorEntity,
+):
+    """Expected earnings of the battery schedule over the optimization horizon."""
+
+    def __init__(self, coordinator: BatteryCoordinator, name: str = "Battery Arbitrage Profit"):
+        super().__init__(coordinator)
+        self._name = name
+        self._attr_native_value = None
+        self._attr_native_unit_of_measurement = CURRENCY_EURO
+
+    @cached_property
+    def name(self):
+        return self._name
+
+    @cached_property
+    def device_class(self):
+        return SensorDeviceClass.MONETARY
+
+    @property
+    def native_value(self):  # type: ignore[override]
+        return self._attr_native_value
+
+    async def async_added_to_hass(self) -> None:
+        """Populate the state from the already refreshed coordinator."""
+        await super().async_added_to_hass()
+        self._handle_coordinator_update()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
+        schedule = self.coordinator.data
+        self._attr_native_value = round(schedule.profit, 2) if schedule is not None else None
+        self.async_write_ha_state()
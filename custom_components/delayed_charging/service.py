@@ -1,15 +1,42 @@
 import datetime
 import logging
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from dataclasses import dataclass
+from itertools import accumulate, islice
+from typing import Any, overload
+
+import numpy as np
+import numpy.typing as npt
+
+from custom_components.delayed_charging.const import (
+    CONF_CHEAPEST,
+    CONF_THRESH,
+    CONF_THRESH_MODE,
+    DEFAULT_CHEAPEST,
+    DEFAULT_THRESH,
+    DEFAULT_THRESH_MODE,
+    THRESH_MODE_PERCENT,
+    THRESH_MODE_SLOTS,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
 SYSTEM_TZ = datetime.datetime.now().astimezone().tzinfo
 
+RESOLUTION_MS = {"quarterhour": 15 * 60 * 1000, "hour": 60 * 60 * 1000}
+
 
 def ts2dt(timestamp: int) -> datetime.datetime:
     return datetime.datetime.fromtimestamp(timestamp / 1e3, tz=SYSTEM_TZ)
 
 
+def dt2ts(dt: datetime.datetime) -> int:
+    return int(dt.timestamp() * 1000)
+
+
 def same_date(dt1: datetime.datetime, dt2: datetime.datetime) -> bool:
     d1 = dt1.date()
     d2 = dt2.date()
@@ -20,37 +47,586 @@ def dtfmt(dt: datetime.datetime) -> str:
     return dt.strftime("%Y-%m-%d %H-%M-%S")
 
 
+def _as_array[T: (int, float)](typecode: str, values: Iterable[T]) -> array[T]:
+    """Return `values` as array of `typecode`, without copying if it already is one."""
+    if isinstance(values, array) and values.typecode == typecode:
+        return values
+    return array(typecode, values)
+
+
+class ThresholdIndex:
+    """Threshold queries on a window of prices, each in O(log n) for any threshold.
+
+    Built once per window in O(n log n) from a min segment tree over the prices, whose descent finds the
+    first slot below a threshold at or after any start, and the prices in ascending order along with
+    their permutation `order`, which gives how many and which slots are below a threshold. Indexes refer
+    to the full series, i.e. they start at `offset`.
+    """
+
+    __slots__ = ("_min_tree", "_size", "offset", "order", "sorted_prices")
+
+    def __init__(self, prices: Sequence[float], offset: int = 0):
+        self.offset = offset
+        # leaves from `_size` on, padded with infinity; node i holds the minimum of nodes 2i and 2i + 1
+        self._size = 1
+        while self._size < len(prices):
+            self._size *= 2
+        self._min_tree = array("d", [math.inf]) * (2 * self._size)
+        self._min_tree[self._size : self._size + len(prices)] = array("d", prices)
+        for i in range(self._size - 1, 0, -1):
+            self._min_tree[i] = min(self._min_tree[2 * i], self._min_tree[2 * i + 1])
+        order = sorted(range(len(prices)), key=prices.__getitem__)
+        self.sorted_prices = array("d", (prices[i] for i in order))
+        self.order = array("q", (offset + i for i in order))
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def first_below(self, threshold: float, start: int = 0) -> int | None:
+        """Index of the first slot priced below `threshold`, at or after the slot `start`."""
+        lo = max(start - self.offset, 0)
+        if lo >= len(self.order):
+            return None
+        tree = self._min_tree
+        # up from the leaf of `lo` to the first subtree to its right that holds a cheaper slot ...
+        i = self._size + lo
+        while tree[i] >= threshold:
+            while i & 1:
+                i >>= 1
+            if i == 0:
+                return None
+            i += 1
+        # ... and down to its leftmost such slot
+        while i < self._size:
+            i = 2 * i if tree[2 * i] < threshold else 2 * i + 1
+        return self.offset + i - self._size
+
+    def any_below(self, threshold: float) -> bool:
+        return len(self.order) > 0 and self._min_tree[1] < threshold
+
+    def count_below(self, threshold: float) -> int:
+        return bisect_left(self.sorted_prices, threshold)
+
+    def indexes_below(self, threshold: float) -> array[int]:
+        """Indexes of all slots priced below `threshold`, cheapest first."""
+        return self.order[: self.count_below(threshold)]
+
+
+def day_ranges(timestamps: Sequence[int]) -> list[tuple[int, int]]:
+    """Return the index range of each local calendar day in sorted `timestamps` (epoch ms)."""
+    if not len(timestamps):
+        return []
+    day = ts2dt(timestamps[0]).date()
+    last_day = ts2dt(timestamps[-1]).date()
+    days: list[tuple[int, int]] = []
+    lo = 0
+    while day <= last_day:
+        day += datetime.timedelta(days=1)
+        hi = bisect_left(timestamps, dt2ts(datetime.datetime.combine(day, datetime.time(tzinfo=SYSTEM_TZ))), lo=lo)
+        if hi > lo:
+            days.append((lo, hi))
+        lo = hi
+    return days
+
+
+def lttb(x: npt.ArrayLike, y: npt.ArrayLike, count: int) -> npt.NDArray[np.int64]:
+    """Return the indexes of `count` points that keep the visual shape of the line `(x, y)`.
+
+    Largest-Triangle-Three-Buckets: first and last point are kept; of each bucket in between, the point
+    forming the largest triangle with the previously kept point and the average of the next bucket.
+    Returns all indexes if there are no more than `count` points (or `count` is below 3).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if count >= n or count < 3:
+        return np.arange(n)
+    every = (n - 2) / (count - 2)
+    indexes = np.empty(count, dtype=np.int64)
+    indexes[0], indexes[-1] = 0, n - 1
+    kept = 0
+    for bucket in range(count - 2):
+        lo = int(bucket * every) + 1
+        hi = int((bucket + 1) * every) + 1
+        next_hi = min(int((bucket + 2) * every) + 1, n)
+        next_x, next_y = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+        area = np.abs((x[kept] - next_x) * (y[lo:hi] - y[kept]) - (x[kept] - x[lo:hi]) * (next_y - y[kept]))
+        kept = lo + int(np.argmax(area))
+        indexes[bucket + 1] = kept
+    return indexes
+
+
+@dataclass(frozen=True)
+class SlotStats:
+    """Rank (1 = cheapest), percentile (0 = cheapest, 100 = dearest) and z-score of each slot within its day.
+
+    `days` holds the index range of each local calendar day in the series. Equal prices share a rank.
+    """
+
+    rank: npt.NDArray[np.int64]
+    percentile: npt.NDArray[np.float64]
+    zscore: npt.NDArray[np.float64]
+    days: list[tuple[int, int]]
+
+    def day_of(self, index: int) -> tuple[int, int]:
+        """Return the index range of the day the slot `index` belongs to."""
+        return self.days[bisect_right([lo for lo, _ in self.days], index) - 1]
+
+
+@dataclass(frozen=True)
+class PriceSlot:
+    start: datetime.datetime
+    end: datetime.datetime
+    price: float
+
+
+class PriceSeries:
+    """Time-sorted prices of one bidding zone at a fixed resolution.
+
+    Slot starts (epoch ms) and prices are kept in two contiguous arrays, i.e. 16 bytes per slot instead
+    of a tuple, a datetime and a float object each. Computations work on `timestamps` and `prices`
+    directly; datetimes are only created when slots are accessed as `(datetime, price)` pairs, e.g.
+    by indexing or iterating at the entity boundary. Slicing returns a `PriceSeries` again.
+
+    Slots start at least `resolution_ms` apart; missing slots (e.g. unpublished prices) leave gaps.
+    """
+
+    __slots__ = (
+        "_charts",
+        "_cheapest_thresholds",
+        "_current",
+        "_slot_stats",
+        "_threshold_indexes",
+        "prices",
+        "resolution_ms",
+        "timestamps",
+    )
+
+    def __init__(
+        self,
+        timestamps: Iterable[int] = (),
+        prices: Iterable[float] = (),
+        resolution_ms: int = RESOLUTION_MS["quarterhour"],
+    ):
+        self.timestamps = _as_array("q", timestamps)
+        self.prices = _as_array("d", prices)
+        if len(self.timestamps) != len(self.prices):
+            raise ValueError("Timestamps and prices differ in length.")
+        self.resolution_ms = resolution_ms
+        # last slot returned by `slot_at`, as (start, end, slot)
+        self._current: tuple[int, int, PriceSlot] | None = None
+        self._threshold_indexes: dict[tuple[int, int], ThresholdIndex] = {}
+        self._cheapest_thresholds: dict[tuple[int, int, int], float] = {}
+        self._slot_stats: SlotStats | None = None
+        self._charts: dict[tuple[bool, int], Any] = {}
+
+    @classmethod
+    def from_items(
+        cls, items: Iterable[Sequence[int | float | None]], resolution_ms: int = RESOLUTION_MS["quarterhour"]
+    ) -> "PriceSeries":
+        """Create a series from SMARD's `[ts, price]` items, dropping those without price."""
+        series = cls(resolution_ms=resolution_ms)
+        for ts, price in items:
+            if price is not None and ts is not None:
+                series.timestamps.append(int(ts))
+                series.prices.append(price)
+        return series
+
+    @classmethod
+    def from_datetimes(
+        cls, items: Iterable[tuple[datetime.datetime, float]], resolution_ms: int = RESOLUTION_MS["quarterhour"]
+    ) -> "PriceSeries":
+        """Create a series from `(datetime, price)` pairs."""
+        return cls.from_items(((dt2ts(dt), price) for dt, price in items), resolution_ms)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @overload
+    def __getitem__(self, index: int) -> tuple[datetime.datetime, float]: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "PriceSeries": ...
+
+    def __getitem__(self, index: int | slice) -> "tuple[datetime.datetime, float] | PriceSeries":
+        if isinstance(index, slice):
+            return PriceSeries(self.timestamps[index], self.prices[index], self.resolution_ms)
+        return ts2dt(self.timestamps[index]), self.prices[index]
+
+    def __iter__(self) -> Iterator[tuple[datetime.datetime, float]]:
+        for ts, price in zip(self.timestamps, self.prices, strict=True):
+            yield ts2dt(ts), price
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, PriceSeries):
+            return NotImplemented
+        return (
+            self.resolution_ms == other.resolution_ms and self.timestamps == other.timestamps and self.prices == other.prices
+        )
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        if not self.timestamps:
+            return f"PriceSeries(resolution_ms={self.resolution_ms}, empty)"
+        return (
+            f"PriceSeries(resolution_ms={self.resolution_ms}, {len(self)} slots "
+            f"from {dtfmt(ts2dt(self.timestamps[0]))} to {dtfmt(ts2dt(self.timestamps[-1]))})"
+        )
+
+    def between(self, start: int, end: int) -> "PriceSeries":
+        """Return the slots starting in `[start, end)` (epoch ms)."""
+        lo = bisect_left(self.timestamps, start)
+        hi = bisect_left(self.timestamps, end, lo=lo)
+        return self[lo:hi]
+
+    def threshold_index(self, lo: int = 0, hi: int | None = None) -> ThresholdIndex:
+        """Return the threshold index of the slots `lo` to `hi` (exclusive), built on first use.
+
+        The series is replaced on every data update, so all entities evaluating it share the index.
+        """
+        hi = len(self) if hi is None else min(hi, len(self))
+        lo = min(lo, hi)
+        index = self._threshold_indexes.get((lo, hi))
+        if index is None:
+            index = self._threshold_indexes[lo, hi] = ThresholdIndex(self.prices[lo:hi], lo)
+        return index
+
+    def cheapest_threshold(self, count: int, lo: int = 0, hi: int | None = None) -> float:
+        """Return the threshold below which the `count` cheapest of the slots `lo` to `hi` (exclusive) are priced.
+
+        The `count`-th cheapest price is found by linear-time selection (`np.partition`) instead of a full
+        sort. Slots priced the same as it are below the threshold as well, so ties may add a few slots.
+        """
+        hi = len(self) if hi is None else min(hi, len(self))
+        lo = min(lo, hi)
+        count = min(max(count, 0), hi - lo)
+        threshold = self._cheapest_thresholds.get((count, lo, hi))
+        if threshold is None:
+            if count == 0:
+                threshold = -math.inf
+            else:
+                prices = np.frombuffer(self.prices, dtype=np.float64)[lo:hi]
+                kth = np.partition(prices, count - 1)[count - 1]
+                threshold = float(np.nextafter(kth, math.inf))
+            self._cheapest_thresholds[count, lo, hi] = threshold
+        return threshold
+
+    def chart_payload(self, columnar: bool = False, max_points: int = 0) -> Any:
+        """Return the series for charts, built on first use and shared by all entities.
+
+        By default, a list of `{"x": isoformat, "y": price}` points as ApexCharts Card expects them;
+        with `columnar`, `{"timestamps": [epoch ms], "prices": [...]}`, which is a fraction of the size.
+        With `max_points`, longer series are downsampled by LTTB to that many points.
+        """
+        key = (columnar, max_points)
+        payload = self._charts.get(key)
+        if payload is None:
+            series = self
+            if max_points and len(self) > max_points:
+                indexes: list[int] = lttb(self.timestamps, self.prices, max_points).tolist()
+                series = PriceSeries(
+                    (self.timestamps[i] for i in indexes), (self.prices[i] for i in indexes), self.resolution_ms
+                )
+            if columnar:
+                payload = {"timestamps": series.timestamps.tolist(), "prices": series.prices.tolist()}
+            else:
+                payload = [{"x": dt.isoformat(), "y": price} for dt, price in series]
+            self._charts[key] = payload
+        return payload
+
+    def days(self) -> list[tuple[int, int]]:
+        """Return the index range of each local calendar day covered by the series."""
+        return day_ranges(self.timestamps)
+
+    def slot_stats(self) -> SlotStats:
+        """Return rank, percentile and z-score of every slot within its day, computed on first use.
+
+        The series is replaced on every data update, so the statistics are computed once per update,
+        vectorized per day, and shared by all entities.
+        """
+        if self._slot_stats is None:
+            prices = np.frombuffer(self.prices, dtype=np.float64)
+            rank = np.empty(len(prices), dtype=np.int64)
+            percentile = np.empty(len(prices), dtype=np.float64)
+            zscore = np.empty(len(prices), dtype=np.float64)
+            days = self.days()
+            for lo, hi in days:
+                day = prices[lo:hi]
+                rank[lo:hi] = np.searchsorted(np.sort(day), day, side="left") + 1
+                percentile[lo:hi] = (rank[lo:hi] - 1) * 100 / (hi - lo - 1) if hi - lo > 1 else 0.0
+                std = day.std()
+                zscore[lo:hi] = (day - day.mean()) / std if std > 0 else 0.0
+            self._slot_stats = SlotStats(rank, percentile, zscore, days)
+        return self._slot_stats
+
+    def index_at(self, ts: int) -> int | None:
+        """Return the index of the slot covering `ts` (epoch ms), or None in a gap or outside the series.
+
+        Up to the first gap, the index follows from the distance to the first slot; past it, the slot
+        is found by bisection. Slot starts are epoch based, so DST transitions need no special care.
+        """
+        timestamps, resolution_ms = self.timestamps, self.resolution_ms
+        if not timestamps or ts < timestamps[0]:
+            return None
+        i = (ts - timestamps[0]) // resolution_ms
+        if i >= len(timestamps) or timestamps[i] != timestamps[0] + i * resolution_ms:
+            i = bisect_right(timestamps, ts) - 1
+        return i if ts < timestamps[i] + resolution_ms else None
+
+    def next_boundary(self, ts: int) -> int | None:
+        """Return the next slot start or end after `ts` (epoch ms), i.e. when the current price changes next."""
+        i = self.index_at(ts)
+        if i is not None:
+            return self.timestamps[i] + self.resolution_ms
+        i = bisect_right(self.timestamps, ts)
+        return self.timestamps[i] if i < len(self.timestamps) else None
+
+    def slot_at(self, ts: int) -> PriceSlot | None:
+        """Return start, end and price of the slot covering `ts` (epoch ms).
+
+        The result is kept until `ts` passes the slot's end, so repeated lookups within a slot are free.
+        """
+        current = self._current
+        if current is not None and current[0] <= ts < current[1]:
+            return current[2]
+        i = self.index_at(ts)
+        if i is None:
+            return None
+        start = self.timestamps[i]
+        end = start + self.resolution_ms
+        slot = PriceSlot(ts2dt(start), ts2dt(end), self.prices[i])
+        self._current = (start, end, slot)
+        return slot
+
+
+def get_threshold(timeseries: PriceSeries, options: Mapping[str, Any], lo: int = 0, hi: int | None = None) -> float:
+    """Return the price threshold a config entry's options define on the slots `lo` to `hi` (exclusive).
+
+    Besides an absolute price, the threshold can be relative to these slots: the cheapest `cheapest`
+    percent of them or the `cheapest` cheapest ones. It then adapts to expensive and cheap days, as long
+    as the slots are those of the day in question (see `today_range` and `upcoming_range`) rather than
+    a window that includes past days.
+    """
+    hi = len(timeseries) if hi is None else min(hi, len(timeseries))
+    mode = options.get(CONF_THRESH_MODE, DEFAULT_THRESH_MODE)
+    cheapest = options.get(CONF_CHEAPEST, DEFAULT_CHEAPEST)
+    if mode == THRESH_MODE_PERCENT:
+        return timeseries.cheapest_threshold(math.ceil(max(hi - lo, 0) * min(cheapest, 100.0) / 100), lo, hi)
+    if mode == THRESH_MODE_SLOTS:
+        return timeseries.cheapest_threshold(int(cheapest), lo, hi)
+    return options.get(CONF_THRESH, DEFAULT_THRESH)
+
+
 def get_charging_start(
-    timeseries: list[tuple[datetime.datetime, float]],
+    timeseries: PriceSeries,
     threshold: float,
+    upcoming: bool = False,
 ) -> datetime.datetime | None:
-    series_neg = [item for item in timeseries if item[1] < threshold]
+    """Return the start of the first slot priced below `threshold`.
 
-    if len(series_neg) == 0:
-        charging_start = None
-    else:
-        charging_start = series_neg[0][0]
+    With `upcoming`, runs of cheap slots that are already over are skipped, i.e. the result is the start
+    of the ongoing or next run. This is what matters for a series spanning several days.
+    """
+    first = upcoming_range(timeseries)[0] if upcoming else 0
+
+    # one index per series serves every start, so ticks through the day do not build new ones
+    i = timeseries.threshold_index().first_below(threshold, first)
+    if i is None:
+        return None
+    if upcoming and i == first:
+        # the current slot is cheap: its run may have started earlier
+        prices = timeseries.prices
+        while i > 0 and prices[i - 1] < threshold:
+            i -= 1
+    return ts2dt(timeseries.timestamps[i])
+
+
+def upcoming_range(timeseries: PriceSeries) -> tuple[int, int]:
+    """Return the index range of the current and all later slots."""
+    now = dt2ts(datetime.datetime.now(SYSTEM_TZ))
+    return max(bisect_right(timeseries.timestamps, now) - 1, 0), len(timeseries)
 
-    return charging_start
+
+def today_range(timeseries: PriceSeries) -> tuple[int, int]:
+    """Return the index range of today's slots."""
+    today = datetime.datetime.now(SYSTEM_TZ).date()
+    midnight = datetime.time(tzinfo=SYSTEM_TZ)
+    lo = bisect_left(timeseries.timestamps, dt2ts(datetime.datetime.combine(today, midnight)))
+    hi = bisect_left(
+        timeseries.timestamps, dt2ts(datetime.datetime.combine(today + datetime.timedelta(days=1), midnight)), lo=lo
+    )
+    return lo, hi
 
 
 def delayed_charging_is_active_today(
-    timeseries: list[tuple[datetime.datetime, float]],
+    timeseries: PriceSeries,
     threshold: float,
+    today_only: bool = False,
+    upcoming: bool = False,
 ) -> bool:
-    return any(item[1] < threshold for item in timeseries)
+    """Return whether any slot is priced below `threshold`.
+
+    With `today_only`, only today's slots count; with `upcoming`, only the current and later ones, i.e.
+    whether a cheap slot is still ahead.
+    """
+    lo, hi = today_range(timeseries) if today_only else (0, len(timeseries))
+    if upcoming:
+        lo = max(lo, upcoming_range(timeseries)[0])
+    # the whole series' index, as `lo` moves with every slot
+    i = timeseries.threshold_index().first_below(threshold, lo)
+    return i is not None and i < hi
+
+
+def count_slots_below(
+    timeseries: PriceSeries,
+    threshold: float,
+    today_only: bool = False,
+) -> int:
+    """Return the number of slots priced below `threshold`; with `today_only`, only today's slots count."""
+    lo, hi = today_range(timeseries) if today_only else (0, len(timeseries))
+    return timeseries.threshold_index(lo, hi).count_below(threshold)
+
+
+def get_current_slot(
+    timeseries: PriceSeries,
+) -> PriceSlot | None:
+    """Return start, end and price of the slot covering the current time."""
+    slot = timeseries.slot_at(dt2ts(datetime.datetime.now(SYSTEM_TZ)))
+    if slot is None:
+        _LOGGER.error("No current price data available.")
+    return slot
+
+
+def get_current_index(
+    timeseries: PriceSeries,
+) -> int | None:
+    """Return the index of the slot covering the current time."""
+    return timeseries.index_at(dt2ts(datetime.datetime.now(SYSTEM_TZ)))
 
 
 def get_current_price(
-    timeseries: list[tuple[datetime.datetime, float]],
+    timeseries: PriceSeries,
 ) -> float | None:
-    now = datetime.datetime.now(SYSTEM_TZ)
-    prices_in_the_past = [price for dt, price in timeseries if dt <= now]
+    slot = get_current_slot(timeseries)
+    if slot is None:
+        return None
+    _LOGGER.debug("Current price: %s", slot.price)
+    return slot.price
 
-    if len(prices_in_the_past) == 0:
-        _LOGGER.error("No current price data available.")
+
+@dataclass(frozen=True)
+class ChargingPlan:
+    """Charging intervals in chronological order, delivering `energy` (kWh) at `cost` (€)."""
+
+    slots: list[PriceSlot]
+    energy: float
+    cost: float
+
+    @property
+    def start(self) -> datetime.datetime:
+        return self.slots[0].start
+
+    @property
+    def end(self) -> datetime.datetime:
+        return self.slots[-1].end
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "start": self.start.isoformat(),
+            "end": self.end.isoformat(),
+            "energy": self.energy,
+            "cost": self.cost,
+            "slots": [
+                {"start": slot.start.isoformat(), "end": slot.end.isoformat(), "price": slot.price} for slot in self.slots
+            ],
+        }
+
+
+def _cheapest_window(timeseries: PriceSeries, lo: int, hi: int, count: int, fraction: float) -> tuple[int, bool] | None:
+    """Return the first slot of the cheapest run of `count` consecutive slots in `[lo, hi)`.
+
+    Only `fraction` of one slot at either end of the run is needed; the second value tells whether
+    that is the first slot (rather than the last). Runs spanning a gap in the series are skipped.
+    """
+    timestamps, prices = timeseries.timestamps, timeseries.prices
+    prefix = list(accumulate(prices[lo:hi], initial=0.0))
+    span = (count - 1) * timeseries.resolution_ms
+    best: tuple[float, int, bool] | None = None
+    for i in range(lo, hi - count + 1):
+        if timestamps[i + count - 1] - timestamps[i] != span:
+            continue
+        full = prefix[i - lo + count] - prefix[i - lo]
+        for cost, partial_first in (
+            (full - (1 - fraction) * prices[i + count - 1], False),
+            (full - (1 - fraction) * prices[i], True),
+        ):
+            if best is None or cost < best[0]:
+                best = (cost, i, partial_first)
+    return None if best is None else (best[1], best[2])
+
+
+def plan_charging(
+    timeseries: PriceSeries,
+    energy: float,
+    power: float,
+    deadline: datetime.datetime,
+    start: datetime.datetime | None = None,
+    contiguous: bool = False,
+) -> ChargingPlan | None:
+    """Plan charging `energy` (kWh) at `power` (kW) before `deadline` at minimum cost.
+
+    Slots starting at or after `start` (default: now) and ending by the deadline are considered. By
+    default the cheapest of them are picked, in O(n log n); with `contiguous`, the cheapest run of
+    consecutive slots is found with a sliding window in O(n). The slot of which only a part is needed
+    is charged at its beginning, or at its end if it opens a contiguous run. Prices are in €/MWh.
+    Returns None if the published slots cannot deliver the energy in time.
+    """
+    if energy <= 0 or power <= 0:
+        raise ValueError("Energy and power must be positive.")
+    timestamps, prices, resolution_ms = timeseries.timestamps, timeseries.prices, timeseries.resolution_ms
+    if start is None:
+        start = datetime.datetime.now(SYSTEM_TZ)
+    lo = bisect_left(timestamps, dt2ts(start))
+    hi = max(bisect_right(timestamps, dt2ts(deadline) - resolution_ms), lo)
+
+    slots_needed = energy / (power * resolution_ms / 3_600_000)
+    count = math.ceil(slots_needed - 1e-9)
+    fraction = slots_needed - (count - 1)
+    if hi - lo < count:
         return None
+
+    # (slot index, share of the slot, whether the share is at the end of the slot)
+    picks: list[tuple[int, float, bool]]
+    if contiguous:
+        window = _cheapest_window(timeseries, lo, hi, count, fraction)
+        if window is None:
+            return None
+        first, partial_first = window
+        picks = [(i, 1.0, False) for i in range(first, first + count)]
+        if partial_first:
+            picks[0] = (first, fraction, True)
+        else:
+            picks[-1] = (first + count - 1, fraction, False)
     else:
-        current_price = prices_in_the_past[-1]
-        _LOGGER.debug("Current price: %s", current_price)
-        return current_price
+        # the whole series' order, restricted to the window, as `lo` moves with the current time
+        order = list(islice((i for i in timeseries.threshold_index().order if lo <= i < hi), count))
+        picks = sorted([(i, 1.0, False) for i in order[:-1]] + [(order[-1], fraction, False)])
+
+    slots: list[PriceSlot] = []
+    cost = 0.0
+    for i, share, at_end in picks:
+        duration = round(share * resolution_ms)
+        slot_start = timestamps[i] + resolution_ms - duration if at_end else timestamps[i]
+        slots.append(PriceSlot(ts2dt(slot_start), ts2dt(slot_start + duration), prices[i]))
+        cost += prices[i] * power * duration / 3_600_000 / 1000
+    return ChargingPlan(slots, energy, cost)
+
+
+def next_time_of_day(time_of_day: datetime.time) -> datetime.datetime:
+    """Return the next occurrence of a wall-clock time, today or tomorrow."""
+    now = datetime.datetime.now(SYSTEM_TZ)
+    today = datetime.datetime.combine(now.date(), time_of_day, tzinfo=SYSTEM_TZ)
+    if today > now:
+        return today
+    return datetime.datetime.combine(now.date() + datetime.timedelta(days=1), time_of_day, tzinfo=SYSTEM_TZ)
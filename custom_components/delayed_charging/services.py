@@ -0,0 +1,175 @@
+"""Service actions of the Delayed Charging integration."""
+
+import datetime
+
+import voluptuous as vol
+from homeassistant.config_entries import ConfigEntryState
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
+from homeassistant.exceptions import ServiceValidationError
+from homeassistant.helpers import config_validation as cv
+
+from custom_components.delayed_charging.arbitrage import Battery, optimize_battery
+from custom_components.delayed_charging.const import CONF_CONTIGUOUS, CONF_ENERGY, CONF_POWER, DOMAIN
+from custom_components.delayed_charging.coordinator import ElectricityPriceCoordinator
+from custom_components.delayed_charging.scheduler import Load, schedule_loads
+from custom_components.delayed_charging.service import SYSTEM_TZ, plan_charging
+
+SERVICE_PLAN_CHARGING = "plan_charging"
+SERVICE_SCHEDULE_LOADS = "schedule_loads"
+SERVICE_OPTIMIZE_BATTERY = "optimize_battery"
+ATTR_CONFIG_ENTRY_ID = "config_entry_id"
+ATTR_DEADLINE = "deadline"
+ATTR_START = "start"
+ATTR_LOADS = "loads"
+ATTR_NAME = "name"
+ATTR_GRID_LIMIT = "grid_limit"
+ATTR_CAPACITY = "capacity"
+ATTR_SOC = "soc"
+ATTR_CHARGE_POWER = "charge_power"
+ATTR_DISCHARGE_POWER = "discharge_power"
+ATTR_EFFICIENCY = "efficiency"
+ATTR_FINAL_SOC = "final_soc"
+ATTR_HORIZON = "horizon"
+ATTR_SOC_STEPS = "soc_steps"
+
+_POSITIVE = vol.All(vol.Coerce(float), vol.Range(min=0, min_included=False))
+
+PLAN_CHARGING_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Required(CONF_ENERGY): _POSITIVE,
+        vol.Required(CONF_POWER): _POSITIVE,
+        vol.Required(ATTR_DEADLINE): cv.datetime,
+        vol.Optional(ATTR_START): cv.datetime,
+        vol.Optional(CONF_CONTIGUOUS, default=False): cv.boolean,
+    }
+)
+
+LOAD_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_NAME): cv.string,
+        vol.Required(CONF_ENERGY): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Required(CONF_POWER): _POSITIVE,
+        vol.Required(ATTR_DEADLINE): cv.datetime,
+        vol.Optional(ATTR_START): cv.datetime,
+    }
+)
+
+SCHEDULE_LOADS_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Required(ATTR_GRID_LIMIT): _POSITIVE,
+        vol.Required(ATTR_LOADS): vol.All(cv.ensure_list, vol.Length(min=1), [LOAD_SCHEMA]),
+    }
+)
+
+OPTIMIZE_BATTERY_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Required(ATTR_CAPACITY): _POSITIVE,
+        vol.Required(ATTR_SOC): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Required(ATTR_CHARGE_POWER): _POSITIVE,
+        vol.Optional(ATTR_DISCHARGE_POWER): _POSITIVE,
+        vol.Optional(ATTR_EFFICIENCY, default=0.95): vol.All(vol.Coerce(float), vol.Range(min=0, max=1, min_included=False)),
+        vol.Optional(ATTR_FINAL_SOC): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(ATTR_HORIZON, default=48): vol.All(vol.Coerce(float), vol.Range(min=0, max=168, min_included=False)),
+        vol.Optional(ATTR_SOC_STEPS, default=100): vol.All(vol.Coerce(int), vol.Range(min=1, max=1000)),
+    }
+)
+
+
+def _local(dt: datetime.datetime) -> datetime.datetime:
+    return dt if dt.tzinfo is not None else dt.replace(tzinfo=SYSTEM_TZ)
+
+
+def _get_coordinator(hass: HomeAssistant, entry_id: str) -> ElectricityPriceCoordinator:
+    """Return the price coordinator of a loaded config entry."""
+    entry = hass.config_entries.async_get_entry(entry_id)
+    if entry is None or entry.domain != DOMAIN:
+        raise ServiceValidationError(f"No Delayed Charging entry with ID {entry_id}.")
+    if entry.state is not ConfigEntryState.LOADED:
+        raise ServiceValidationError(f"{entry.title} is not loaded.")
+    return entry.runtime_data.coordinator
+
+
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the service actions; they work on the prices the coordinators already hold."""
+
+    async def async_plan_charging(call: ServiceCall) -> ServiceResponse:
+        coordinator = _get_coordinator(hass, call.data[ATTR_CONFIG_ENTRY_ID])
+        start = call.data.get(ATTR_START)
+        plan = plan_charging(
+            coordinator.data,
+            call.data[CONF_ENERGY],
+            call.data[CONF_POWER],
+            _local(call.data[ATTR_DEADLINE]),
+            start=_local(start) if start is not None else None,
+            contiguous=call.data[CONF_CONTIGUOUS],
+        )
+        if plan is None:
+            raise ServiceValidationError("The published prices do not cover enough slots to charge before the deadline.")
+        return plan.as_dict()
+
+    async def async_schedule_loads(call: ServiceCall) -> ServiceResponse:
+        coordinator = _get_coordinator(hass, call.data[ATTR_CONFIG_ENTRY_ID])
+        loads = [
+            Load(
+                load[ATTR_NAME],
+                load[CONF_ENERGY],
+                load[CONF_POWER],
+                _local(load[ATTR_DEADLINE]),
+                start=_local(load[ATTR_START]) if ATTR_START in load else None,
+            )
+            for load in call.data[ATTR_LOADS]
+        ]
+        # the scheduler is CPU bound for many loads and slots
+        schedules = await hass.async_add_executor_job(schedule_loads, coordinator.data, loads, call.data[ATTR_GRID_LIMIT])
+        return {
+            "cost": sum(schedule.cost for schedule in schedules),
+            "missing": sum(schedule.missing for schedule in schedules),
+            "loads": [schedule.as_dict() for schedule in schedules],
+        }
+
+    async def async_optimize_battery(call: ServiceCall) -> ServiceResponse:
+        coordinator = _get_coordinator(hass, call.data[ATTR_CONFIG_ENTRY_ID])
+        battery = Battery(
+            call.data[ATTR_CAPACITY],
+            call.data[ATTR_CHARGE_POWER],
+            call.data.get(ATTR_DISCHARGE_POWER, call.data[ATTR_CHARGE_POWER]),
+            call.data[ATTR_EFFICIENCY],
+            call.data[ATTR_SOC_STEPS],
+        )
+        try:
+            schedule = await hass.async_add_executor_job(
+                optimize_battery,
+                coordinator.data,
+                battery,
+                call.data[ATTR_SOC],
+                datetime.timedelta(hours=call.data[ATTR_HORIZON]),
+                call.data.get(ATTR_FINAL_SOC),
+            )
+        except ValueError as err:
+            raise ServiceValidationError(str(err)) from err
+        return schedule.as_dict()
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_PLAN_CHARGING,
+        async_plan_charging,
+        schema=PLAN_CHARGING_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_SCHEDULE_LOADS,
+        async_schedule_loads,
+        schema=SCHEDULE_LOADS_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_OPTIMIZE_BATTERY,
+        async_optimize_battery,
+        schema=OPTIMIZE_BATTERY_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
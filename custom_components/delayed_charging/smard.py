@@ -1,13 +1,24 @@
+import asyncio
 import datetime
 import logging
+import re
+import time
+import weakref
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Awaitable, Callable, Iterable, Sequence
+from dataclasses import dataclass, field
+from typing import Any
 
 import aiohttp
 
+from custom_components.delayed_charging.cache import CacheEntry, CacheKey, SmardCache
 from custom_components.delayed_charging.service import (
+    RESOLUTION_MS,
     SYSTEM_TZ,
+    PriceSeries,
+    dt2ts,
     dtfmt,
-    same_date,
-    ts2dt,
 )
 
 _LOGGER = logging.getLogger(__name__)
@@ -31,64 +42,373 @@ SMARD_COUNTRIES = {
     "262": "Hungary",
 }
 
+SMARD_BASE_URL = "https://www.smard.de/app/chart_data"
+RESOLUTION = "quarterhour"
 
-async def get_pricing_info(country_id: str = "4169"):
-    """Get electricity price as function of time for current day."""
+# Settings of the pooled session; change them before the first request of an event loop.
+CONNECTION_LIMIT = 16
+CONNECTION_LIMIT_PER_HOST = 8
+KEEPALIVE_TIMEOUT = 60.0
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=30, connect=10)
 
-    empty_series: list[tuple[datetime.datetime, float]] = []
+STREAM_CHUNK_SIZE = 16384
 
+_SERIES_KEY = b'"series"'
+_SERIES_ITEM = re.compile(rb"\[\s*(-?\d+)\s*,\s*(null|[-+0-9.eE]+)\s*\]")
+
+# Sorted index arrays, rebuilt only when a new index file was decoded
+_index_arrays: dict[tuple[str, str], tuple[dict[str, Any], array[int]]] = {}
+
+_sessions: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession] = weakref.WeakKeyDictionary()
+
+
+def create_session(
+    limit: int = CONNECTION_LIMIT,
+    limit_per_host: int = CONNECTION_LIMIT_PER_HOST,
+    keepalive_timeout: float = KEEPALIVE_TIMEOUT,
+    timeout: aiohttp.ClientTimeout = REQUEST_TIMEOUT,
+) -> aiohttp.ClientSession:
+    """Create a client session whose keep-alive connections are reused across SMARD requests."""
+    connector = aiohttp.TCPConnector(limit=limit, limit_per_host=limit_per_host, keepalive_timeout=keepalive_timeout)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Return the pooled session of the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = _sessions[loop] = create_session(
+            limit=CONNECTION_LIMIT,
+            limit_per_host=CONNECTION_LIMIT_PER_HOST,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            timeout=REQUEST_TIMEOUT,
+        )
+    return session
+
+
+async def close_session() -> None:
+    """Close the pooled session of the running event loop, e.g. before the loop stops."""
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+class SeriesDecoder:
+    """Incremental decoder for the `series` array of a SMARD chunk file.
+
+    Feed it the response body piece by piece. Only `[ts, price]` pairs with `start <= ts < end` are
+    materialized, null prices are dropped and, as SMARD series are sorted, decoding is `done` as soon
+    as a timestamp at or after `end` shows up.
+    """
+
+    def __init__(self, start: int | None = None, end: int | None = None):
+        self._start = start
+        self._end = end
+        self._buffer: bytes = b""
+        self._in_series = False
+        self.done = False
+        self.series: list[list[int | float]] = []
+
+    def feed(self, data: bytes) -> None:
+        if self.done:
+            return
+        buffer: bytes = self._buffer + data
+        if not self._in_series:
+            key_pos: int = buffer.find(_SERIES_KEY)
+            array_pos: int = buffer.find(b"[", key_pos) if key_pos >= 0 else -1
+            if array_pos < 0:
+                # keep what might be the beginning of the key or the array
+                self._buffer = buffer[key_pos:] if key_pos >= 0 else buffer[-len(_SERIES_KEY) :]
+                return
+            buffer = buffer[array_pos + 1 :]
+            self._in_series = True
+
+        start, end, series = self._start, self._end, self.series
+        pos = 0
+        match: re.Match[bytes]
+        for match in _SERIES_ITEM.finditer(buffer):
+            pos = match.end()
+            ts = int(match[1])
+            if start is not None and ts < start:
+                continue
+            if end is not None and ts >= end:
+                self.done = True
+                return
+            price: bytes = match[2]
+            if price != b"null":
+                series.append([ts, float(price)])
+
+        rest: bytes = buffer[pos:]
+        if rest.lstrip(b" \t\r\n,").startswith(b"]"):
+            self.done = True
+        self._buffer = rest
+
+
+def _series_decoder(
+    start: int | None = None, end: int | None = None
+) -> Callable[[aiohttp.ClientResponse], Awaitable[dict[str, Any]]]:
+    """Create a decode function for `_fetch` that streams a chunk file through a `SeriesDecoder`."""
+
+    async def decode(response: aiohttp.ClientResponse) -> dict[str, Any]:
+        decoder = SeriesDecoder(start, end)
+        async for data in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+            decoder.feed(data)
+            if decoder.done:
+                break
+        return {"series": decoder.series}
+
+    return decode
+
+
+async def _decode_json(response: aiohttp.ClientResponse) -> dict[str, Any]:
+    return await response.json()
+
+
+async def _fetch(
+    session: aiohttp.ClientSession,
+    url: str,
+    cache: SmardCache | None,
+    key: CacheKey,
+    decode: Callable[[aiohttp.ClientResponse], Awaitable[dict[str, Any]]] = _decode_json,
+    max_age: datetime.timedelta | None = None,
+) -> dict[str, Any]:
+    """GET a SMARD file, serving it from the cache or revalidating it when possible."""
+    cached = await cache.async_get(key) if cache is not None else None
+    if cache is not None and cached is not None and cache.is_fresh(key, cached, max_age=max_age):
+        _LOGGER.debug("Serving %s from cache", url)
+        return cached.data
+
+    headers: dict[str, str] = {}
+    if cached is not None:
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+
+    async with session.get(url, headers=headers, timeout=REQUEST_TIMEOUT) as response:
+        if cache is not None and cached is not None and response.status == 304:
+            _LOGGER.debug("%s not modified", url)
+            cache.touch(key)
+            return cached.data
+        # an error page must neither be decoded as an empty chunk nor be cached
+        response.raise_for_status()
+        data = await decode(response)
+        if cache is not None:
+            entry = CacheEntry(
+                data=data,
+                fetched_at=time.time(),
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
+            await cache.async_put(key, entry)
+    return data
+
+
+def slice_series(series: Sequence[Sequence[Any]], start: int, end: int) -> Sequence[Sequence[Any]]:
+    """Return the items of a time-sorted `[ts, price]` series with `start <= ts < end` (epoch ms)."""
+    lo = bisect_left(series, start, key=lambda item: item[0])
+    hi = bisect_left(series, end, lo=lo, key=lambda item: item[0])
+    return series[lo:hi]
+
+
+def find_chunk(timestamps: Sequence[int], timestamp: int) -> int | None:
+    """Return the start of the chunk containing `timestamp` (epoch ms), i.e. the last one starting at or before it."""
+    i = bisect_right(timestamps, timestamp)
+    return timestamps[i - 1] if i else None
+
+
+def find_chunks(timestamps: Sequence[int], start: int, end: int) -> list[int]:
+    """Return the starts of all chunks overlapping the range `[start, end)` (epoch ms)."""
+    if end <= start:
+        return []
+    lo = max(bisect_right(timestamps, start) - 1, 0)
+    hi = bisect_left(timestamps, end)
+    return list(timestamps[lo:hi])
+
+
+def _index_array(country_id: str, resolution: str, data: dict[str, Any]) -> array[int]:
+    """Return the chunk starts of an index file as sorted integer array."""
+    memo = _index_arrays.get((country_id, resolution))
+    if memo is not None and memo[0] is data:
+        return memo[1]
+    timestamps = array("q", sorted(data.get("timestamps") or []))
+    _index_arrays[(country_id, resolution)] = (data, timestamps)
+    return timestamps
+
+
+class SmardError(Exception):
+    """Raised when SMARD does not provide the requested data."""
+
+
+@dataclass
+class PricingResult:
+    country_id: str
+    prices: PriceSeries = field(default_factory=PriceSeries)
+    error: Exception | None = None
+
+
+def index_url(country_id: str, resolution: str = RESOLUTION, base_url: str = SMARD_BASE_URL) -> str:
+    return f"{base_url}/{country_id}/DE/index_{resolution}.json"
+
+
+def chunk_url(country_id: str, chunk_ts: int, resolution: str = RESOLUTION, base_url: str = SMARD_BASE_URL) -> str:
+    return f"{base_url}/{country_id}/DE/{country_id}_DE_{resolution}_{chunk_ts}.json"
+
+
+async def get_index(
+    session: aiohttp.ClientSession,
+    country_id: str,
+    cache: SmardCache | None = None,
+    resolution: str = RESOLUTION,
+    base_url: str = SMARD_BASE_URL,
+    max_age: datetime.timedelta | None = None,
+) -> array[int]:
+    """Get the sorted start timestamps (epoch ms) of all chunks SMARD provides for a zone."""
+    data = await _fetch(
+        session,
+        index_url(country_id, resolution, base_url),
+        cache,
+        (country_id, resolution, None),
+        max_age=max_age,
+    )
+    return _index_array(country_id, resolution, data)
+
+
+async def _get_chunk(
+    session: aiohttp.ClientSession,
+    country_id: str,
+    chunk_ts: int,
+    cache: SmardCache | None,
+    start: int,
+    end: int,
+    max_age: datetime.timedelta | None = None,
+) -> Sequence[Sequence[Any]]:
+    # Cached chunks are kept whole, for which the C JSON decoder is fastest; uncached ones are
+    # streamed and only decoded as far as the requested window.
+    decode = _decode_json if cache is not None else _series_decoder(start, end)
+    data = await _fetch(
+        session,
+        chunk_url(country_id, chunk_ts),
+        cache,
+        (country_id, RESOLUTION, chunk_ts),
+        decode,
+        max_age,
+    )
+    return slice_series(data.get("series") or [], start, end)
+
+
+async def get_price_range(
+    country_id: str,
+    start: datetime.datetime,
+    end: datetime.datetime,
+    cache: SmardCache | None = None,
+    session: aiohttp.ClientSession | None = None,
+    max_age: datetime.timedelta | None = None,
+) -> PriceSeries:
+    """Get the published prices of `[start, end)`, fetching all chunks of the range in parallel.
+
+    Cached files older than `max_age` are revalidated even if their TTL has not expired yet.
+    Raises `SmardError`, `aiohttp.ClientError` or `TimeoutError` if the data cannot be retrieved.
+    """
     if country_id not in SMARD_COUNTRIES:
-        _LOGGER.error("Country ID %s not supported.")
-        return empty_series
+        raise SmardError(f"Country ID {country_id} not supported.")
+    if session is None:
+        session = get_session()
+
+    start_ts, end_ts = dt2ts(start), dt2ts(end)
+    timestamps = await get_index(session, country_id, cache, max_age=max_age)
+    if not timestamps:
+        raise SmardError("No timestamps found in response.")
+    chunk_timestamps = find_chunks(timestamps, start_ts, end_ts)
+    if not chunk_timestamps:
+        raise SmardError(f"No chunk covers {dtfmt(start)} to {dtfmt(end)}.")
+
+    chunks = await asyncio.gather(
+        *(_get_chunk(session, country_id, chunk_ts, cache, start_ts, end_ts, max_age) for chunk_ts in chunk_timestamps)
+    )
+    return PriceSeries.from_items((item for chunk in chunks for item in chunk), RESOLUTION_MS[RESOLUTION])
 
+
+async def get_pricing_info_many(
+    country_ids: Iterable[str],
+    start: datetime.datetime,
+    end: datetime.datetime,
+    cache: SmardCache | None = None,
+    session: aiohttp.ClientSession | None = None,
+    max_concurrency: int = 4,
+) -> dict[str, PricingResult]:
+    """Get the prices of `[start, end)` for several bidding zones concurrently.
+
+    At most `max_concurrency` zones are fetched at the same time, all through one session. A failing
+    zone does not affect the others; its error is reported in its `PricingResult`.
+    """
+    if session is None:
+        session = get_session()
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch(country_id: str) -> PricingResult:
+        async with semaphore:
+            try:
+                prices = await get_price_range(country_id, start, end, cache=cache, session=session)
+            except (aiohttp.ClientError, TimeoutError, SmardError) as e:
+                _LOGGER.warning("Error fetching prices of %s from SMARD: %s", country_id, e)
+                return PricingResult(country_id, error=e)
+            return PricingResult(country_id, prices=prices)
+
+    results = await asyncio.gather(*(fetch(country_id) for country_id in dict.fromkeys(country_ids)))
+    return {result.country_id: result for result in results}
+
+
+def pricing_window(lookback: datetime.timedelta | None = None) -> tuple[datetime.datetime, datetime.datetime]:
+    """Return the range `get_pricing_info` fetches: today, or with a `lookback` up to the end of tomorrow."""
     now = datetime.datetime.now(SYSTEM_TZ)
     today = now.date()
     midnight = datetime.time(tzinfo=SYSTEM_TZ)
     last_midnight = datetime.datetime.combine(today, midnight)
+    next_midnight = datetime.datetime.combine(today + datetime.timedelta(days=1), midnight)
+    if lookback is None:
+        start, end = last_midnight, next_midnight
+    else:
+        start = min(now - lookback, last_midnight)
+        end = datetime.datetime.combine(today + datetime.timedelta(days=2), midnight)
 
     _LOGGER.debug("Now: %s", dtfmt(now))
-    _LOGGER.debug("Today: %s", today)
-    _LOGGER.debug("Last midnight: %s", dtfmt(last_midnight))
+    _LOGGER.debug("Window: %s to %s", dtfmt(start), dtfmt(end))
     _LOGGER.debug("System timezone: %s", SYSTEM_TZ)
+    return start, end
+
+
+async def get_pricing_info(
+    country_id: str = "4169",
+    cache: SmardCache | None = None,
+    session: aiohttp.ClientSession | None = None,
+    lookback: datetime.timedelta | None = None,
+) -> PriceSeries:
+    """Get electricity price as function of time for current day.
+
+    With a `lookback`, a rolling window from `now - lookback` (but at least since last midnight) up to
+    the end of tomorrow is returned instead, so tomorrow's day-ahead prices are included once published.
+
+    Pass the application's `session` (e.g. Home Assistant's shared client session) to reuse its
+    connections; otherwise the pooled session of this module is used. Errors are logged and give an
+    empty series; call `get_price_range` with the `pricing_window` to handle them instead.
+    """
+
+    empty_series = PriceSeries(resolution_ms=RESOLUTION_MS[RESOLUTION])
+
+    if country_id not in SMARD_COUNTRIES:
+        _LOGGER.error("Country ID %s not supported.", country_id)
+        return empty_series
+
+    start, end = pricing_window(lookback)
+
+    try:
+        filtered_series = await get_price_range(country_id, start, end, cache=cache, session=session)
+    except (aiohttp.ClientError, TimeoutError, SmardError) as e:
+        _LOGGER.error("Error fetching data from SMARD: %s", e)
+        return empty_series
 
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(
-                f"https://www.smard.de/app/chart_data/{country_id}/DE/index_quarterhour.json"
-            ) as response:
-                data = await response.json()
-                timestamps = data.get("timestamps")
-
-            if not timestamps:
-                _LOGGER.error("No timestamps found in response.")
-                return empty_series
-
-            req_ts = None
-            for ts in reversed(timestamps):
-                if ts2dt(ts) <= last_midnight:
-                    req_ts = ts
-                    break
-        except (aiohttp.ClientError, aiohttp.ClientPayloadError) as e:
-            _LOGGER.error("Error fetching timestamp data from SMARD: %s", e)
-            return empty_series
-
-        if req_ts is None:
-            _LOGGER.error("No valid timestamp found before last midnight.")
-            return empty_series
-
-        try:
-            async with session.get(
-                f"https://www.smard.de/app/chart_data/{country_id}/DE/{country_id}_DE_quarterhour_{req_ts}.json"
-            ) as response:
-                data = await response.json()
-                timeseries = data.get("series")
-        except (aiohttp.ClientError, aiohttp.ClientPayloadError) as e:
-            _LOGGER.error("Error fetching timeseries data from SMARD: %s", e)
-            return empty_series
-
-    filtered_series = [
-        (dt, item[1]) for item in timeseries if same_date(dt := ts2dt(item[0]), last_midnight) and item[1] is not None
-    ]
     if len(filtered_series) == 0:
         _LOGGER.error("No time series data could be retrieved.")
     return filtered_series
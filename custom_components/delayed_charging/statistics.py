@@ -0,0 +1,109 @@
+"""Hourly prices of a bidding zone in the recorder's long-term statistics."""
+
+import asyncio
+import datetime
+import logging
+from collections.abc import Callable
+
+import numpy as np
+import numpy.typing as npt
+from homeassistant.components.recorder.models import StatisticData, StatisticMeanType, StatisticMetaData
+from homeassistant.components.recorder.statistics import async_add_external_statistics, get_last_statistics
+from homeassistant.const import CURRENCY_EURO, UnitOfEnergy
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.recorder import get_instance
+from homeassistant.util import dt as dt_util
+
+from custom_components.delayed_charging.const import DOMAIN
+from custom_components.delayed_charging.service import PriceSeries, dt2ts
+from custom_components.delayed_charging.smard import SMARD_COUNTRIES
+from custom_components.delayed_charging.store import PriceStore, merged_range
+
+_LOGGER = logging.getLogger(__name__)
+
+HOUR_MS = 3_600_000
+# hours per recorder job, i.e. about six weeks
+BATCH_HOURS = 1000
+
+
+def hourly_statistics(
+    timestamps: npt.NDArray[np.int64], prices: npt.NDArray[np.float64], resolution_ms: int
+) -> list[StatisticData]:
+    """Mean, min and max of every hour whose slots are all known; incomplete hours are left out."""
+    if not len(timestamps):
+        return []
+    hours, starts, counts = np.unique(timestamps - timestamps % HOUR_MS, return_index=True, return_counts=True)
+    means = np.add.reduceat(prices, starts) / counts
+    mins = np.minimum.reduceat(prices, starts)
+    maxs = np.maximum.reduceat(prices, starts)
+    complete = counts >= HOUR_MS // resolution_ms
+    return [
+        StatisticData(
+            start=datetime.datetime.fromtimestamp(int(hour) / 1000, tz=datetime.UTC),
+            mean=float(mean),
+            min=float(low),
+            max=float(high),
+        )
+        for hour, mean, low, high in zip(hours[complete], means[complete], mins[complete], maxs[complete], strict=True)
+    ]
+
+
+class PriceStatistics:
+    """Imports the prices of one bidding zone as external statistics, every hour exactly once.
+
+    Long-term statistics are hourly, so quarter-hourly prices are kept as the mean, min and max of each
+    hour. The first import fills in everything in the price history; later ones only add the hours after
+    the last imported one, which is read from the recorder once and then tracked. Only hours that have
+    ended are imported, as the recorder does not expect statistics of the future; day-ahead hours are
+    added by the imports after they close. The history is read from the stores `open_store` returns.
+    """
+
+    def __init__(self, hass: HomeAssistant, country_id: str, open_store: Callable[[], PriceStore]):
+        self._hass = hass
+        self._country_id = country_id
+        self._open_store = open_store
+        self.statistic_id = f"{DOMAIN}:price_{country_id.lower()}"
+        self.metadata = StatisticMetaData(
+            mean_type=StatisticMeanType.ARITHMETIC,
+            has_sum=False,
+            name=f"Electricity price {SMARD_COUNTRIES.get(country_id, country_id)}",
+            source=DOMAIN,
+            statistic_id=self.statistic_id,
+            unit_class=None,
+            unit_of_measurement=f"{CURRENCY_EURO}/{UnitOfEnergy.MEGA_WATT_HOUR}",
+        )
+        # start (epoch ms) of the last imported hour; None if nothing was imported, unknown until read
+        self._last_start: int | None = None
+        self._last_start_known = False
+        self._lock = asyncio.Lock()
+
+    def _read_last_start(self) -> int | None:
+        last = get_last_statistics(self._hass, 1, self.statistic_id, False, set())
+        rows = last.get(self.statistic_id)
+        start = rows[0].get("start") if rows else None
+        return int(start * 1000) if start is not None else None
+
+    def _collect(self, series: PriceSeries, after: int | None, end: int) -> list[StatisticData]:
+        store = self._open_store()
+        start = after + HOUR_MS if after is not None else 0
+        timestamps, prices = merged_range(series, store, start, end)
+        return hourly_statistics(timestamps, prices, series.resolution_ms)
+
+    async def async_import(self, series: PriceSeries, now: datetime.datetime | None = None) -> int:
+        """Add the ended hours of the price history and `series` that are not imported yet; returns their number."""
+        if "recorder" not in self._hass.config.components:
+            return 0
+        async with self._lock:
+            if not self._last_start_known:
+                self._last_start = await get_instance(self._hass).async_add_executor_job(self._read_last_start)
+                self._last_start_known = True
+            now_ms = dt2ts(now if now is not None else dt_util.utcnow())
+            statistics = await self._hass.async_add_executor_job(
+                self._collect, series, self._last_start, now_ms - now_ms % HOUR_MS
+            )
+            for i in range(0, len(statistics), BATCH_HOURS):
+                async_add_external_statistics(self._hass, self.metadata, statistics[i : i + BATCH_HOURS])
+            if statistics:
+                self._last_start = int(statistics[-1]["start"].timestamp() * 1000)
+                _LOGGER.debug("Imported %d hours of %s", len(statistics), self.statistic_id)
+            return len(statistics)
@@ -0,0 +1,166 @@
+"""Append-only columnar on-disk store of price history."""
+
+import glob
+import json
+import logging
+import os
+import struct
+from collections.abc import Sequence
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+
+from custom_components.delayed_charging.service import RESOLUTION_MS, PriceSeries
+
+_LOGGER = logging.getLogger(__name__)
+
+# magic, format version, resolution in ms; padded to 32 bytes so the column stays 8-byte aligned
+_HEADER = struct.Struct("<4sHxxq16x")
+_MAGIC = b"DCPS"
+_VERSION = 1
+
+TIMESTAMP_DTYPE = np.dtype("<i8")
+PRICE_DTYPE = np.dtype("<f8")
+
+
+class PriceStore:
+    """Price history of one `(country_id, resolution)` as two append-only column files.
+
+    `timestamps.i8` holds a small header followed by the epoch ms of each slot as int64, `prices.f8`
+    the matching prices as float64. Both are read through memory maps, so range queries return
+    zero-copy NumPy views. A slot is located by arithmetic (`(ts - first) // resolution`) while the
+    series has no gaps and by bisection otherwise, i.e. always in O(log n).
+
+    Not thread-safe; in Home Assistant, use it from one executor job at a time.
+    """
+
+    def __init__(self, directory: str, country_id: str, resolution: str = "quarterhour"):
+        if resolution not in RESOLUTION_MS:
+            raise ValueError(f"Resolution {resolution} not supported.")
+        self.country_id = country_id
+        self.resolution = resolution
+        self.resolution_ms = RESOLUTION_MS[resolution]
+        self._directory = os.path.join(directory, country_id, resolution)
+        self._timestamps_path = os.path.join(self._directory, "timestamps.i8")
+        self._prices_path = os.path.join(self._directory, "prices.f8")
+        self._timestamps: npt.NDArray[np.int64] | None = None
+        self._prices: npt.NDArray[np.float64] | None = None
+
+    def _map(self) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float64]]:
+        if self._timestamps is not None and self._prices is not None:
+            return self._timestamps, self._prices
+        empty = (np.empty(0, TIMESTAMP_DTYPE), np.empty(0, PRICE_DTYPE))
+        try:
+            with open(self._timestamps_path, "rb") as file:
+                header = file.read(_HEADER.size)
+            ts_count = (os.path.getsize(self._timestamps_path) - _HEADER.size) // TIMESTAMP_DTYPE.itemsize
+            price_count = os.path.getsize(self._prices_path) // PRICE_DTYPE.itemsize
+        except FileNotFoundError:
+            return empty
+        magic, version, resolution_ms = _HEADER.unpack(header)
+        if magic != _MAGIC or version != _VERSION or resolution_ms != self.resolution_ms:
+            raise ValueError(f"{self._timestamps_path} is no price store of resolution {self.resolution}.")
+
+        # An interrupted append may have left one column longer than the other.
+        count = min(ts_count, price_count)
+        if count <= 0:
+            return empty
+        self._timestamps = np.memmap(self._timestamps_path, TIMESTAMP_DTYPE, "r", offset=_HEADER.size, shape=(count,))
+        self._prices = np.memmap(self._prices_path, PRICE_DTYPE, "r", shape=(count,))
+        return self._timestamps, self._prices
+
+    def __len__(self) -> int:
+        return len(self._map()[0])
+
+    @property
+    def last_timestamp(self) -> int | None:
+        timestamps, _ = self._map()
+        return int(timestamps[-1]) if len(timestamps) else None
+
+    def _locate(self, timestamps: npt.NDArray[np.int64], ts: int) -> int:
+        """Index of the first slot at or after `ts`."""
+        n = len(timestamps)
+        if n == 0:
+            return 0
+        first, last = int(timestamps[0]), int(timestamps[-1])
+        if last - first == (n - 1) * self.resolution_ms:
+            return min(max(-(-(ts - first) // self.resolution_ms), 0), n)
+        return int(np.searchsorted(timestamps, ts, side="left"))
+
+    def range(self, start: int, end: int) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float64]]:
+        """Return timestamps and prices of all slots in `[start, end)` (epoch ms) as read-only views."""
+        timestamps, prices = self._map()
+        lo = self._locate(timestamps, start)
+        hi = max(self._locate(timestamps, end), lo)
+        return timestamps[lo:hi], prices[lo:hi]
+
+    def append(self, timestamps: Sequence[int] | npt.ArrayLike, prices: Sequence[float] | npt.ArrayLike) -> int:
+        """Append sorted slots newer than the last stored one; older ones are ignored. Returns the number appended."""
+        new_timestamps = np.asarray(timestamps, dtype=TIMESTAMP_DTYPE)
+        new_prices = np.asarray(prices, dtype=PRICE_DTYPE)
+        last = self.last_timestamp
+        if last is not None:
+            keep = new_timestamps > last
+            new_timestamps, new_prices = new_timestamps[keep], new_prices[keep]
+        if len(new_timestamps) == 0:
+            return 0
+
+        self.close()
+        os.makedirs(self._directory, exist_ok=True)
+        if not os.path.exists(self._timestamps_path):
+            with open(self._timestamps_path, "wb") as file:
+                file.write(_HEADER.pack(_MAGIC, _VERSION, self.resolution_ms))
+        self._truncate_to_common_length()
+        # prices first: a crash in between leaves a timestamp-less price, which is cut off on read
+        with open(self._prices_path, "ab") as file:
+            file.write(new_prices.tobytes())
+        with open(self._timestamps_path, "ab") as file:
+            file.write(new_timestamps.tobytes())
+        return len(new_timestamps)
+
+    def _truncate_to_common_length(self) -> None:
+        ts_count = (os.path.getsize(self._timestamps_path) - _HEADER.size) // TIMESTAMP_DTYPE.itemsize
+        price_count = os.path.getsize(self._prices_path) // PRICE_DTYPE.itemsize if os.path.exists(self._prices_path) else 0
+        count = min(ts_count, price_count)
+        with open(self._timestamps_path, "r+b") as file:
+            file.truncate(_HEADER.size + count * TIMESTAMP_DTYPE.itemsize)
+        with open(self._prices_path, "ab") as file:
+            file.truncate(count * PRICE_DTYPE.itemsize)
+
+    def import_chunk_files(self, directory: str) -> int:
+        """Append the chunk files a backfill downloaded for this store's zone and resolution."""
+        appended = 0
+        paths = glob.glob(os.path.join(directory, self.country_id, self.resolution, "*.json"))
+        for path in sorted(paths, key=lambda path: int(os.path.basename(path).removesuffix(".json"))):
+            with open(path, encoding="utf-8") as file:
+                items: list[list[Any]] = json.load(file).get("series") or []
+            series = [item for item in items if item[1] is not None]
+            if series:
+                timestamps, prices = zip(*series, strict=True)
+                appended += self.append(timestamps, prices)
+        return appended
+
+    def close(self) -> None:
+        """Drop the memory maps, e.g. before the files change."""
+        self._timestamps = None
+        self._prices = None
+
+
+def merged_range(
+    series: PriceSeries | None, store: PriceStore | None, start: int, end: int
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float64]]:
+    """Slots in `[start, end)` (epoch ms) from the price history, overridden by a current series."""
+    parts: list[tuple[npt.NDArray[np.int64], npt.NDArray[np.float64]]] = []
+    if series is not None:
+        window = series.between(start, end)
+        parts.append((np.asarray(window.timestamps, dtype=TIMESTAMP_DTYPE), np.asarray(window.prices, dtype=PRICE_DTYPE)))
+    if store is not None:
+        parts.append(store.range(start, end))
+    if not parts:
+        return np.empty(0, TIMESTAMP_DTYPE), np.empty(0, PRICE_DTYPE)
+    timestamps: npt.NDArray[np.int64] = np.concatenate([part[0] for part in parts])
+    prices: npt.NDArray[np.float64] = np.concatenate([part[1] for part in parts])
+    # np.unique keeps the first occurrence, i.e. the price of the current series
+    unique, first = np.unique(timestamps, return_index=True)
+    return unique, prices[first]
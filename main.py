@@ -1,37 +1,89 @@
 #!/usr/bin/env python3
+import argparse
 import asyncio
+import datetime
 import logging
 import pprint
 
+from custom_components.delayed_charging.backfill import RESOLUTIONS, backfill
 from custom_components.delayed_charging.service import (
+    SYSTEM_TZ,
     delayed_charging_is_active_today,
     get_charging_start,
     get_current_price,
 )
-from custom_components.delayed_charging.smard import get_pricing_info
+from custom_components.delayed_charging.smard import close_session, get_pricing_info
+from custom_components.delayed_charging.store import PriceStore
 
 logging.basicConfig(level=logging.DEBUG)
 
 THRESH = 0.0
 
-prices = asyncio.run(get_pricing_info("254"))
-pprint.pprint(prices)
 
-charging_start = get_charging_start(prices, THRESH)
-if charging_start:
-    print(f"Charging should start at: {charging_start}")
-else:
-    print("No suitable charging start time found.")
+async def fetch_prices(country_id: str):
+    try:
+        return await get_pricing_info(country_id)
+    finally:
+        await close_session()
+
+
+async def run_backfill(args: argparse.Namespace):
+    start = datetime.datetime.combine(args.start, datetime.time(tzinfo=SYSTEM_TZ))
+    end = datetime.datetime.combine(args.end, datetime.time(tzinfo=SYSTEM_TZ))
+    try:
+        return await backfill(
+            args.country_id,
+            start,
+            end,
+            args.directory,
+            resolution=args.resolution,
+            max_concurrency=args.parallel,
+        )
+    finally:
+        await close_session()
+
+
+def show_prices():
+    prices = asyncio.run(fetch_prices("254"))
+    pprint.pprint(list(prices))
+
+    charging_start = get_charging_start(prices, THRESH)
+    if charging_start:
+        print(f"Charging should start at: {charging_start}")
+    else:
+        print("No suitable charging start time found.")
+
+    delayed_charging_active = delayed_charging_is_active_today(prices, THRESH)
+    if delayed_charging_active:
+        print("Delayed charging is active today.")
+    else:
+        print("Delayed charging is not active today.")
+
+    current_price = get_current_price(prices)
+
+    if current_price is not None:
+        print(f"Current price is: {current_price:.2f}")
+    else:
+        print("No current price data available.")
 
-delayed_charging_active = delayed_charging_is_active_today(prices, THRESH)
-if delayed_charging_active:
-    print("Delayed charging is active today.")
-else:
-    print("Delayed charging is not active today.")
 
-current_price = get_current_price(prices)
+parser = argparse.ArgumentParser(description="Query SMARD electricity prices.")
+subparsers = parser.add_subparsers(dest="command")
+backfill_parser = subparsers.add_parser("backfill", help="download the price history of a zone (resumable)")
+backfill_parser.add_argument("start", type=datetime.date.fromisoformat, help="first day, e.g. 2024-01-01")
+backfill_parser.add_argument("end", type=datetime.date.fromisoformat, help="day after the last one")
+backfill_parser.add_argument("--country-id", default="4169")
+backfill_parser.add_argument("--resolution", choices=RESOLUTIONS, default="quarterhour")
+backfill_parser.add_argument("--directory", default="smard_history")
+backfill_parser.add_argument("--parallel", type=int, default=4, help="maximum number of concurrent downloads")
+backfill_parser.add_argument("--store", help="also append the downloaded prices to a columnar price store in this directory")
 
-if current_price is not None:
-    print(f"Current price is: {current_price:.2f}")
+args = parser.parse_args()
+if args.command == "backfill":
+    result = asyncio.run(run_backfill(args))
+    print(f"Downloaded {len(result.downloaded)}, skipped {len(result.skipped)}, failed {len(result.failed)} chunks.")
+    if args.store:
+        store = PriceStore(args.store, args.country_id, args.resolution)
+        print(f"Appended {store.import_chunk_files(args.directory)} prices to the store ({len(store)} in total).")
 else:
-    print("No current price data available.")
+    show_prices()
@@ -1,9 +1,14 @@
 from datetime import datetime as datetime_class
+from functools import partial
+from pathlib import Path
 from unittest.mock import patch
 from zoneinfo import ZoneInfo
 
 import pytest
 
+from custom_components.delayed_charging.coordinator import PriceCoordinatorRegistry
+from custom_components.delayed_charging.service import RESOLUTION_MS, PriceSeries
+
 pytest_plugins = ["pytest_homeassistant_custom_component"]
 
 
@@ -22,19 +27,40 @@ def patch_system_tz_smard():
         yield
 
 
+@pytest.fixture(autouse=True, scope="session")
+def patch_system_tz_polling():
+    """Patch the system timezone to a constant value for polling tests."""
+    with patch("custom_components.delayed_charging.polling.SYSTEM_TZ", ZoneInfo("Europe/Berlin")):
+        yield
+
+
 @pytest.fixture(autouse=True)
 def auto_enable_custom_integrations(enable_custom_integrations: None):
     yield
 
 
+@pytest.fixture(autouse=True)
+def storage_directory(tmp_path: Path):
+    """Keep the SMARD cache and the price history of each test out of the shared testing config."""
+    directory = tmp_path / "storage"
+    with patch(
+        "custom_components.delayed_charging.PriceCoordinatorRegistry",
+        partial(PriceCoordinatorRegistry, directory=str(directory)),
+    ):
+        yield directory
+
+
 @pytest.fixture
-def mock_coordinator_data() -> list[tuple[datetime_class, float]]:
+def mock_coordinator_data() -> PriceSeries:
     """Mock data that the coordinator should return."""
-    return [
-        (datetime_class(2025, 8, 21, 12, 0, tzinfo=ZoneInfo("Europe/Berlin")), 0.10),
-        (datetime_class(2025, 8, 21, 13, 0, tzinfo=ZoneInfo("Europe/Berlin")), 0.15),
-        (datetime_class(2025, 8, 21, 14, 0, tzinfo=ZoneInfo("Europe/Berlin")), 0.20),
-    ]
+    return PriceSeries.from_datetimes(
+        [
+            (datetime_class(2025, 8, 21, 12, 0, tzinfo=ZoneInfo("Europe/Berlin")), 0.10),
+            (datetime_class(2025, 8, 21, 13, 0, tzinfo=ZoneInfo("Europe/Berlin")), 0.15),
+            (datetime_class(2025, 8, 21, 14, 0, tzinfo=ZoneInfo("Europe/Berlin")), 0.20),
+        ],
+        RESOLUTION_MS["hour"],
+    )
 
 
 @pytest.fixture
@@ -47,7 +73,7 @@ def mock_chart_data() -> list[dict[str, float | str]]:
 
 
 @pytest.fixture
-async def coordinator_update_patch(mock_coordinator_data: list[tuple[datetime_class, float]]):
+async def coordinator_update_patch(mock_coordinator_data: PriceSeries):
     """Patch the coordinator's update method."""
 
     async def mock_update():
@@ -0,0 +1,128 @@
+"""Tests for api.py module."""
+
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+from zoneinfo import ZoneInfo
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient
+from homeassistant.core import HomeAssistant
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+from pytest_homeassistant_custom_component.typing import WebSocketGenerator
+
+from custom_components.delayed_charging.api import query_prices
+from custom_components.delayed_charging.const import DOMAIN
+from custom_components.delayed_charging.service import RESOLUTION_MS, PriceSeries
+from custom_components.delayed_charging.store import PriceStore
+
+# We pretend the system tz to be Central European (Summer) Time
+CONSTANT_SYSTEM_TZ = ZoneInfo("Europe/Berlin")
+
+MIDNIGHT = 1753653600000  # 2025-07-28 00:00:00 (CEST)
+QUARTER_HOUR = RESOLUTION_MS["quarterhour"]
+DAY = 96 * QUARTER_HOUR
+
+
+@pytest.fixture
+def store(storage_directory: Path) -> PriceStore:
+    """Two days of quarter-hourly history, priced by the index of the slot."""
+    store = PriceStore(str(storage_directory / "history"), "4169")
+    store.append([MIDNIGHT + i * QUARTER_HOUR for i in range(192)], [float(i) for i in range(192)])
+    return store
+
+
+def test_query_prices_merges_memory_and_history(store: PriceStore):
+    """Test that the in-memory series extends and overrides the history."""
+    series = PriceSeries([MIDNIGHT + i * QUARTER_HOUR for i in range(190, 194)], [-1.0, -2.0, -3.0, -4.0])
+
+    result = query_prices(series, store, MIDNIGHT + 188 * QUARTER_HOUR, MIDNIGHT + 300 * QUARTER_HOUR)
+
+    assert result["timestamps"] == [MIDNIGHT + i * QUARTER_HOUR for i in range(188, 194)]
+    assert result["prices"] == [188.0, 189.0, -1.0, -2.0, -3.0, -4.0]
+    assert result["next_start"] is None
+
+
+def test_query_prices_resamples(store: PriceStore):
+    """Test averaging to hours and to local days."""
+    hours = query_prices(None, store, MIDNIGHT, MIDNIGHT + DAY, resolution="hour")
+    days = query_prices(None, store, MIDNIGHT, MIDNIGHT + 2 * DAY, resolution="day")
+
+    assert len(hours["timestamps"]) == 24
+    assert hours["prices"][:2] == [1.5, 5.5]
+    assert days["timestamps"] == [MIDNIGHT, MIDNIGHT + DAY]
+    assert days["prices"] == [47.5, 143.5]
+
+
+def test_query_prices_pages_and_downsamples(store: PriceStore):
+    """Test that large ranges are split into pages or downsampled into one response."""
+    first = query_prices(None, store, MIDNIGHT, MIDNIGHT + 2 * DAY, limit=100)
+    second = query_prices(None, store, first["next_start"], MIDNIGHT + 2 * DAY, limit=100)
+    downsampled = query_prices(None, store, MIDNIGHT, MIDNIGHT + 2 * DAY, max_points=10, limit=5)
+
+    assert first["next_start"] == MIDNIGHT + 100 * QUARTER_HOUR
+    assert first["timestamps"] + second["timestamps"] == [MIDNIGHT + i * QUARTER_HOUR for i in range(192)]
+    assert second["next_start"] is None
+    assert len(downsampled["timestamps"]) == 10
+    assert downsampled["next_start"] is None
+    with pytest.raises(ValueError):
+        query_prices(None, store, MIDNIGHT, MIDNIGHT)
+
+
+async def setup_entry(hass: HomeAssistant) -> None:
+    """Set up an entry for Germany whose coordinator holds two slots past the history."""
+    entry = MockConfigEntry(domain=DOMAIN, options={"country_id": "4169", "threshold": 0.0})
+    entry.add_to_hass(hass)
+    series = PriceSeries([MIDNIGHT + 192 * QUARTER_HOUR, MIDNIGHT + 193 * QUARTER_HOUR], [7.0, 8.0])
+    with patch(
+        "custom_components.delayed_charging.coordinator.get_price_range", new_callable=AsyncMock, return_value=series
+    ):
+        assert await hass.config_entries.async_setup(entry.entry_id)
+        await hass.async_block_till_done()
+
+
+@pytest.mark.usefixtures("store")
+async def test_websocket_prices(hass: HomeAssistant, hass_ws_client: WebSocketGenerator):
+    """Test the websocket command."""
+    await setup_entry(hass)
+    client = await hass_ws_client(hass)
+
+    await client.send_json_auto_id(
+        {
+            "type": "delayed_charging/prices",
+            "country_id": "4169",
+            "start": MIDNIGHT + DAY,
+            "end": MIDNIGHT + 3 * DAY,
+            "resolution": "day",
+        }
+    )
+    response = await client.receive_json()
+
+    assert response["success"]
+    assert response["result"]["country_id"] == "4169"
+    assert response["result"]["timestamps"] == [MIDNIGHT + DAY, MIDNIGHT + 2 * DAY]
+    assert response["result"]["prices"] == [143.5, 7.5]
+
+    await client.send_json_auto_id({"type": "delayed_charging/prices", "country_id": "4169", "start": 2, "end": 1})
+    response = await client.receive_json()
+    assert not response["success"]
+
+
+@pytest.mark.usefixtures("store")
+async def test_http_prices(
+    hass: HomeAssistant, hass_client: Callable[[], Awaitable[TestClient[web.Request, web.Application]]]
+):
+    """Test the HTTP view."""
+    await setup_entry(hass)
+    client = await hass_client()
+
+    response = await client.get(f"/api/delayed_charging/prices/4169?start={MIDNIGHT}&end={MIDNIGHT + DAY}&limit=10")
+    result = await response.json()
+
+    assert response.status == 200
+    assert result["prices"] == [float(i) for i in range(10)]
+    assert result["next_start"] == MIDNIGHT + 10 * QUARTER_HOUR
+
+    response = await client.get(f"/api/delayed_charging/prices/unknown?start={MIDNIGHT}&end={MIDNIGHT + DAY}")
+    assert response.status == 400
@@ -0,0 +1,106 @@
+"""Tests for arbitrage.py module."""
+
+import datetime
+import math
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pytest
+
+from custom_components.delayed_charging.arbitrage import Battery, optimize_battery
+from custom_components.delayed_charging.service import RESOLUTION_MS, PriceSeries, dt2ts
+
+# We pretend the system tz to be Central European (Summer) Time
+CONSTANT_SYSTEM_TZ = ZoneInfo("Europe/Berlin")
+
+MIDNIGHT = datetime.datetime(2025, 7, 28, 0, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
+
+
+def hours(prices: list[float]) -> PriceSeries:
+    """Hourly prices in €/MWh from midnight on."""
+    return PriceSeries(
+        [dt2ts(MIDNIGHT) + i * RESOLUTION_MS["hour"] for i in range(len(prices))], prices, RESOLUTION_MS["hour"]
+    )
+
+
+def test_optimize_battery_buys_low_and_sells_high():
+    """Test that a lossless battery charges in the cheap and discharges in the expensive hours."""
+    battery = Battery(capacity=10.0, charge_power=5.0, discharge_power=5.0, efficiency=1.0, soc_steps=10)
+
+    schedule = optimize_battery(hours([100.0, 0.0, 0.0, 100.0, 200.0, 200.0]), battery, soc=0.0, now=MIDNIGHT)
+
+    np.testing.assert_allclose(schedule.power, [0.0, 5.0, 5.0, 0.0, -5.0, -5.0], atol=1e-9)
+    np.testing.assert_allclose(schedule.soc, [0.0, 5.0, 10.0, 10.0, 5.0, 0.0], atol=1e-9)
+    assert math.isclose(schedule.profit, 2.0)
+    power = schedule.power_at(dt2ts(MIDNIGHT + datetime.timedelta(minutes=90)))
+    assert power is not None and math.isclose(power, 5.0)
+    assert schedule.power_at(dt2ts(MIDNIGHT + datetime.timedelta(hours=6))) is None
+
+
+def test_optimize_battery_skips_unprofitable_cycles():
+    """Test that the losses of a round trip are weighed against the price spread."""
+    battery = Battery(capacity=5.0, charge_power=5.0, discharge_power=5.0, efficiency=0.9, soc_steps=10)
+
+    # buying at 100 and selling at 110 loses energy worth more than the spread
+    idle = optimize_battery(hours([100.0, 110.0]), battery, soc=0.0, now=MIDNIGHT)
+    cycle = optimize_battery(hours([100.0, 200.0]), battery, soc=0.0, now=MIDNIGHT)
+
+    np.testing.assert_allclose(idle.power, [0.0, 0.0], atol=1e-9)
+    assert idle.cost == 0.0
+    # the power limits apply at the grid side: 5 kWh bought store 4.5 kWh, which sell as 4.05 kWh
+    np.testing.assert_allclose(cycle.power, [5.0, -4.05], atol=1e-9)
+    assert math.isclose(cycle.profit, (4.05 * 200.0 - 5.0 * 100.0) / 1000)
+
+
+def test_optimize_battery_negative_prices():
+    """Test that the battery is filled while consumption is paid for, even without a later sale."""
+    battery = Battery(capacity=4.0, charge_power=2.0, discharge_power=2.0, efficiency=1.0, soc_steps=8)
+
+    schedule = optimize_battery(hours([50.0, -20.0, -30.0, 50.0]), battery, soc=0.0, final_soc=4.0, now=MIDNIGHT)
+
+    np.testing.assert_allclose(schedule.power, [0.0, 2.0, 2.0, 0.0], atol=1e-9)
+    assert math.isclose(schedule.profit, 0.1)
+
+
+def test_optimize_battery_final_soc():
+    """Test that the final state of charge is kept and an unreachable one is rejected."""
+    battery = Battery(capacity=10.0, charge_power=2.0, discharge_power=2.0, efficiency=1.0, soc_steps=10)
+    series = hours([300.0, 300.0, 10.0, 300.0])
+
+    schedule = optimize_battery(series, battery, soc=6.0, final_soc=6.0, now=MIDNIGHT)
+
+    # only what the cheap hour can refill is sold
+    assert math.isclose(schedule.soc[-1], 6.0)
+    assert np.all(np.abs(schedule.power) <= 2.0 + 1e-9)
+    np.testing.assert_allclose(schedule.power[2:], [2.0, 0.0], atol=1e-9)
+    assert math.isclose(schedule.profit, 2.0 * (300.0 - 10.0) / 1000)
+    with pytest.raises(ValueError):
+        optimize_battery(series, battery, soc=0.0, final_soc=10.0, now=MIDNIGHT)
+
+
+def test_optimize_battery_starts_at_the_current_slot():
+    """Test that past slots are left out and the horizon is respected."""
+    battery = Battery(capacity=2.0, charge_power=2.0, discharge_power=2.0)
+    series = hours([10.0] * 24)
+
+    schedule = optimize_battery(
+        series, battery, soc=1.0, horizon=datetime.timedelta(hours=4), now=MIDNIGHT + datetime.timedelta(hours=5, minutes=30)
+    )
+
+    assert len(schedule.timestamps) == 5
+    assert schedule.timestamps[0] == dt2ts(MIDNIGHT + datetime.timedelta(hours=5))
+    assert schedule.as_dict()["slots"][0]["start"] == "2025-07-28T05:00:00+02:00"
+
+
+def test_optimize_battery_stops_at_a_gap():
+    """Test that the schedule ends before missing slots instead of trading across them."""
+    battery = Battery(capacity=10.0, charge_power=5.0, discharge_power=5.0, efficiency=1.0, soc_steps=10)
+    series = hours([0.0, 0.0, 100.0, 200.0])
+    gapped = PriceSeries(
+        [*series.timestamps[:2], series.timestamps[3]], [*series.prices[:2], series.prices[3]], RESOLUTION_MS["hour"]
+    )
+
+    schedule = optimize_battery(gapped, battery, soc=0.0, now=MIDNIGHT)
+
+    assert list(schedule.timestamps) == list(series.timestamps[:2])
+    np.testing.assert_allclose(schedule.power, [0.0, 0.0], atol=1e-9)
@@ -0,0 +1,105 @@
+"""Tests for backfill.py module."""
+
+import json
+import os
+from collections.abc import AsyncIterator
+from datetime import datetime
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from custom_components.delayed_charging.backfill import backfill, chunk_path, list_chunks
+from custom_components.delayed_charging.smard import SmardError
+
+# We pretend the system tz to be Central European (Summer) Time
+CONSTANT_SYSTEM_TZ = ZoneInfo("Europe/Berlin")
+
+WEEK = 7 * 24 * 3600 * 1000
+CHUNKS = [1751234400000 + i * WEEK for i in range(4)]  # Mondays from 2025-06-30 00:00:00 (CEST)
+
+
+class StandInSmard:
+    """Local stand-in for the SMARD chart data API."""
+
+    def __init__(self):
+        self.requests: list[str] = []
+        self.failing: set[int] = set()
+        self.app = web.Application()
+        self.app.router.add_get("/app/chart_data/{country_id}/DE/{file}", self.handle)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        file = request.match_info["file"]
+        self.requests.append(file)
+        if file.startswith("index_"):
+            return web.json_response({"timestamps": CHUNKS})
+        chunk_ts = int(file.removesuffix(".json").rsplit("_", 1)[1])
+        if chunk_ts in self.failing:
+            raise web.HTTPServiceUnavailable()
+        return web.json_response({"meta_data": {"version": 1}, "series": [[chunk_ts, 42.0]]})
+
+
+@pytest.fixture
+async def smard(socket_enabled: None) -> AsyncIterator[tuple[StandInSmard, str]]:
+    """Serve a stand-in SMARD on localhost and return it along with its base URL."""
+    stand_in = StandInSmard()
+    server = TestServer(stand_in.app)
+    await server.start_server()
+    yield stand_in, str(server.make_url("/app/chart_data"))
+    await server.close()
+
+
+@pytest.fixture
+async def session() -> AsyncIterator[aiohttp.ClientSession]:
+    async with aiohttp.ClientSession() as session:
+        yield session
+
+
+async def test_list_chunks(smard: tuple[StandInSmard, str], session: aiohttp.ClientSession):
+    """Test listing the chunks of a date range from the index."""
+    _, base_url = smard
+    start = datetime(2025, 7, 8, tzinfo=CONSTANT_SYSTEM_TZ)
+    end = datetime(2025, 7, 15, 12, tzinfo=CONSTANT_SYSTEM_TZ)
+
+    assert await list_chunks("4169", start, end, resolution="hour", session=session, base_url=base_url) == CHUNKS[1:3]
+
+
+async def test_backfill_resumes(smard: tuple[StandInSmard, str], session: aiohttp.ClientSession, tmp_path: Path):
+    """Test that a failed backfill is resumed without downloading finished chunks again."""
+    stand_in, base_url = smard
+    start = datetime(2025, 1, 1, tzinfo=CONSTANT_SYSTEM_TZ)
+    end = datetime(2026, 1, 1, tzinfo=CONSTANT_SYSTEM_TZ)
+    stand_in.failing = {CHUNKS[1]}
+
+    result = await backfill("4169", start, end, str(tmp_path), session=session, max_concurrency=2, base_url=base_url)
+
+    assert result.downloaded == [CHUNKS[0], CHUNKS[2], CHUNKS[3]]
+    assert list(result.failed) == [CHUNKS[1]]
+    with open(chunk_path(str(tmp_path), "4169", "quarterhour", CHUNKS[0]), encoding="utf-8") as file:
+        assert json.load(file)["series"] == [[CHUNKS[0], 42.0]]
+    assert not os.path.exists(chunk_path(str(tmp_path), "4169", "quarterhour", CHUNKS[1]))
+
+    stand_in.failing = set()
+    stand_in.requests.clear()
+    result = await backfill("4169", start, end, str(tmp_path), session=session, base_url=base_url)
+
+    # the latest chunk is still growing and therefore always downloaded again
+    assert result.downloaded == [CHUNKS[1], CHUNKS[3]]
+    assert result.skipped == [CHUNKS[0], CHUNKS[2]]
+    assert not result.failed
+    assert sorted(stand_in.requests) == sorted(
+        ["index_quarterhour.json", f"4169_DE_quarterhour_{CHUNKS[1]}.json", f"4169_DE_quarterhour_{CHUNKS[3]}.json"]
+    )
+
+
+async def test_backfill_invalid_arguments(tmp_path: Path):
+    """Test that unsupported zones and resolutions are rejected before any request."""
+    start = datetime(2025, 1, 1, tzinfo=CONSTANT_SYSTEM_TZ)
+
+    with pytest.raises(SmardError):
+        await backfill("InvalidCountry", start, start, str(tmp_path))
+    with pytest.raises(SmardError):
+        await backfill("4169", start, start, str(tmp_path), resolution="day")
@@ -0,0 +1,63 @@
+"""Tests for cache.py module."""
+
+import os
+from datetime import timedelta
+from pathlib import Path
+
+from custom_components.delayed_charging.cache import CacheEntry, SmardCache
+
+INDEX_KEY = ("4169", "quarterhour", None)
+CHUNK_TS = 1753048800000  # 2025-07-21 00:00:00 (CEST)
+CHUNK_KEY = ("4169", "quarterhour", CHUNK_TS)
+
+
+async def test_cache_persists_across_instances(tmp_path: Path):
+    """Test that entries written by one cache are found by a new one (e.g. after a restart)."""
+    cache = SmardCache(directory=str(tmp_path))
+    await cache.async_put(INDEX_KEY, CacheEntry(data={"timestamps": [1, 2]}, fetched_at=100.0, etag='"abc"'))
+
+    restored = await SmardCache(directory=str(tmp_path)).async_get(INDEX_KEY)
+
+    assert restored == CacheEntry(data={"timestamps": [1, 2]}, fetched_at=100.0, etag='"abc"')
+
+
+async def test_cache_without_directory_is_memory_only():
+    """Test that a cache without directory keeps entries in memory only."""
+    cache = SmardCache()
+    await cache.async_put(INDEX_KEY, CacheEntry(data={}, fetched_at=100.0))
+
+    assert await cache.async_get(INDEX_KEY) is not None
+    assert await SmardCache().async_get(INDEX_KEY) is None
+
+
+async def test_cache_evicts_least_recently_used(tmp_path: Path):
+    """Test that memory and disk are bounded by max_entries."""
+    cache = SmardCache(directory=str(tmp_path), max_entries=2)
+    keys = [("4169", "quarterhour", ts) for ts in (1, 2, 3)]
+    for key in keys:
+        await cache.async_put(key, CacheEntry(data={}, fetched_at=100.0))
+        # make the modification times distinguishable
+        os.utime(cache._path(key), (key[2], key[2]))  # type: ignore[reportPrivateUsage]
+
+    assert len(os.listdir(tmp_path)) == 2
+    assert not os.path.exists(cache._path(keys[0]))  # type: ignore[reportPrivateUsage]
+    assert await SmardCache().async_get(keys[0]) is None
+
+
+def test_cache_is_fresh():
+    """Test TTLs of index and chunk files."""
+    cache = SmardCache(index_ttl=timedelta(minutes=30), chunk_ttl=timedelta(minutes=15))
+    fetched_at = CHUNK_TS / 1e3 + 3600
+    entry = CacheEntry(data={}, fetched_at=fetched_at)
+
+    assert cache.is_fresh(INDEX_KEY, entry, now=fetched_at + 29 * 60)
+    assert not cache.is_fresh(INDEX_KEY, entry, now=fetched_at + 31 * 60)
+    assert cache.is_fresh(CHUNK_KEY, entry, now=fetched_at + 14 * 60)
+    assert not cache.is_fresh(CHUNK_KEY, entry, now=fetched_at + 16 * 60)
+    assert not cache.is_fresh(INDEX_KEY, entry, now=fetched_at + 6 * 60, max_age=timedelta(minutes=5))
+    assert not cache.is_fresh(CHUNK_KEY, entry, now=fetched_at, max_age=timedelta(0))
+
+    # a chunk fetched long after its week ended does not change anymore
+    settled = CacheEntry(data={}, fetched_at=CHUNK_TS / 1e3 + 9 * 86400)
+    assert cache.is_fresh(CHUNK_KEY, settled, now=settled.fetched_at + 365 * 86400)
+    assert cache.is_fresh(CHUNK_KEY, settled, now=settled.fetched_at + 60, max_age=timedelta(0))
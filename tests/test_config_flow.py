@@ -11,8 +11,10 @@ from custom_components.delayed_charging.config_flow import (
     DelayedChargingOptionsFlow,
 )
 from custom_components.delayed_charging.const import (
+    CONF_CHEAPEST,
     CONF_COUNTRY_ID,
     CONF_THRESH,
+    CONF_THRESH_MODE,
     DEFAULT_COUNTRY_ID,
     DEFAULT_THRESH,
     DOMAIN,
@@ -54,7 +56,9 @@ async def test_async_step_user_show_form(hass: HomeAssistant, mock_config_flow:
     assert result.get("step_id") == "user"
     schema = getattr(result.get("data_schema"), "schema")
     assert CONF_COUNTRY_ID in schema
+    assert CONF_THRESH_MODE in schema
     assert CONF_THRESH in schema
+    assert CONF_CHEAPEST in schema
 
 
 async def test_async_get_options_flow(hass: HomeAssistant):
@@ -1,11 +1,19 @@
 """Test the update coordinator."""
 
+import asyncio
+from datetime import timedelta
 from typing import Any, cast
+from unittest.mock import AsyncMock, patch
 
+import aiohttp
+from freezegun.api import FrozenDateTimeFactory
 from homeassistant.core import HomeAssistant, State
-from pytest_homeassistant_custom_component.common import MockConfigEntry
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import MockConfigEntry, async_fire_time_changed
 
 from custom_components.delayed_charging.const import DOMAIN
+from custom_components.delayed_charging.coordinator import PriceCoordinatorRegistry
+from custom_components.delayed_charging.service import PriceSeries
 
 MOCKED_ENTRY_ID = "1234567890abcdef"
 
@@ -35,6 +43,301 @@ async def test_coordinator_update(
     assert mock_chart_data == chart_data
 
 
+async def test_coordinator_shared_between_platforms(hass: HomeAssistant):
+    """Test that sensor and binary sensor share one coordinator and one fetch."""
+    config_entry = get_test_config_entry()
+    config_entry.add_to_hass(hass)
+
+    with patch(
+        "custom_components.delayed_charging.coordinator.get_price_range",
+        new_callable=AsyncMock,
+        return_value=PriceSeries([1753653600000], [0.1]),
+    ) as mock_get_price_range:
+        assert await hass.config_entries.async_setup(config_entry.entry_id)
+        await hass.async_block_till_done(wait_background_tasks=True)
+
+    mock_get_price_range.assert_awaited_once()
+    assert hass.states.get("sensor.current_price") is not None
+    assert hass.states.get("binary_sensor.delayed_charging_active") is not None
+
+
+async def test_coordinator_shared_between_entries_of_same_zone(hass: HomeAssistant):
+    """Test that entries of one bidding zone share a coordinator until the last one is unloaded."""
+    entries = [
+        MockConfigEntry(domain=DOMAIN, options={"country_id": "4169", "threshold": threshold}) for threshold in (0.0, 50.0)
+    ]
+    other_zone = MockConfigEntry(domain=DOMAIN, options={"country_id": "254", "threshold": 0.0})
+
+    with patch(
+        "custom_components.delayed_charging.coordinator.get_price_range",
+        new_callable=AsyncMock,
+        return_value=PriceSeries([1753653600000], [0.1]),
+    ) as mock_get_price_range:
+        for entry in [*entries, other_zone]:
+            entry.add_to_hass(hass)
+            assert await hass.config_entries.async_setup(entry.entry_id)
+        await hass.async_block_till_done(wait_background_tasks=True)
+
+        assert mock_get_price_range.await_count == 2
+        assert entries[0].runtime_data.coordinator is entries[1].runtime_data.coordinator
+        assert entries[0].runtime_data.coordinator is not other_zone.runtime_data.coordinator
+
+        registry = cast(PriceCoordinatorRegistry, hass.data[DOMAIN])
+        assert sorted(registry.country_ids) == ["254", "4169"]
+
+        assert await hass.config_entries.async_unload(entries[0].entry_id)
+        assert sorted(registry.country_ids) == ["254", "4169"]
+
+        assert await hass.config_entries.async_unload(entries[1].entry_id)
+        assert registry.country_ids == ["254"]
+
+
+async def test_coordinator_released_when_setup_fails(hass: HomeAssistant):
+    """Test that an entry failing after subscribing does not keep the zone's coordinator polling."""
+    config_entry = get_test_config_entry()
+    config_entry.add_to_hass(hass)
+
+    with (
+        patch(
+            "custom_components.delayed_charging.coordinator.get_price_range",
+            new_callable=AsyncMock,
+            return_value=PriceSeries([1753653600000], [0.1]),
+        ),
+        patch.object(hass.config_entries, "async_forward_entry_setups", side_effect=RuntimeError),
+    ):
+        assert not await hass.config_entries.async_setup(config_entry.entry_id)
+        await hass.async_block_till_done(wait_background_tasks=True)
+
+    registry = cast(PriceCoordinatorRegistry, hass.data[DOMAIN])
+    assert registry.country_ids == []
+
+
+async def test_coordinator_keeps_unchanged_series(hass: HomeAssistant):
+    """Test that an unchanged fetch keeps the series, so payloads computed on it are reused."""
+    config_entry = get_test_config_entry()
+    config_entry.add_to_hass(hass)
+    prices = ([1753653600000, 1753654500000], [5.0, -1.0])
+
+    def get_price_range(*args: Any, **kwargs: Any) -> PriceSeries:
+        # a new, equal series on every fetch
+        return PriceSeries(*prices)
+
+    with patch(
+        "custom_components.delayed_charging.coordinator.get_price_range",
+        new_callable=AsyncMock,
+        side_effect=get_price_range,
+    ):
+        assert await hass.config_entries.async_setup(config_entry.entry_id)
+        await hass.async_block_till_done(wait_background_tasks=True)
+        coordinator = config_entry.runtime_data.coordinator
+        series = coordinator.data
+
+        await coordinator.async_refresh()
+        assert coordinator.data is series
+
+        prices = ([1753653600000, 1753654500000], [5.0, -2.0])
+        await coordinator.async_refresh()
+        assert coordinator.data is not series
+        assert coordinator.data.prices[1] == -2.0
+
+
+async def test_entities_follow_slot_boundaries(hass: HomeAssistant, freezer: FrozenDateTimeFactory):
+    """Test that the entities update at the next slot boundary from the cached prices."""
+    freezer.move_to("2025-07-28T08:10:00+00:00")
+    config_entry = get_test_config_entry()
+    config_entry.add_to_hass(hass)
+    # quarter hours from 10:00 (CEST)
+    series = PriceSeries([1753689600000 + i * 900000 for i in range(4)], [0.1, 0.2, 0.3, 0.4])
+
+    with patch(
+        "custom_components.delayed_charging.coordinator.get_price_range",
+        new_callable=AsyncMock,
+        return_value=series,
+    ) as mock_get_price_range:
+        assert await hass.config_entries.async_setup(config_entry.entry_id)
+        await hass.async_block_till_done()
+        assert cast(State, hass.states.get("sensor.current_price")).state == "0.1"
+
+        freezer.move_to("2025-07-28T08:15:00+00:00")
+        async_fire_time_changed(hass)
+        await hass.async_block_till_done()
+
+        assert cast(State, hass.states.get("sensor.current_price")).state == "0.2"
+        mock_get_price_range.assert_awaited_once()
+
+
+async def test_coordinator_revalidates_while_prices_are_due(hass: HomeAssistant, freezer: FrozenDateTimeFactory):
+    """Test that polls during the publication window bypass the TTLs of the cache."""
+    freezer.move_to("2025-07-28T06:00:00+00:00")
+    config_entry = get_test_config_entry()
+    config_entry.add_to_hass(hass)
+    # quarter hours of 2025-07-28 (CEST)
+    series = PriceSeries([1753653600000 + i * 900000 for i in range(96)], [0.1] * 96)
+
+    with patch(
+        "custom_components.delayed_charging.coordinator.get_price_range", new_callable=AsyncMock, return_value=series
+    ) as mock_get_price_range:
+        assert await hass.config_entries.async_setup(config_entry.entry_id)
+        await hass.async_block_till_done()
+        coordinator = config_entry.runtime_data.coordinator
+        assert mock_get_price_range.await_args_list[-1].kwargs["max_age"] is None
+
+        freezer.move_to("2025-07-28T11:00:00+00:00")
+        await coordinator.async_refresh()
+        assert mock_get_price_range.await_args_list[-1].kwargs["max_age"] == timedelta(0)
+
+
+async def test_coordinator_keeps_prices_during_outage(hass: HomeAssistant, freezer: FrozenDateTimeFactory):
+    """Test that failed fetches keep the last prices while they last and pause requests after repeated failures."""
+    freezer.move_to("2025-07-28T08:10:00+00:00")
+    config_entry = get_test_config_entry()
+    config_entry.add_to_hass(hass)
+    # quarter hours from 10:00 to 11:00 (CEST)
+    series = PriceSeries([1753689600000 + i * 900000 for i in range(4)], [0.1, 0.2, 0.3, 0.4])
+
+    with patch(
+        "custom_components.delayed_charging.coordinator.get_price_range", new_callable=AsyncMock, return_value=series
+    ):
+        assert await hass.config_entries.async_setup(config_entry.entry_id)
+        await hass.async_block_till_done()
+    coordinator = config_entry.runtime_data.coordinator
+
+    with patch("aiohttp.ClientSession.get", side_effect=aiohttp.ClientConnectionError()) as mock_get:
+        for _ in range(coordinator.breaker.threshold):
+            await coordinator.async_refresh()
+        assert coordinator.last_update_success
+        assert coordinator.data is series
+        assert coordinator.breaker.state(dt_util.utcnow()) == "open"
+        assert cast(State, hass.states.get("sensor.current_price")).state == "0.1"
+
+        await coordinator.async_refresh()
+        assert mock_get.call_count == coordinator.breaker.threshold
+        assert coordinator.update_interval == coordinator.breaker.cooldown
+
+        # once the prices have run out, the entities become unavailable
+        freezer.move_to("2025-07-28T09:00:00+00:00")
+        await coordinator.async_refresh()
+        assert not coordinator.last_update_success
+        assert cast(State, hass.states.get("sensor.current_price")).state == "unavailable"
+
+
+async def test_coordinator_treats_empty_prices_as_failure(hass: HomeAssistant, freezer: FrozenDateTimeFactory):
+    """Test that an empty answer from SMARD does not replace the last prices."""
+    freezer.move_to("2025-07-28T08:10:00+00:00")
+    config_entry = get_test_config_entry()
+    config_entry.add_to_hass(hass)
+    series = PriceSeries([1753689600000 + i * 900000 for i in range(4)], [0.1, 0.2, 0.3, 0.4])
+
+    with patch(
+        "custom_components.delayed_charging.coordinator.get_price_range", new_callable=AsyncMock, return_value=series
+    ) as mock_get_price_range:
+        assert await hass.config_entries.async_setup(config_entry.entry_id)
+        await hass.async_block_till_done()
+        coordinator = config_entry.runtime_data.coordinator
+
+        mock_get_price_range.return_value = PriceSeries()
+        await coordinator.async_refresh()
+
+    assert coordinator.data is series
+    assert coordinator.breaker.failures == 1
+
+
+async def test_coordinator_starts_from_last_prices(
+    hass: HomeAssistant, hass_storage: dict[str, Any], freezer: FrozenDateTimeFactory
+):
+    """Test that setup uses the saved prices without waiting for SMARD and saves the fetched ones."""
+    freezer.move_to("2025-07-28T08:10:00+00:00")
+    saved: dict[str, Any] = {
+        "version": 1,
+        "minor_version": 1,
+        "key": "delayed_charging.prices_4169",
+        "data": {
+            "country_id": "4169",
+            "fetched_at": "2025-07-28T07:00:00+00:00",
+            "resolution_ms": 900000,
+            # quarter hours from 10:00 to 11:00 (CEST)
+            "timestamps": [1753689600000 + i * 900000 for i in range(4)],
+            "prices": [0.1, 0.2, 0.3, 0.4],
+        },
+    }
+    hass_storage["delayed_charging.prices_4169"] = saved
+    config_entry = get_test_config_entry()
+    config_entry.add_to_hass(hass)
+    smard_answered = asyncio.Event()
+    fetched = PriceSeries([1753689600000 + i * 900000 for i in range(8)], [0.5] * 8)
+
+    async def slow_get_price_range(*args: Any, **kwargs: Any) -> PriceSeries:
+        await smard_answered.wait()
+        return fetched
+
+    with patch("custom_components.delayed_charging.coordinator.get_price_range", side_effect=slow_get_price_range):
+        assert await hass.config_entries.async_setup(config_entry.entry_id)
+        await hass.async_block_till_done()
+        assert cast(State, hass.states.get("sensor.current_price")).state == "0.1"
+
+        smard_answered.set()
+        await hass.async_block_till_done(wait_background_tasks=True)
+        assert cast(State, hass.states.get("sensor.current_price")).state == "0.5"
+
+    freezer.tick(11)
+    async_fire_time_changed(hass)
+    await hass.async_block_till_done()
+    assert hass_storage["delayed_charging.prices_4169"]["data"]["prices"] == [0.5] * 8
+
+
+async def test_coordinator_keeps_last_prices_when_smard_is_down_at_startup(
+    hass: HomeAssistant, hass_storage: dict[str, Any], freezer: FrozenDateTimeFactory
+):
+    """Test that the restored prices survive a failing background refresh."""
+    freezer.move_to("2025-07-28T08:10:00+00:00")
+    hass_storage["delayed_charging.prices_4169"] = {
+        "version": 1,
+        "minor_version": 1,
+        "key": "delayed_charging.prices_4169",
+        "data": {
+            "country_id": "4169",
+            "fetched_at": "2025-07-28T07:00:00+00:00",
+            "resolution_ms": 900000,
+            "timestamps": [1753689600000 + i * 900000 for i in range(4)],
+            "prices": [0.1, 0.2, 0.3, 0.4],
+        },
+    }
+    config_entry = get_test_config_entry()
+    config_entry.add_to_hass(hass)
+
+    with patch("aiohttp.ClientSession.get", side_effect=aiohttp.ClientConnectionError()) as mock_get:
+        assert await hass.config_entries.async_setup(config_entry.entry_id)
+        await hass.async_block_till_done(wait_background_tasks=True)
+
+    mock_get.assert_called()
+    coordinator = config_entry.runtime_data.coordinator
+    assert list(coordinator.data.prices) == [0.1, 0.2, 0.3, 0.4]
+    assert coordinator.last_update_success
+    assert coordinator.breaker.failures == 1
+    assert cast(State, hass.states.get("sensor.current_price")).state == "0.1"
+
+
+async def test_coordinator_ignores_outdated_last_prices(hass: HomeAssistant, hass_storage: dict[str, Any]):
+    """Test that saved prices which no longer cover the current time are not used."""
+    hass_storage["delayed_charging.prices_4169"] = {
+        "version": 1,
+        "minor_version": 1,
+        "key": "delayed_charging.prices_4169",
+        "data": {
+            "country_id": "4169",
+            "fetched_at": "2020-01-01T00:00:00+00:00",
+            "resolution_ms": 900000,
+            "timestamps": [1577836800000],
+            "prices": [0.1],
+        },
+    }
+    config_entry = get_test_config_entry()
+    config_entry.add_to_hass(hass)
+
+    with patch("aiohttp.ClientSession.get", side_effect=aiohttp.ClientConnectionError()):
+        assert not await hass.config_entries.async_setup(config_entry.entry_id)
+
+
 # async def test_coordinator_update_failure(hass: HomeAssistant):
 #     """Test coordinator handles update failure."""
 #     config_entry = get_test_config_entry()
@@ -0,0 +1,26 @@
+"""Test the diagnostics."""
+
+from homeassistant.core import HomeAssistant
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.delayed_charging.const import DOMAIN
+from custom_components.delayed_charging.diagnostics import async_get_config_entry_diagnostics
+
+
+async def test_diagnostics(hass: HomeAssistant, coordinator_update_patch: None):
+    """Test that the diagnostics show the prices and the state of the requests."""
+    entry = MockConfigEntry(domain=DOMAIN, options={"country_id": "DE", "threshold": 0.15})
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+
+    diagnostics = await async_get_config_entry_diagnostics(hass, entry)
+
+    assert diagnostics["options"] == {"country_id": "DE", "threshold": 0.15}
+    prices = diagnostics["prices"]
+    assert prices["country_id"] == "DE"
+    assert prices["slots"] == 3
+    assert prices["first_slot"] == "2025-08-21T12:00:00+02:00"
+    assert prices["last_update_success"]
+    assert prices["circuit_breaker"]["state"] == "closed"
+    assert diagnostics["battery"] is None
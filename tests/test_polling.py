@@ -0,0 +1,113 @@
+"""Tests for polling.py module."""
+
+import datetime
+import random
+from zoneinfo import ZoneInfo
+
+from custom_components.delayed_charging.polling import (
+    IDLE_INTERVAL,
+    MISSING_INTERVAL,
+    PUBLICATION_INTERVAL,
+    RETRY_MAX,
+    SPREAD,
+    CircuitBreaker,
+    awaiting_publication,
+    next_poll,
+    zone_offset,
+)
+from custom_components.delayed_charging.service import RESOLUTION_MS, PriceSeries, dt2ts
+
+# We pretend the system tz to be Central European (Summer) Time
+CONSTANT_SYSTEM_TZ = ZoneInfo("Europe/Berlin")
+
+MIDNIGHT = datetime.datetime(2025, 7, 28, 0, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
+HOUR = datetime.timedelta(hours=1)
+
+
+def hours_until(end: datetime.datetime) -> PriceSeries:
+    """Hourly prices of the day before up to `end`."""
+    first = MIDNIGHT - 24 * HOUR
+    count = int((end - first) / HOUR)
+    return PriceSeries([dt2ts(first + i * HOUR) for i in range(count)], [1.0] * count, RESOLUTION_MS["hour"])
+
+
+def test_next_poll_follows_publication():
+    """Test waiting for the publication time, polling during it and idling once tomorrow is known."""
+    today = hours_until(MIDNIGHT + 24 * HOUR)
+    tomorrow = hours_until(MIDNIGHT + 48 * HOUR)
+
+    assert next_poll(today, MIDNIGHT + 11 * HOUR) == datetime.timedelta(minutes=90)
+    assert next_poll(today, MIDNIGHT + 2 * HOUR) == IDLE_INTERVAL
+    assert next_poll(today, MIDNIGHT + 13 * HOUR) == PUBLICATION_INTERVAL
+    assert next_poll(tomorrow, MIDNIGHT + 14 * HOUR) == IDLE_INTERVAL
+    assert next_poll(tomorrow, MIDNIGHT + 32 * HOUR) == datetime.timedelta(hours=4, minutes=30)
+    assert next_poll(hours_until(MIDNIGHT + 20 * HOUR), MIDNIGHT + 11 * HOUR) == MISSING_INTERVAL
+    assert next_poll(None, MIDNIGHT) == MISSING_INTERVAL
+
+
+def test_next_poll_backs_off_with_jitter():
+    """Test that the wait after failures grows exponentially up to a maximum, randomized."""
+    rng = random.Random(1)
+    waits = [next_poll(None, MIDNIGHT, failures, rng=rng) for failures in range(1, 10)]
+
+    assert datetime.timedelta(seconds=30) <= waits[0] <= datetime.timedelta(minutes=1)
+    assert datetime.timedelta(minutes=2) <= waits[2] <= datetime.timedelta(minutes=4)
+    assert all(RETRY_MAX / 2 <= wait <= RETRY_MAX for wait in waits[6:])
+
+
+def test_zone_offset():
+    """Test that zones get distinct, stable offsets within the spread."""
+    offsets = {zone_offset(country_id) for country_id in ("4169", "5078", "4996", "4997", "254")}
+
+    assert len(offsets) == 5
+    assert all(datetime.timedelta(0) <= offset < SPREAD for offset in offsets)
+    assert zone_offset("4169") == zone_offset("4169")
+
+
+def test_polls_per_day():
+    """Test that a day with tomorrow's prices published at 13:20 takes at least 20 times fewer polls than every 2 minutes."""
+    now = MIDNIGHT
+    polls = 0
+    while now < MIDNIGHT + 24 * HOUR:
+        published = now >= MIDNIGHT + datetime.timedelta(hours=13, minutes=20)
+        now += next_poll(hours_until(MIDNIGHT + (48 if published else 24) * HOUR), now, offset=zone_offset("4169"))
+        polls += 1
+
+    assert polls <= 24 * 30 / 20
+
+
+def test_circuit_breaker():
+    """Test opening after repeated failures, the half-open trial and the growing cooldown."""
+    breaker = CircuitBreaker(
+        threshold=3, cooldown=datetime.timedelta(minutes=10), max_cooldown=datetime.timedelta(minutes=15)
+    )
+    now = MIDNIGHT
+
+    assert not breaker.record_failure(now)
+    assert not breaker.record_failure(now)
+    assert breaker.record_failure(now)
+    assert breaker.state(now) == "open"
+    assert not breaker.allow(now + datetime.timedelta(minutes=9))
+    assert breaker.retry_in(now + datetime.timedelta(minutes=9)) == datetime.timedelta(minutes=1)
+
+    now += datetime.timedelta(minutes=10)
+    assert breaker.state(now) == "half_open"
+    assert breaker.allow(now)
+    assert breaker.record_failure(now)
+    assert breaker.retry_in(now) == datetime.timedelta(minutes=15)
+
+    now += datetime.timedelta(minutes=15)
+    breaker.record_success()
+    assert breaker.state(now) == "closed"
+    assert breaker.as_dict(now) == {"state": "closed", "failures": 0, "opened_until": None}
+    assert not breaker.record_failure(now)
+
+
+def test_awaiting_publication():
+    """Test that tomorrow's prices are due from the publication time until they are known."""
+    today = hours_until(MIDNIGHT + 24 * HOUR)
+
+    assert not awaiting_publication(today, MIDNIGHT + 12 * HOUR)
+    assert awaiting_publication(today, MIDNIGHT + 13 * HOUR)
+    assert not awaiting_publication(hours_until(MIDNIGHT + 48 * HOUR), MIDNIGHT + 13 * HOUR)
+    assert not awaiting_publication(None, MIDNIGHT + 13 * HOUR)
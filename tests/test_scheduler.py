@@ -0,0 +1,72 @@
+"""Tests for scheduler.py module."""
+
+import datetime
+import math
+import random
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from custom_components.delayed_charging.scheduler import Load, schedule_loads
+from custom_components.delayed_charging.service import PriceSeries, dt2ts, plan_charging
+
+# We pretend the system tz to be Central European (Summer) Time
+CONSTANT_SYSTEM_TZ = ZoneInfo("Europe/Berlin")
+
+MIDNIGHT = datetime.datetime(2025, 7, 28, 0, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
+QUARTER_HOUR = datetime.timedelta(minutes=15)
+
+
+def quarter_hours(prices: list[float]) -> PriceSeries:
+    return PriceSeries([dt2ts(MIDNIGHT + i * QUARTER_HOUR) for i in range(len(prices))], prices)
+
+
+def test_schedule_loads_shifts_energy_between_loads():
+    """Test that a cheap slot taken by a flexible load is handed to a load that needs it."""
+    series = quarter_hours([1.0, 2.0, 10.0, 10.0])
+    loads = [
+        Load("flexible", 2.0, 4.0, MIDNIGHT + 4 * QUARTER_HOUR),
+        Load("urgent", 1.0, 4.0, MIDNIGHT + QUARTER_HOUR),
+    ]
+
+    flexible, urgent = schedule_loads(series, loads, grid_limit=4.0, now=MIDNIGHT)
+
+    assert [slot.price for slot in urgent.slots] == [1.0]
+    assert [slot.price for slot in flexible.slots] == [2.0, 10.0]
+    assert math.isclose(flexible.cost + urgent.cost, 13.0 / 1000, abs_tol=1e-12)
+    assert flexible.missing == urgent.missing == 0.0
+
+
+def test_schedule_loads_respects_grid_limit():
+    """Test that the loads share cheap slots up to the grid limit and report what does not fit."""
+    series = quarter_hours([5.0, -1.0, 3.0, 8.0])
+    loads = [Load(f"car {i}", 2.0, 11.0, MIDNIGHT + 4 * QUARTER_HOUR) for i in range(3)]
+
+    schedules = schedule_loads(series, loads, grid_limit=12.0, now=MIDNIGHT)
+
+    for slot in range(4):
+        power = sum(s.power for schedule in schedules for s in schedule.slots if s.start == MIDNIGHT + slot * QUARTER_HOUR)
+        assert power <= 12.0 + 1e-9
+    assert math.isclose(sum(schedule.energy for schedule in schedules), 6.0, abs_tol=1e-12)
+    assert math.isclose(sum(schedule.cost for schedule in schedules), (3.0 * -1.0 + 3.0 * 3.0) / 1000, abs_tol=1e-12)
+
+    schedules = schedule_loads(series, loads, grid_limit=4.0, now=MIDNIGHT + QUARTER_HOUR)
+    assert math.isclose(sum(schedule.missing for schedule in schedules), 3.0, abs_tol=1e-12)
+
+
+def test_schedule_single_load_matches_planner():
+    """Test that without a binding grid limit a single load costs what the charging planner finds."""
+    rng = random.Random(7)
+    series = quarter_hours([rng.uniform(-20.0, 100.0) for _ in range(96)])
+    deadline = MIDNIGHT + 80 * QUARTER_HOUR
+
+    (schedule,) = schedule_loads(series, [Load("battery", 7.0, 4.0, deadline)], grid_limit=100.0, now=MIDNIGHT)
+    plan = plan_charging(series, 7.0, 4.0, deadline, start=MIDNIGHT)
+
+    assert plan is not None
+    assert math.isclose(schedule.cost, plan.cost, abs_tol=1e-12)
+
+
+def test_schedule_loads_invalid_arguments():
+    with pytest.raises(ValueError):
+        schedule_loads(quarter_hours([1.0]), [Load("car", 1.0, 0.0, MIDNIGHT)], grid_limit=10.0)
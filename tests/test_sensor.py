@@ -1,6 +1,7 @@
 """Test the Delayed Charging binary sensor setup."""
 
 import datetime
+import math
 from unittest.mock import MagicMock, patch
 from zoneinfo import ZoneInfo
 
@@ -9,6 +10,7 @@ from homeassistant.core import HomeAssistant
 from pytest_homeassistant_custom_component.common import MockConfigEntry
 
 from custom_components.delayed_charging.const import DOMAIN
+from custom_components.delayed_charging.service import RESOLUTION_MS, PriceSeries
 
 # We pretend the system tz to be Central European (Summer) Time
 CONSTANT_SYSTEM_TZ = ZoneInfo("Europe/Berlin")
@@ -38,6 +40,8 @@ def mock_datetime_now():
         mock_datetime.now = staticmethod(fake_now_staticmethod)  # type: ignore[assignment]
         # Ensure other datetime methods work normally
         mock_datetime.side_effect = real_datetime_class
+        mock_datetime.combine = real_datetime_class.combine
+        mock_datetime.fromtimestamp = real_datetime_class.fromtimestamp
         yield fake_now
 
 
@@ -97,7 +101,7 @@ async def test_sensor_states_with_empty_data(
     hass: HomeAssistant, mock_config_entry: MockConfigEntry, mock_datetime_now: MagicMock
 ):
     """Test sensor states when coordinator returns empty data."""
-    empty_data: list[tuple[datetime.datetime, float]] = []
+    empty_data = PriceSeries()
 
     async def mock_update():
         return empty_data
@@ -128,7 +132,7 @@ async def test_sensor_states_with_single_datapoint(
 ):
     """Test sensor states when coordinator returns a single datapoint."""
     test_time = TEST_TIME
-    single_data = [(test_time, 0.10)]
+    single_data = PriceSeries.from_datetimes([(test_time, 0.10)], RESOLUTION_MS["hour"])
 
     async def mock_update():
         return single_data
@@ -160,11 +164,12 @@ async def test_sensor_states_with_gaps(
 ):
     """Test sensor states when coordinator returns data with gaps."""
     test_time = TEST_TIME
-    gap_data = sorted(
+    gap_data = PriceSeries.from_datetimes(
         [
             (test_time, 0.20),
             (datetime.datetime(2025, 7, 28, 14, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ), 0.10),
-        ]
+        ],
+        RESOLUTION_MS["hour"],
     )
 
     async def mock_update():
@@ -194,6 +199,155 @@ async def test_sensor_states_with_gaps(
         assert charging_active.state == "on"
 
 
+async def test_planned_charging_start(hass: HomeAssistant, mock_datetime_now: MagicMock):
+    """Test that the planned start follows the charging options of the entry."""
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={"country_id": "DE", "threshold": 0.15},
+        options={"country_id": "DE", "threshold": 0.15, "energy": 2.0, "power": 4.0, "deadline": "11:00:00"},
+    )
+    # quarter hours from 10:00 to 11:45
+    prices = [0.30, 0.05, 0.25, 0.10, 0.20, 0.15, 0.01, 0.01]
+    data = PriceSeries([1753689600000 + i * RESOLUTION_MS["quarterhour"] for i in range(len(prices))], prices)
+
+    async def mock_update():
+        return data
+
+    with patch(
+        "custom_components.delayed_charging.coordinator.ElectricityPriceCoordinator._async_update_data",
+        side_effect=mock_update,
+    ):
+        config_entry.add_to_hass(hass)
+        assert await hass.config_entries.async_setup(config_entry.entry_id)
+        await hass.async_block_till_done()
+
+        planned_start = hass.states.get("sensor.planned_charging_start")
+
+    # the two cheapest quarter hours from now (10:15) until 11:00
+    assert planned_start is not None
+    assert planned_start.state == "2025-07-28T08:15:00+00:00"
+    assert planned_start.attributes["end"] == "2025-07-28T11:00:00+02:00"
+    assert [slot["price"] for slot in planned_start.attributes["slots"]] == [0.05, 0.10]
+
+
+async def test_current_price_rank(hass: HomeAssistant, mock_config_entry: MockConfigEntry, mock_datetime_now: MagicMock):
+    """Test that the rank sensor shows the current slot's standing within today."""
+    # quarter hours from 10:00 to 11:45
+    prices = [0.30, 0.05, 0.25, 0.10, 0.20, 0.15, 0.01, 0.01]
+    data = PriceSeries([1753689600000 + i * RESOLUTION_MS["quarterhour"] for i in range(len(prices))], prices)
+
+    async def mock_update():
+        return data
+
+    with patch(
+        "custom_components.delayed_charging.coordinator.ElectricityPriceCoordinator._async_update_data",
+        side_effect=mock_update,
+    ):
+        mock_config_entry.add_to_hass(hass)
+        assert await hass.config_entries.async_setup(mock_config_entry.entry_id)
+        await hass.async_block_till_done()
+
+        rank = hass.states.get("sensor.current_price_rank")
+
+    # now (10:15) costs 0.05, undercut only by the two slots at 0.01
+    assert rank is not None
+    assert rank.state == "3"
+    assert math.isclose(rank.attributes["percentile"], 200 / 7, abs_tol=0.05)
+    assert rank.attributes["slots_today"] == 8
+    ranks = rank.attributes["ranks"]
+    assert ranks["2025-07-28T10:15:00+02:00"] == 3
+    assert ranks["2025-07-28T11:30:00+02:00"] == ranks["2025-07-28T11:45:00+02:00"] == 1
+
+
+async def test_current_price_rank_on_fall_back_day(hass: HomeAssistant, mock_config_entry: MockConfigEntry):
+    """Test that the repeated hour of the 25-hour day keeps a rank per slot."""
+    midnight = datetime.datetime(2025, 10, 26, 0, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
+    # the 100 quarter hours of 2025-10-26, the dearer the later
+    data = PriceSeries([int(midnight.timestamp() * 1000) + i * RESOLUTION_MS["quarterhour"] for i in range(100)], range(100))
+
+    async def mock_update():
+        return data
+
+    with (
+        patch(
+            "custom_components.delayed_charging.coordinator.ElectricityPriceCoordinator._async_update_data",
+            side_effect=mock_update,
+        ),
+        patch("custom_components.delayed_charging.service.datetime.datetime", wraps=datetime.datetime) as mock_datetime,
+    ):
+        mock_datetime.now.return_value = datetime.datetime(2025, 10, 26, 12, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
+        mock_config_entry.add_to_hass(hass)
+        assert await hass.config_entries.async_setup(mock_config_entry.entry_id)
+        await hass.async_block_till_done()
+
+        rank = hass.states.get("sensor.current_price_rank")
+
+    assert rank is not None
+    assert rank.attributes["slots_today"] == 100
+    assert len(rank.attributes["ranks"]) == 100
+    assert rank.attributes["ranks"]["2025-10-26T02:00:00+02:00"] == 9
+    assert rank.attributes["ranks"]["2025-10-26T02:00:00+01:00"] == 13
+
+
+async def test_current_price_columnar_chart(hass: HomeAssistant, coordinator_update_patch: None):
+    """Test that the chart data can be provided as columns instead of points."""
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={"country_id": "DE", "threshold": 0.15},
+        options={"country_id": "DE", "threshold": 0.15, "chart_columnar": True},
+    )
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    current_price = hass.states.get("sensor.current_price")
+
+    assert current_price is not None
+    assert "apexchart_series" not in current_price.attributes
+    assert current_price.attributes["chart_series"] == {
+        "timestamps": [1755770400000, 1755774000000, 1755777600000],
+        "prices": [0.10, 0.15, 0.20],
+    }
+
+
+async def test_battery_sensors(hass: HomeAssistant, mock_datetime_now: MagicMock):
+    """Test that the battery sensors follow the arbitrage schedule of the entry."""
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={"country_id": "DE", "threshold": 0.15},
+        options={
+            "country_id": "DE",
+            "threshold": 0.15,
+            "battery_capacity": 1.0,
+            "battery_power": 4.0,
+            "battery_efficiency": 1.0,
+        },
+    )
+    # quarter hours from 10:00 to 11:00
+    prices = [300.0, 10.0, 200.0, 200.0]
+    data = PriceSeries([1753689600000 + i * RESOLUTION_MS["quarterhour"] for i in range(len(prices))], prices)
+
+    async def mock_update():
+        return data
+
+    with patch(
+        "custom_components.delayed_charging.coordinator.ElectricityPriceCoordinator._async_update_data",
+        side_effect=mock_update,
+    ):
+        config_entry.add_to_hass(hass)
+        assert await hass.config_entries.async_setup(config_entry.entry_id)
+        await hass.async_block_till_done()
+
+        power = hass.states.get("sensor.battery_planned_power")
+        profit = hass.states.get("sensor.battery_arbitrage_profit")
+
+    # the empty battery charges from now (10:15) and sells the energy afterwards
+    assert power is not None and profit is not None
+    assert power.state == "4.0"
+    assert power.attributes["soc"] == 1.0
+    assert profit.state == "0.19"
+
+
 # async def test_sensor_state_updates(hass: HomeAssistant, mock_config_entry: MockConfigEntry, mock_datetime_now: MagicMock):
 #     """Test that sensor states update when coordinator data changes."""
 #     test_time = TEST_TIME
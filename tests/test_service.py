@@ -1,16 +1,34 @@
 """Tests for service.py module."""
 
 import datetime
+import math
+import random
+import statistics
+import sys
 from unittest.mock import MagicMock, patch
 from zoneinfo import ZoneInfo
 
+import pytest
+
 from custom_components.delayed_charging.service import (
+    RESOLUTION_MS,
+    PriceSeries,
+    PriceSlot,
+    ThresholdIndex,
+    count_slots_below,
     delayed_charging_is_active_today,
+    dt2ts,
     dtfmt,
     get_charging_start,
     get_current_price,
+    get_current_slot,
+    get_threshold,
+    lttb,
+    plan_charging,
     same_date,
+    today_range,
     ts2dt,
+    upcoming_range,
 )
 
 # We pretend the system tz to be Central European (Summer) Time
@@ -25,6 +43,13 @@ def test_ts2dt():
     assert ts2dt(timestamp) == expected_dt
 
 
+def test_dt2ts():
+    """Test datetime to timestamp conversion."""
+    dt = datetime.datetime(2025, 7, 1, 3, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
+    assert dt2ts(dt) == 1751331600000
+    assert dt2ts(ts2dt(1751331600000)) == 1751331600000
+
+
 def test_same_date():
     """Test same_date function."""
     dt1 = datetime.datetime(2025, 7, 28, 10, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
@@ -44,12 +69,14 @@ def test_dtfmt():
 def test_get_charging_start():
     """Test get_charging_start function."""
     midnight = datetime.datetime(2025, 7, 28, 0, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
-    timeseries = [
-        (midnight, 15.0),
-        (midnight + datetime.timedelta(hours=1), 12.0),
-        (midnight + datetime.timedelta(hours=2), 8.0),
-        (midnight + datetime.timedelta(hours=3), 18.0),
-    ]
+    timeseries = PriceSeries.from_datetimes(
+        [
+            (midnight, 15.0),
+            (midnight + datetime.timedelta(hours=1), 12.0),
+            (midnight + datetime.timedelta(hours=2), 8.0),
+            (midnight + datetime.timedelta(hours=3), 18.0),
+        ]
+    )
 
     # Test with threshold that finds a match
     assert get_charging_start(timeseries, 10.0) == midnight + datetime.timedelta(hours=2)
@@ -58,18 +85,68 @@ def test_get_charging_start():
     assert get_charging_start(timeseries, 5.0) is None
 
     # Test with empty timeseries
-    assert get_charging_start([], 10.0) is None
+    assert get_charging_start(PriceSeries(), 10.0) is None
+
+
+@patch("custom_components.delayed_charging.service.datetime.datetime", wraps=datetime.datetime)
+def test_get_charging_start_upcoming(mock_datetime: MagicMock):
+    """Test that runs of cheap slots which are over are skipped across days."""
+    midnight = datetime.datetime(2025, 7, 28, 0, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
+    prices = [5.0, 15.0, 8.0, 7.0, 18.0, 9.0]
+    timeseries = PriceSeries.from_datetimes(
+        [(midnight + datetime.timedelta(hours=hours), price) for hours, price in enumerate(prices)]
+    )
+
+    # ongoing run: its start is kept
+    mock_datetime.now.return_value = midnight + datetime.timedelta(hours=3, minutes=30)
+    assert get_charging_start(timeseries, 10.0, upcoming=True) == midnight + datetime.timedelta(hours=2)
+
+    # between runs: the next one
+    mock_datetime.now.return_value = midnight + datetime.timedelta(hours=4, minutes=30)
+    assert get_charging_start(timeseries, 10.0, upcoming=True) == midnight + datetime.timedelta(hours=5)
+
+    # before the series starts
+    mock_datetime.now.return_value = midnight - datetime.timedelta(hours=1)
+    assert get_charging_start(timeseries, 10.0, upcoming=True) == midnight
+
+    # all runs are over
+    mock_datetime.now.return_value = midnight + datetime.timedelta(hours=4, minutes=30)
+    assert get_charging_start(timeseries[:5], 10.0, upcoming=True) is None
+    assert get_charging_start(PriceSeries(), 10.0, upcoming=True) is None
+
+    # every start is served by the index of the whole series
+    assert list(timeseries._threshold_indexes) == [(0, 6)]  # pyright: ignore[reportPrivateUsage]
+
+
+@patch("custom_components.delayed_charging.service.datetime.datetime", wraps=datetime.datetime)
+def test_delayed_charging_is_active_today_only(mock_datetime: MagicMock):
+    """Test that only today's slots count for a multi-day series."""
+    mock_datetime.now.return_value = datetime.datetime(2025, 7, 28, 22, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
+    timeseries = PriceSeries.from_datetimes(
+        [
+            (datetime.datetime(2025, 7, 27, 13, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ), -5.0),
+            (datetime.datetime(2025, 7, 28, 13, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ), 15.0),
+            (datetime.datetime(2025, 7, 29, 13, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ), -5.0),
+        ]
+    )
+
+    assert delayed_charging_is_active_today(timeseries, 0.0) is True
+    assert delayed_charging_is_active_today(timeseries, 0.0, today_only=True) is False
+    assert delayed_charging_is_active_today(timeseries, 20.0, today_only=True) is True
+    assert delayed_charging_is_active_today(timeseries, 0.0, upcoming=True) is True
 
 
 def test_delayed_charging_is_active_today():
     """Test delayed_charging_is_active_today function."""
     midnight = datetime.datetime(2025, 7, 28, 0, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
-    timeseries = [
-        (midnight, 15.0),
-        (midnight + datetime.timedelta(hours=1), 12.0),
-        (midnight + datetime.timedelta(hours=2), 8.0),
-        (midnight + datetime.timedelta(hours=3), 18.0),
-    ]
+    timeseries = PriceSeries.from_datetimes(
+        [
+            (midnight, 15.0),
+            (midnight + datetime.timedelta(hours=1), 12.0),
+            (midnight + datetime.timedelta(hours=2), 8.0),
+            (midnight + datetime.timedelta(hours=3), 18.0),
+        ]
+    )
 
     # Test when charging should be active (price below threshold)
     assert delayed_charging_is_active_today(timeseries, 10.0) is True
@@ -78,27 +155,351 @@ def test_delayed_charging_is_active_today():
     assert delayed_charging_is_active_today(timeseries, 5.0) is False
 
     # Test with empty timeseries
-    assert delayed_charging_is_active_today([], 10.0) is False
+    assert delayed_charging_is_active_today(PriceSeries(), 10.0) is False
 
 
-@patch("custom_components.delayed_charging.service.datetime")
+@patch("custom_components.delayed_charging.service.datetime.datetime", wraps=datetime.datetime)
 def test_get_current_price(mock_datetime: MagicMock):
     """Test get_current_price function."""
     now = datetime.datetime(2025, 7, 28, 10, 15, 0, tzinfo=CONSTANT_SYSTEM_TZ)
-    mock_datetime.datetime.now.return_value = now
+    mock_datetime.now.return_value = now
 
-    timeseries = [
-        (datetime.datetime(2025, 7, 28, 9, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ), 15.0),
-        (datetime.datetime(2025, 7, 28, 10, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ), 12.0),
-        (datetime.datetime(2025, 7, 28, 11, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ), 8.0),
-    ]
+    timeseries = PriceSeries.from_datetimes(
+        [
+            (datetime.datetime(2025, 7, 28, 9, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ), 15.0),
+            (datetime.datetime(2025, 7, 28, 10, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ), 12.0),
+            (datetime.datetime(2025, 7, 28, 11, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ), 8.0),
+        ],
+        RESOLUTION_MS["hour"],
+    )
 
     # Test getting current price
     assert get_current_price(timeseries) == 12.0
 
     # Test with empty timeseries
-    assert get_current_price([]) is None
+    assert get_current_price(PriceSeries()) is None
 
     # Test with only future prices
-    future_series = [(now + datetime.timedelta(hours=1), 8.0)]
+    future_series = PriceSeries.from_datetimes([(now + datetime.timedelta(hours=1), 8.0)])
     assert get_current_price(future_series) is None
+
+
+def test_price_series():
+    """Test the array-backed price series."""
+    series = PriceSeries.from_items([[1753653600000, 10.0], [1753654500000, None], [1753655400000, -2.5]])
+
+    assert len(series) == 2
+    assert series.timestamps.tolist() == [1753653600000, 1753655400000]
+    assert series[0] == (datetime.datetime(2025, 7, 28, 0, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ), 10.0)
+    assert [price for _, price in series] == [10.0, -2.5]
+    assert series[1:] == PriceSeries([1753655400000], [-2.5])
+    assert series.between(1753653600000 + 1, 1753655400000 + 1) == series[1:]
+    assert series == PriceSeries.from_datetimes(list(series))
+    assert not PriceSeries()
+
+
+def test_price_series_is_compact():
+    """Test that a series costs a fraction of the equivalent list of tuples."""
+    midnight = datetime.datetime(2025, 7, 28, 0, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
+    items = [(midnight + datetime.timedelta(minutes=15 * i), float(i)) for i in range(4 * 96)]
+    series = PriceSeries.from_datetimes(items)
+
+    list_size = sys.getsizeof(items) + sum(
+        sys.getsizeof(item) + sys.getsizeof(item[0]) + sys.getsizeof(item[1]) for item in items
+    )
+    series_size = sys.getsizeof(series.timestamps) + sys.getsizeof(series.prices)
+    assert series_size * 7 < list_size
+
+
+def test_price_series_index_at():
+    """Test locating slots arithmetically, across gaps and on a DST transition."""
+    # 2025-10-26 has 25 hours in CET/CEST, i.e. 100 quarter hours
+    midnight = datetime.datetime(2025, 10, 26, 0, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
+    quarter_hour = RESOLUTION_MS["quarterhour"]
+    timestamps = [dt2ts(midnight) + i * quarter_hour for i in range(100)]
+    series = PriceSeries(timestamps[:40] + timestamps[44:], [float(i) for i in range(96)])
+
+    assert series.index_at(timestamps[0]) == 0
+    assert series.index_at(timestamps[12] + 1) == 12
+    assert series.index_at(timestamps[41]) is None
+    assert series.index_at(timestamps[44]) == 40
+    assert series.index_at(timestamps[99] + quarter_hour - 1) == 95
+    assert series.index_at(timestamps[99] + quarter_hour) is None
+    assert series.index_at(timestamps[0] - 1) is None
+    assert PriceSeries().index_at(timestamps[0]) is None
+
+    # the second 02:00 (CET) follows 02:45 (CEST)
+    first_two, second_two = series.slot_at(timestamps[8]), series.slot_at(timestamps[12])
+    assert first_two is not None and second_two is not None
+    assert first_two.start.hour == second_two.start.hour == 2
+    assert first_two.start.utcoffset() != second_two.start.utcoffset()
+    assert dt2ts(second_two.start) - dt2ts(first_two.start) == 3600 * 1000
+    assert dt2ts(second_two.end) - dt2ts(second_two.start) == quarter_hour
+
+
+def test_price_series_slot_at_is_cached():
+    """Test that a slot is only looked up again once it is over."""
+    series = PriceSeries([1753653600000, 1753654500000], [10.0, 20.0])
+
+    slot = series.slot_at(1753653600000)
+    with patch.object(PriceSeries, "index_at") as index_at:
+        assert series.slot_at(1753654499999) is slot
+        index_at.assert_not_called()
+    assert series.slot_at(1753654500000) == PriceSlot(
+        datetime.datetime(2025, 7, 28, 0, 15, 0, tzinfo=CONSTANT_SYSTEM_TZ),
+        datetime.datetime(2025, 7, 28, 0, 30, 0, tzinfo=CONSTANT_SYSTEM_TZ),
+        20.0,
+    )
+
+
+def test_price_series_next_boundary():
+    """Test that the next change of the current slot is its end, or the next start in a gap."""
+    series = PriceSeries([1753653600000, 1753654500000, 1753657200000], [1.0, 2.0, 3.0])
+
+    assert series.next_boundary(1753653600000 - 1) == 1753653600000
+    assert series.next_boundary(1753653600000) == 1753654500000
+    assert series.next_boundary(1753654500000 + 1) == 1753655400000
+    assert series.next_boundary(1753655400000) == 1753657200000
+    assert series.next_boundary(1753658100000) is None
+    assert PriceSeries().next_boundary(0) is None
+
+
+@patch("custom_components.delayed_charging.service.datetime.datetime", wraps=datetime.datetime)
+def test_get_current_slot(mock_datetime: MagicMock):
+    """Test that the current slot is returned with its start and end."""
+    mock_datetime.now.return_value = datetime.datetime(2025, 7, 28, 0, 20, 0, tzinfo=CONSTANT_SYSTEM_TZ)
+    series = PriceSeries([1753653600000, 1753654500000], [10.0, 20.0])
+
+    slot = get_current_slot(series)
+    assert slot is not None
+    assert (slot.start.minute, slot.end.minute, slot.price) == (15, 30, 20.0)
+
+    mock_datetime.now.return_value = datetime.datetime(2025, 7, 28, 0, 30, 0, tzinfo=CONSTANT_SYSTEM_TZ)
+    assert get_current_slot(series) is None
+
+
+def test_threshold_index():
+    """Test threshold queries against a linear scan for many thresholds."""
+    rng = random.Random(42)
+    prices = [round(rng.uniform(-50.0, 150.0), 1) for _ in range(500)]
+    index = ThresholdIndex(prices[100:], offset=100)
+
+    for threshold in [rng.uniform(-60.0, 160.0) for _ in range(200)] + [prices[150], -50.0, 150.0]:
+        below = [i for i in range(100, 500) if prices[i] < threshold]
+        assert index.first_below(threshold) == (below[0] if below else None)
+        assert index.any_below(threshold) == bool(below)
+        assert index.count_below(threshold) == len(below)
+        assert sorted(index.indexes_below(threshold)) == below
+        start = rng.randrange(0, 520)
+        assert index.first_below(threshold, start) == next((i for i in below if i >= start), None)
+
+    assert ThresholdIndex([]).first_below(0.0) is None
+    assert not ThresholdIndex([]).any_below(0.0)
+
+
+def test_threshold_index_is_shared():
+    """Test that a series builds the index of a window only once."""
+    series = PriceSeries([1753653600000, 1753654500000, 1753655400000], [5.0, -1.0, 3.0])
+
+    assert series.threshold_index(1) is series.threshold_index(1, 10)
+    assert series.threshold_index(1) is not series.threshold_index()
+    assert series.threshold_index(1).first_below(4.0) == 1
+    assert series.threshold_index(2).first_below(0.0) is None
+
+
+def test_cheapest_threshold():
+    """Test that exactly the cheapest slots are below the threshold, ties included."""
+    rng = random.Random(7)
+    prices = [rng.uniform(-50.0, 150.0) for _ in range(96)]
+    series = PriceSeries([1753653600000 + i * RESOLUTION_MS["quarterhour"] for i in range(96)], prices)
+
+    for count in [1, 10, 48, 95, 96]:
+        threshold = series.cheapest_threshold(count)
+        assert sorted(price for price in prices if price < threshold) == sorted(prices)[:count]
+    assert series.cheapest_threshold(0) == -float("inf")
+    assert series.cheapest_threshold(500) == series.cheapest_threshold(96)
+
+    ties = PriceSeries([1753653600000, 1753654500000, 1753655400000], [5.0, 1.0, 1.0])
+    assert count_slots_below(ties, ties.cheapest_threshold(1)) == 2
+
+
+def test_get_threshold():
+    """Test the absolute and the relative threshold modes."""
+    series = PriceSeries([1753653600000 + i * RESOLUTION_MS["quarterhour"] for i in range(8)], [8, 1, 7, 2, 6, 3, 5, 4])
+
+    assert get_threshold(series, {}) == 0.0
+    assert get_threshold(series, {"threshold_mode": "absolute", "threshold": 12.5, "cheapest": 2}) == 12.5
+    assert count_slots_below(series, get_threshold(series, {"threshold_mode": "percent", "cheapest": 25})) == 2
+    assert count_slots_below(series, get_threshold(series, {"threshold_mode": "percent", "cheapest": 30})) == 3
+    assert count_slots_below(series, get_threshold(series, {"threshold_mode": "slots", "cheapest": 5})) == 5
+    assert get_charging_start(series, get_threshold(series, {"threshold_mode": "slots", "cheapest": 1})) == series[1][0]
+
+
+@patch("custom_components.delayed_charging.service.datetime.datetime", wraps=datetime.datetime)
+def test_get_threshold_ignores_cheap_previous_day(mock_datetime: MagicMock):
+    """Test that a relative threshold refers to today's or the upcoming slots, not to the lookback."""
+    midnight = datetime.datetime(2025, 7, 28, 0, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
+    # yesterday cheap, today dear, cheapest around noon
+    prices = [1.0] * 24 + [20.0 + abs(12 - hour) for hour in range(24)]
+    series = PriceSeries(
+        [dt2ts(midnight + datetime.timedelta(hours=hours - 24)) for hours in range(48)], prices, RESOLUTION_MS["hour"]
+    )
+    options = {"threshold_mode": "slots", "cheapest": 7}
+    mock_datetime.now.return_value = midnight + datetime.timedelta(hours=8, minutes=30)
+
+    assert get_threshold(series, options) < 20.0
+    today = get_threshold(series, options, *today_range(series))
+    assert count_slots_below(series, today, today_only=True) == 7
+    assert delayed_charging_is_active_today(series, today, today_only=True, upcoming=True)
+
+    upcoming = get_threshold(series, options, *upcoming_range(series))
+    assert get_charging_start(series, upcoming, upcoming=True) == midnight + datetime.timedelta(hours=9)
+
+    # once today's cheapest slots are over, the delay is no longer active
+    mock_datetime.now.return_value = midnight + datetime.timedelta(hours=16, minutes=30)
+    assert not delayed_charging_is_active_today(series, today, today_only=True, upcoming=True)
+
+
+def test_slot_stats():
+    """Test rank, percentile and z-score per local day against a direct computation."""
+    rng = random.Random(3)
+    # from 22:00 on two days before, i.e. 8 quarter hours of the first day
+    start = dt2ts(datetime.datetime(2025, 7, 26, 22, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ))
+    prices = [float(rng.randint(-5, 20)) for _ in range(200)]
+    series = PriceSeries([start + i * RESOLUTION_MS["quarterhour"] for i in range(200)], prices)
+
+    stats = series.slot_stats()
+
+    assert stats.days == [(0, 8), (8, 104), (104, 200)]
+    assert series.slot_stats() is stats
+    for lo, hi in stats.days:
+        day = prices[lo:hi]
+        for i in range(lo, hi):
+            assert stats.day_of(i) == (lo, hi)
+            assert stats.rank[i] == 1 + sum(price < prices[i] for price in day)
+            assert math.isclose(stats.percentile[i], (stats.rank[i] - 1) * 100 / (len(day) - 1))
+            assert math.isclose(stats.zscore[i], (prices[i] - statistics.mean(day)) / statistics.pstdev(day), abs_tol=1e-12)
+    assert PriceSeries().slot_stats().days == []
+
+
+def test_lttb():
+    """Test that downsampling keeps the end points and the extremes of a spiky line."""
+    x = list(range(1000))
+    y = [0.0] * 1000
+    y[250], y[700] = 100.0, -80.0
+
+    indexes = lttb(x, y, 50)
+
+    assert len(indexes) == 50
+    assert indexes[0] == 0 and indexes[-1] == 999
+    assert list(indexes) == sorted(set(indexes))
+    assert {250, 700} <= set(indexes)
+    assert list(lttb(x[:10], y[:10], 50)) == list(range(10))
+
+
+def test_chart_payload():
+    """Test the point and columnar payloads and that they are built only once per series."""
+    start = dt2ts(datetime.datetime(2025, 7, 28, 0, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ))
+    series = PriceSeries([start + i * RESOLUTION_MS["quarterhour"] for i in range(200)], [float(i % 17) for i in range(200)])
+
+    points = series.chart_payload()
+    columns = series.chart_payload(columnar=True)
+
+    assert points[1] == {"x": "2025-07-28T00:15:00+02:00", "y": 1.0}
+    assert columns == {"timestamps": list(series.timestamps), "prices": list(series.prices)}
+    assert series.chart_payload() is points
+    downsampled = series.chart_payload(columnar=True, max_points=20)
+    assert len(downsampled["timestamps"]) == len(downsampled["prices"]) == 20
+    assert downsampled["timestamps"][0] == start and downsampled["timestamps"][-1] == series.timestamps[-1]
+    assert series.chart_payload(max_points=500) == points
+
+
+@patch("custom_components.delayed_charging.service.datetime.datetime", wraps=datetime.datetime)
+def test_count_slots_below(mock_datetime: MagicMock):
+    """Test counting the cheap slots of the whole series and of today."""
+    mock_datetime.now.return_value = datetime.datetime(2025, 7, 28, 22, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
+    timeseries = PriceSeries.from_datetimes(
+        [
+            (datetime.datetime(2025, 7, 27, 13, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ), -5.0),
+            (datetime.datetime(2025, 7, 28, 13, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ), -1.0),
+            (datetime.datetime(2025, 7, 28, 14, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ), 15.0),
+            (datetime.datetime(2025, 7, 29, 13, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ), -5.0),
+        ]
+    )
+
+    assert count_slots_below(timeseries, 0.0) == 3
+    assert count_slots_below(timeseries, 0.0, today_only=True) == 1
+    assert count_slots_below(timeseries, 20.0, today_only=True) == 2
+
+
+def quarter_hours(start: datetime.datetime, prices: list[float]) -> PriceSeries:
+    """Create a quarter-hourly series starting at `start`."""
+    return PriceSeries([dt2ts(start) + i * RESOLUTION_MS["quarterhour"] for i in range(len(prices))], prices)
+
+
+def test_plan_charging_cheapest_slots():
+    """Test that the cheapest slots are picked and the partial slot is the dearest of them."""
+    midnight = datetime.datetime(2025, 7, 28, 0, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
+    series = quarter_hours(midnight, [50.0, 10.0, 40.0, 5.0, 30.0, 20.0])
+    quarter_hour = datetime.timedelta(minutes=15)
+
+    # 4 kW charge 1 kWh per quarter hour, i.e. 2.5 slots are needed
+    plan = plan_charging(series, 2.5, 4.0, midnight + 6 * quarter_hour, start=midnight)
+
+    assert plan is not None
+    assert [(slot.start, slot.end) for slot in plan.slots] == [
+        (midnight + quarter_hour, midnight + 2 * quarter_hour),
+        (midnight + 3 * quarter_hour, midnight + 4 * quarter_hour),
+        (midnight + 5 * quarter_hour, midnight + 5.5 * quarter_hour),
+    ]
+    assert math.isclose(plan.cost, (10.0 + 5.0 + 0.5 * 20.0) / 1000)
+    assert (plan.start, plan.end) == (midnight + quarter_hour, midnight + 5.5 * quarter_hour)
+
+    # the last slot ends after the deadline
+    plan = plan_charging(series, 2.5, 4.0, midnight + 5.5 * quarter_hour, start=midnight)
+    assert plan is not None
+    assert [slot.price for slot in plan.slots] == [10.0, 5.0, 30.0]
+
+    # later starts, as while the planner sensor follows the current time, share the series' index
+    for i in range(3):
+        assert plan_charging(series, 0.5, 4.0, midnight + 6 * quarter_hour, start=midnight + i * quarter_hour) is not None
+    assert list(series._threshold_indexes) == [(0, 6)]  # pyright: ignore[reportPrivateUsage]
+
+    assert plan_charging(series, 6.5, 4.0, midnight + 6 * quarter_hour, start=midnight) is None
+    assert plan_charging(series, 1.0, 4.0, midnight + 6 * quarter_hour, start=midnight + 6 * quarter_hour) is None
+    with pytest.raises(ValueError):
+        plan_charging(series, 0.0, 4.0, midnight + 6 * quarter_hour, start=midnight)
+
+
+def test_plan_charging_contiguous():
+    """Test that the cheapest run of consecutive slots is found, with the partial slot at either end."""
+    midnight = datetime.datetime(2025, 7, 28, 0, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
+    quarter_hour = datetime.timedelta(minutes=15)
+    deadline = midnight + 6 * quarter_hour
+
+    plan = plan_charging(
+        quarter_hours(midnight, [50.0, 10.0, 40.0, 5.0, 30.0, 20.0]), 2.5, 4.0, deadline, start=midnight, contiguous=True
+    )
+    assert plan is not None
+    assert (plan.start, plan.end) == (midnight + 3 * quarter_hour, midnight + 5.5 * quarter_hour)
+    assert math.isclose(plan.cost, (5.0 + 30.0 + 0.5 * 20.0) / 1000)
+
+    plan = plan_charging(
+        quarter_hours(midnight, [40.0, 5.0, 5.0, 50.0]), 2.5, 4.0, deadline, start=midnight, contiguous=True
+    )
+    assert plan is not None
+    assert (plan.start, plan.end) == (midnight + 0.5 * quarter_hour, midnight + 3 * quarter_hour)
+    assert math.isclose(plan.cost, (0.5 * 40.0 + 5.0 + 5.0) / 1000)
+
+
+def test_plan_charging_contiguous_skips_gaps():
+    """Test that a run of consecutive slots does not span a gap in the series."""
+    midnight = datetime.datetime(2025, 7, 28, 0, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
+    quarter_hour = RESOLUTION_MS["quarterhour"]
+    series = PriceSeries([dt2ts(midnight) + i * quarter_hour for i in (0, 1, 3, 4, 5)], [1.0, 1.0, 1.0, 50.0, 60.0])
+    deadline = midnight + datetime.timedelta(hours=2)
+
+    plan = plan_charging(series, 3.0, 4.0, deadline, start=midnight, contiguous=True)
+    assert plan is not None
+    assert [slot.price for slot in plan.slots] == [1.0, 50.0, 60.0]
+    assert plan_charging(series, 4.0, 4.0, deadline, start=midnight, contiguous=True) is None
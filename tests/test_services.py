@@ -0,0 +1,128 @@
+"""Test the service actions."""
+
+import datetime
+import math
+from typing import Any
+from unittest.mock import patch
+from zoneinfo import ZoneInfo
+
+import pytest
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import ServiceValidationError
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.delayed_charging.const import DOMAIN
+from custom_components.delayed_charging.services import (
+    SERVICE_OPTIMIZE_BATTERY,
+    SERVICE_PLAN_CHARGING,
+    SERVICE_SCHEDULE_LOADS,
+)
+
+
+@pytest.fixture
+async def config_entry(hass: HomeAssistant, coordinator_update_patch: None) -> MockConfigEntry:
+    """Set up a config entry whose coordinator holds the mocked prices."""
+    entry = MockConfigEntry(domain=DOMAIN, data={"country_id": "DE", "threshold": 0.15})
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+    return entry
+
+
+async def plan(hass: HomeAssistant, **data: Any) -> Any:
+    return await hass.services.async_call(DOMAIN, SERVICE_PLAN_CHARGING, data, blocking=True, return_response=True)
+
+
+async def test_plan_charging(hass: HomeAssistant, config_entry: MockConfigEntry):
+    """Test that the plan is returned as response data."""
+    response = await plan(
+        hass,
+        config_entry_id=config_entry.entry_id,
+        energy=1.5,
+        power=1.0,
+        start="2025-08-21T12:00:00+02:00",
+        deadline="2025-08-21T15:00:00+02:00",
+    )
+
+    assert response["start"] == "2025-08-21T12:00:00+02:00"
+    assert response["end"] == "2025-08-21T13:30:00+02:00"
+    assert [slot["price"] for slot in response["slots"]] == [0.10, 0.15]
+    assert math.isclose(response["cost"], (0.10 + 0.5 * 0.15) / 1000)
+
+
+async def test_plan_charging_fails(hass: HomeAssistant, config_entry: MockConfigEntry):
+    """Test that infeasible plans and unknown entries are reported."""
+    with pytest.raises(ServiceValidationError):
+        await plan(
+            hass,
+            config_entry_id=config_entry.entry_id,
+            energy=5.0,
+            power=1.0,
+            start="2025-08-21T12:00:00+02:00",
+            deadline="2025-08-21T15:00:00+02:00",
+        )
+    with pytest.raises(ServiceValidationError):
+        await plan(hass, config_entry_id="unknown", energy=1.0, power=1.0, deadline="2025-08-21T15:00:00+02:00")
+
+
+async def test_schedule_loads(hass: HomeAssistant, config_entry: MockConfigEntry):
+    """Test that the schedules of all loads are returned as response data."""
+    response: Any = await hass.services.async_call(
+        DOMAIN,
+        SERVICE_SCHEDULE_LOADS,
+        {
+            "config_entry_id": config_entry.entry_id,
+            "grid_limit": 1.0,
+            "loads": [
+                {
+                    "name": "car",
+                    "energy": 1.0,
+                    "power": 1.0,
+                    "start": "2025-08-21T12:00:00+02:00",
+                    "deadline": "2025-08-21T15:00:00+02:00",
+                },
+                {
+                    "name": "heat pump",
+                    "energy": 1.0,
+                    "power": 1.0,
+                    "start": "2025-08-21T12:00:00+02:00",
+                    "deadline": "2025-08-21T13:00:00+02:00",
+                },
+            ],
+        },
+        blocking=True,
+        return_response=True,
+    )
+
+    assert response is not None
+    car, heat_pump = response["loads"]
+    assert [slot["price"] for slot in heat_pump["slots"]] == [0.10]
+    assert [slot["price"] for slot in car["slots"]] == [0.15]
+    assert response["missing"] == 0.0
+
+
+async def test_optimize_battery(hass: HomeAssistant, config_entry: MockConfigEntry):
+    """Test that the battery schedule from the current slot on is returned as response data."""
+    now = datetime.datetime(2025, 8, 21, 12, 30, tzinfo=ZoneInfo("Europe/Berlin"))
+    data = {
+        "config_entry_id": config_entry.entry_id,
+        "capacity": 1.0,
+        "soc": 0.0,
+        "charge_power": 1.0,
+        "efficiency": 1.0,
+        "soc_steps": 4,
+    }
+    with patch("custom_components.delayed_charging.service.datetime.datetime", wraps=datetime.datetime) as mock_datetime:
+        mock_datetime.now.return_value = now
+        response: Any = await hass.services.async_call(
+            DOMAIN, SERVICE_OPTIMIZE_BATTERY, data, blocking=True, return_response=True
+        )
+        with pytest.raises(ServiceValidationError):
+            await hass.services.async_call(
+                DOMAIN, SERVICE_OPTIMIZE_BATTERY, data | {"final_soc": 5.0}, blocking=True, return_response=True
+            )
+
+    assert response is not None
+    assert [slot["power"] for slot in response["slots"]] == [1.0, 0.0, -1.0]
+    assert [slot["soc"] for slot in response["slots"]] == [1.0, 1.0, 0.0]
+    assert math.isclose(response["profit"], (0.20 - 0.10) / 1000)
@@ -1,14 +1,31 @@
 """Tests for smard.py module."""
 
-from datetime import datetime
-from typing import cast
+import asyncio
+import json
+import time
+from collections.abc import AsyncIterator
+from datetime import datetime, timedelta
+from typing import Any, cast
 from unittest.mock import AsyncMock, MagicMock, patch
 from zoneinfo import ZoneInfo
 
 import pytest
-from aiohttp import ClientError, ClientPayloadError, web
-
-from custom_components.delayed_charging.smard import get_pricing_info
+from aiohttp import ClientError, ClientPayloadError, ClientResponseError, web
+
+from custom_components.delayed_charging.cache import CacheEntry, SmardCache
+from custom_components.delayed_charging.smard import (
+    SMARD_COUNTRIES,
+    SeriesDecoder,
+    SmardError,
+    close_session,
+    find_chunk,
+    find_chunks,
+    get_price_range,
+    get_pricing_info,
+    get_pricing_info_many,
+    get_session,
+    slice_series,
+)
 
 # We pretend the system tz to be Central European (Summer) Time
 CONSTANT_SYSTEM_TZ = ZoneInfo("Europe/Berlin")
@@ -36,6 +53,64 @@ TIMESERIES_EMPTY = {"series": cast(list[tuple[int, float]], [])}
 INVALID_JSON = web.Response(text="Invalid JSON")
 
 
+def mock_stream(payload: dict[str, Any], chunk_size: int = 7) -> MagicMock:
+    """Mock `response.content` streaming a JSON encoded payload in small pieces."""
+    body = json.dumps(payload).encode()
+
+    async def iter_chunked(n: int) -> AsyncIterator[bytes]:
+        for i in range(0, len(body), chunk_size):
+            yield body[i : i + chunk_size]
+
+    content = MagicMock()
+    content.iter_chunked = iter_chunked
+    return content
+
+
+class SmardMock:
+    """Stand-in for `aiohttp.ClientSession.get` serving an index file and chunk files by URL."""
+
+    def __init__(
+        self,
+        index: dict[str, Any] | web.Response = TIMESTAMPS_HAPPY,
+        chunks: dict[int, dict[str, Any]] | None = None,
+        status: int = 200,
+        headers: dict[str, str] | None = None,
+        chunk_status: dict[int, int] | None = None,
+    ):
+        self.index = index
+        self.chunks = {1753657200000: TIMESERIES_HAPPY} if chunks is None else chunks
+        self.status = status
+        # status of single chunk files, overriding `status`
+        self.chunk_status = chunk_status or {}
+        self.headers = headers or {}
+        self.requests: list[tuple[str, dict[str, str]]] = []
+
+    def __call__(self, url: str, headers: dict[str, str] | None = None, **kwargs: Any) -> AsyncMock:
+        self.requests.append((url, headers or {}))
+        response = AsyncMock()
+        response.__aenter__.return_value = response
+        response.status = self.status
+        response.headers = self.headers
+        if url.endswith("index_quarterhour.json"):
+            response.json.return_value = self.index
+        else:
+            chunk_ts = int(url.removesuffix(".json").rsplit("_", 1)[1])
+            response.status = self.chunk_status.get(chunk_ts, self.status)
+            payload = self.chunks.get(chunk_ts, TIMESERIES_EMPTY)
+            response.json.return_value = payload
+            response.content = mock_stream(payload)
+        error = ClientResponseError(MagicMock(), (), status=response.status) if response.status >= 400 else None
+        response.raise_for_status = MagicMock(side_effect=error)
+        return response
+
+
+@pytest.fixture(autouse=True)
+async def pooled_session():
+    """Close the pooled session after each test."""
+    yield
+    await close_session()
+
+
 @pytest.fixture
 def mock_datetime_now():
     real_datetime_class = datetime
@@ -51,11 +126,7 @@ def mock_datetime_now():
 async def test_get_pricing_info_success(mock_datetime_now: MagicMock):
     """Test successful API calls."""
 
-    mock_response = AsyncMock()
-    mock_response.__aenter__.return_value = mock_response
-    mock_response.json.side_effect = [TIMESTAMPS_HAPPY, TIMESERIES_HAPPY]
-
-    with patch("aiohttp.ClientSession.get", return_value=mock_response):
+    with patch("aiohttp.ClientSession.get", side_effect=SmardMock()):
         result = await get_pricing_info("4169")
 
         assert len(result) == 3
@@ -70,40 +141,28 @@ async def test_get_pricing_info_success(mock_datetime_now: MagicMock):
 async def test_get_pricing_info_invalid_country(mock_datetime_now: MagicMock):
     """Test with invalid country."""
     result = await get_pricing_info("InvalidCountry")
-    assert result == []
+    assert len(result) == 0
 
 
 async def test_get_pricing_info_empty_timestamps(mock_datetime_now: MagicMock):
     """Test with empty timestamp response."""
-    mock_response = AsyncMock()
-    mock_response.__aenter__.return_value = mock_response
-    mock_response.json.return_value = TIMESTAMPS_EMPTY
-
-    with patch("aiohttp.ClientSession.get", return_value=mock_response):
+    with patch("aiohttp.ClientSession.get", side_effect=SmardMock(index=TIMESTAMPS_EMPTY)):
         result = await get_pricing_info("4169")
-        assert result == []
+        assert len(result) == 0
 
 
 async def test_get_pricing_info_empty_timeseries(mock_datetime_now: MagicMock):
     """Test with empty timeseries response."""
-    mock_response = AsyncMock()
-    mock_response.__aenter__.return_value = mock_response
-    mock_response.json.side_effect = [TIMESTAMPS_HAPPY, TIMESERIES_EMPTY]
-
-    with patch("aiohttp.ClientSession.get", return_value=mock_response):
+    with patch("aiohttp.ClientSession.get", side_effect=SmardMock(chunks={})):
         result = await get_pricing_info("4169")
-        assert result == []
+        assert len(result) == 0
 
 
 async def test_get_pricing_info_invalid_json(mock_datetime_now: MagicMock):
     """Test with invalid JSON response."""
-    mock_response = AsyncMock()
-    mock_response.__aenter__.return_value = mock_response
-    mock_response.json.side_effect = [INVALID_JSON, INVALID_JSON]
-
-    with patch("aiohttp.ClientSession.get", return_value=mock_response):
+    with patch("aiohttp.ClientSession.get", side_effect=SmardMock(index=INVALID_JSON)):
         result = await get_pricing_info("4169")
-        assert result == []
+        assert len(result) == 0
 
 
 async def test_get_pricing_info_client_error(mock_datetime_now: MagicMock):
@@ -113,7 +172,7 @@ async def test_get_pricing_info_client_error(mock_datetime_now: MagicMock):
 
     with patch("aiohttp.ClientSession.get", return_value=mock_response):
         result = await get_pricing_info("4169")
-        assert result == []
+        assert len(result) == 0
 
 
 async def test_get_pricing_info_payload_error(mock_datetime_now: MagicMock):
@@ -123,4 +182,239 @@ async def test_get_pricing_info_payload_error(mock_datetime_now: MagicMock):
 
     with patch("aiohttp.ClientSession.get", return_value=mock_response):
         result = await get_pricing_info("4169")
-        assert result == []
+        assert len(result) == 0
+
+
+async def test_get_pricing_info_revalidates_cache(mock_datetime_now: MagicMock):
+    """Test that stale cache entries are revalidated and reused on 304 Not Modified."""
+    cache = SmardCache()
+    await cache.async_put(("4169", "quarterhour", None), CacheEntry(data=TIMESTAMPS_HAPPY, fetched_at=0.0, etag='"index"'))
+    await cache.async_put(
+        ("4169", "quarterhour", 1753570800000),
+        CacheEntry(data=TIMESERIES_EMPTY, fetched_at=0.0, etag='"chunk"'),
+    )
+    await cache.async_put(
+        ("4169", "quarterhour", 1753657200000),
+        CacheEntry(data=TIMESERIES_HAPPY, fetched_at=0.0, last_modified="Mon, 28 Jul 2025 08:00:00 GMT"),
+    )
+    smard = SmardMock(status=304, index={}, chunks={})
+
+    with patch("aiohttp.ClientSession.get", side_effect=smard):
+        result = await get_pricing_info("4169", cache=cache)
+
+    assert [price for _, price in result] == [15.0, 12.0, 18.0]
+    assert dict(smard.requests) == {
+        "https://www.smard.de/app/chart_data/4169/DE/index_quarterhour.json": {"If-None-Match": '"index"'},
+        "https://www.smard.de/app/chart_data/4169/DE/4169_DE_quarterhour_1753570800000.json": {"If-None-Match": '"chunk"'},
+        "https://www.smard.de/app/chart_data/4169/DE/4169_DE_quarterhour_1753657200000.json": {
+            "If-Modified-Since": "Mon, 28 Jul 2025 08:00:00 GMT"
+        },
+    }
+
+
+async def test_get_pricing_info_serves_fresh_cache(mock_datetime_now: MagicMock):
+    """Test that fresh cache entries are served without any request."""
+    cache = SmardCache()
+    await cache.async_put(("4169", "quarterhour", None), CacheEntry(data=TIMESTAMPS_HAPPY, fetched_at=time.time()))
+    await cache.async_put(("4169", "quarterhour", 1753570800000), CacheEntry(data=TIMESERIES_EMPTY, fetched_at=time.time()))
+    await cache.async_put(("4169", "quarterhour", 1753657200000), CacheEntry(data=TIMESERIES_HAPPY, fetched_at=time.time()))
+
+    with patch("aiohttp.ClientSession.get") as mock_get:
+        result = await get_pricing_info("4169", cache=cache)
+
+        assert len(result) == 3
+        mock_get.assert_not_called()
+
+
+async def test_get_pricing_info_fills_cache(mock_datetime_now: MagicMock):
+    """Test that downloaded files are stored with their validators."""
+    cache = SmardCache()
+
+    with patch("aiohttp.ClientSession.get", side_effect=SmardMock(headers={"ETag": '"v1"'})):
+        await get_pricing_info("4169", cache=cache)
+
+    entry = await cache.async_get(("4169", "quarterhour", 1753657200000))
+    assert entry is not None
+    assert entry.data == TIMESERIES_HAPPY
+    assert entry.etag == '"v1"'
+
+
+async def test_get_price_range_rejects_error_status(mock_datetime_now: MagicMock):
+    """Test that an error page of SMARD fails the fetch instead of being cached or decoded as no prices."""
+    cache = SmardCache()
+    start = datetime(2025, 7, 28, 0, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
+    end = datetime(2025, 7, 28, 2, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
+
+    with patch("aiohttp.ClientSession.get", side_effect=SmardMock(chunk_status={1753657200000: 500})):
+        with pytest.raises(ClientResponseError):
+            await get_price_range("4169", start, end, cache=cache)
+        with pytest.raises(ClientResponseError):
+            await get_price_range("4169", start, end)
+        results = await get_pricing_info_many(["4169"], start, end)
+
+    assert await cache.async_get(("4169", "quarterhour", 1753657200000)) is None
+    assert isinstance(results["4169"].error, ClientResponseError)
+    assert len(results["4169"].prices) == 0
+
+    cache = SmardCache()
+    with patch("aiohttp.ClientSession.get", side_effect=SmardMock(status=404)):
+        with pytest.raises(ClientResponseError):
+            await get_price_range("4169", start, end, cache=cache)
+
+    assert await cache.async_get(("4169", "quarterhour", None)) is None
+
+
+async def test_get_pricing_info_reuses_pooled_session(mock_datetime_now: MagicMock):
+    """Test that consecutive calls share one pooled session."""
+    session = get_session()
+
+    with patch("aiohttp.ClientSession.get", side_effect=SmardMock()):
+        await get_pricing_info("4169")
+        await get_pricing_info("4169")
+
+    assert get_session() is session
+    assert not session.closed
+
+    await close_session()
+    assert session.closed
+    assert get_session() is not session
+
+
+async def test_get_pricing_info_injected_session(mock_datetime_now: MagicMock):
+    """Test that an injected session is used instead of the pooled one."""
+    session = MagicMock()
+    session.get.side_effect = SmardMock()
+
+    result = await get_pricing_info("4169", session=session)
+
+    assert len(result) == 3
+    assert session.get.call_count == 3
+    session.close.assert_not_called()
+
+
+async def test_get_pricing_info_rolling_window(mock_datetime_now: MagicMock):
+    """Test that a lookback window includes yesterday and tomorrow's day-ahead prices across chunks."""
+    smard = SmardMock(
+        chunks={
+            1753570800000: {"series": [[1753567200000, 1.0], [1753606800000, 2.0], [1753653600000, 3.0]]},
+            1753657200000: {"series": [[1753657200000, 4.0], [1753743600000, 5.0], [1753830000000, 6.0]]},
+        }
+    )
+
+    with patch("aiohttp.ClientSession.get", side_effect=smard):
+        result = await get_pricing_info("4169", lookback=timedelta(hours=24))
+
+    # 2025-07-27 10:15 until 2025-07-30 00:00
+    assert [price for _, price in result] == [2.0, 3.0, 4.0, 5.0]
+    assert result[-1][0] == datetime(2025, 7, 29, 1, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
+    assert len(smard.requests) == 3
+
+
+async def test_get_pricing_info_many(mock_datetime_now: MagicMock):
+    """Test fetching several zones concurrently with per-zone errors."""
+    smard = SmardMock()
+    start = datetime(2025, 7, 28, 0, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
+    end = datetime(2025, 7, 28, 2, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
+
+    with patch("aiohttp.ClientSession.get", side_effect=smard):
+        results = await get_pricing_info_many(["4169", "254", "InvalidCountry", "4169"], start, end, max_concurrency=2)
+
+    assert list(results) == ["4169", "254", "InvalidCountry"]
+    assert [price for _, price in results["4169"].prices] == [15.0]
+    assert results["254"].error is None
+    assert len(results["254"].prices) == 1
+    assert isinstance(results["InvalidCountry"].error, SmardError)
+    assert len(results["InvalidCountry"].prices) == 0
+    # one index and two chunk requests per valid zone
+    assert len(smard.requests) == 6
+
+
+async def test_get_pricing_info_many_bounded_concurrency(mock_datetime_now: MagicMock):
+    """Test that no more than `max_concurrency` zones are fetched at once."""
+    running = 0
+    max_running = 0
+
+    async def fake_get_price_range(*args: Any, **kwargs: Any) -> list[tuple[datetime, float]]:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return []
+
+    start = datetime(2025, 7, 28, 0, 0, 0, tzinfo=CONSTANT_SYSTEM_TZ)
+    with patch("custom_components.delayed_charging.smard.get_price_range", side_effect=fake_get_price_range):
+        results = await get_pricing_info_many(SMARD_COUNTRIES, start, start, max_concurrency=3)
+
+    assert len(results) == len(SMARD_COUNTRIES)
+    assert max_running == 3
+
+
+def test_find_chunk():
+    """Test bisection for the chunk containing a timestamp."""
+    timestamps = TIMESTAMPS_HAPPY["timestamps"]
+
+    assert find_chunk(timestamps, 1753484400000 - 1) is None
+    assert find_chunk(timestamps, 1753484400000) == 1753484400000
+    assert find_chunk(timestamps, 1753570800000 - 1) == 1753484400000
+    assert find_chunk(timestamps, 1753657200000 + 10**9) == 1753657200000
+    assert find_chunk([], 1753484400000) is None
+
+
+def test_find_chunks():
+    """Test the lookup of all chunks overlapping a range."""
+    timestamps = TIMESTAMPS_HAPPY["timestamps"]
+
+    assert find_chunks(timestamps, 1753484400000, 1753570800000) == [1753484400000]
+    assert find_chunks(timestamps, 1753484400000 + 1, 1753570800000 + 1) == [1753484400000, 1753570800000]
+    assert find_chunks(timestamps, 0, 10**14) == timestamps
+    assert find_chunks(timestamps, 1753657200000 + 1, 10**14) == [1753657200000]
+    assert find_chunks(timestamps, 0, 1753484400000) == []
+    assert find_chunks(timestamps, 1753570800000, 1753570800000) == []
+
+
+CHUNK_BODY = (
+    b'{"meta_data":{"version":1,"created":1753700000000},\n"series":[ [1753653600000,20.5],'
+    b"[1753657200000, -1.25e1],[1753660800000,null],\n[1753664400000,18],[1753668000000,17.0] ]}"
+)
+
+
+@pytest.mark.parametrize("piece_size", [1, 3, 16, len(CHUNK_BODY)])
+def test_series_decoder(piece_size: int):
+    """Test that the decoder extracts the window regardless of how the body is split."""
+    decoder = SeriesDecoder(start=1753657200000, end=1753668000000)
+    for i in range(0, len(CHUNK_BODY), piece_size):
+        decoder.feed(CHUNK_BODY[i : i + piece_size])
+
+    assert decoder.series == [[1753657200000, -12.5], [1753664400000, 18.0]]
+    assert decoder.done
+
+
+def test_series_decoder_stops_after_window():
+    """Test that decoding stops once the window is passed."""
+    decoder = SeriesDecoder(end=1753660800000)
+    decoder.feed(CHUNK_BODY[:130])
+    assert decoder.done
+    assert decoder.series == [[1753653600000, 20.5], [1753657200000, -12.5]]
+
+    decoder.feed(b"[1753600000000,1.0]")
+    assert len(decoder.series) == 2
+
+
+def test_series_decoder_without_window():
+    """Test that the whole series is decoded without window and the end of the array is detected."""
+    decoder = SeriesDecoder()
+    decoder.feed(CHUNK_BODY[:-3])
+    assert not decoder.done
+    decoder.feed(CHUNK_BODY[-3:])
+    assert decoder.done
+    assert [ts for ts, _ in decoder.series] == [1753653600000, 1753657200000, 1753664400000, 1753668000000]
+
+
+def test_slice_series():
+    """Test slicing a sorted series by an epoch range."""
+    series = TIMESERIES_HAPPY["series"]
+
+    assert slice_series(series, 1753657200000, 1753664400000) == series[:2]
+    assert slice_series(series, 1753657200001, 10**14) == series[1:]
+    assert slice_series(series, 0, 1753657200000) == []
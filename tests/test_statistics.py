@@ -0,0 +1,78 @@
+"""Tests for statistics.py module."""
+
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pytest
+from homeassistant.components.recorder.core import Recorder
+from homeassistant.components.recorder.statistics import get_last_statistics, statistics_during_period
+from homeassistant.core import HomeAssistant
+from pytest_homeassistant_custom_component.components.recorder.common import async_wait_recording_done
+from pytest_homeassistant_custom_component.typing import RecorderInstanceGenerator
+
+from custom_components.delayed_charging.service import RESOLUTION_MS, PriceSeries, ts2dt
+from custom_components.delayed_charging.statistics import PriceStatistics, hourly_statistics
+from custom_components.delayed_charging.store import PriceStore
+
+MIDNIGHT = 1753653600000  # 2025-07-28 00:00:00 (CEST)
+QUARTER_HOUR = RESOLUTION_MS["quarterhour"]
+
+
+@pytest.fixture
+async def mock_recorder_before_hass(async_setup_recorder_instance: RecorderInstanceGenerator) -> None:
+    """Set up the recorder before hass, as the custom integrations fixture needs hass."""
+
+
+def quarter_hours(first: int, count: int) -> PriceSeries:
+    """Quarter hours from `first` on, priced by their index since midnight."""
+    return PriceSeries(
+        [MIDNIGHT + i * QUARTER_HOUR for i in range(first, first + count)], [float(i) for i in range(first, first + count)]
+    )
+
+
+def test_hourly_statistics():
+    """Test that complete hours are aggregated and incomplete ones left out."""
+    series = quarter_hours(2, 10)
+
+    statistics = hourly_statistics(np.asarray(series.timestamps), np.asarray(series.prices), QUARTER_HOUR)
+
+    assert [row.get("start") for row in statistics] == [ts2dt(MIDNIGHT + 3_600_000), ts2dt(MIDNIGHT + 7_200_000)]
+    assert [(row.get("mean"), row.get("min"), row.get("max")) for row in statistics] == [(5.5, 4.0, 7.0), (9.5, 8.0, 11.0)]
+
+
+async def test_import_fills_in_history_once(recorder_mock: Recorder, hass: HomeAssistant, tmp_path: Path):
+    """Test that the history is imported on first use and later imports only add new hours."""
+    store = PriceStore(str(tmp_path), "4169")
+    history = quarter_hours(0, 96)
+    store.append(history.timestamps, history.prices)
+    importer = PriceStatistics(hass, "4169", partial(PriceStore, str(tmp_path), "4169"))
+
+    assert await importer.async_import(quarter_hours(88, 16)) == 26
+    assert await importer.async_import(quarter_hours(88, 16)) == 0
+    await async_wait_recording_done(hass)
+
+    # a new importer, e.g. after a restart, continues after the last imported hour
+    restarted = PriceStatistics(hass, "4169", partial(PriceStore, str(tmp_path), "4169"))
+    assert await restarted.async_import(quarter_hours(96, 12)) == 1
+    await async_wait_recording_done(hass)
+
+    statistics = await recorder_mock.async_add_executor_job(
+        statistics_during_period, hass, ts2dt(MIDNIGHT), None, {importer.statistic_id}, "hour", None, {"mean", "max"}
+    )
+    rows = statistics[importer.statistic_id]
+    assert len(rows) == 27
+    assert rows[0].get("mean") == 1.5
+    assert rows[-1].get("max") == 107.0
+    last = await recorder_mock.async_add_executor_job(get_last_statistics, hass, 1, importer.statistic_id, False, {"mean"})
+    assert last[importer.statistic_id][0].get("start") == (MIDNIGHT + 26 * 3_600_000) / 1000
+
+
+async def test_import_skips_hours_that_have_not_ended(recorder_mock: Recorder, hass: HomeAssistant, tmp_path: Path):
+    """Test that day-ahead hours are only imported once they have ended."""
+    importer = PriceStatistics(hass, "4169", partial(PriceStore, str(tmp_path), "4169"))
+    series = quarter_hours(0, 96)
+
+    assert await importer.async_import(series, now=ts2dt(MIDNIGHT + 2 * 3_600_000 + 600_000)) == 2
+    assert await importer.async_import(series, now=ts2dt(MIDNIGHT + 2 * 3_600_000 + 1_200_000)) == 0
+    assert await importer.async_import(series, now=ts2dt(MIDNIGHT + 3 * 3_600_000)) == 1
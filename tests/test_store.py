@@ -0,0 +1,104 @@
+"""Tests for store.py module."""
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from custom_components.delayed_charging.store import PriceStore
+
+QUARTER_HOUR = 15 * 60 * 1000
+START = 1753653600000  # 2025-07-28 00:00:00 (CEST)
+
+
+def test_store_append_and_range(tmp_path: Path):
+    """Test range queries on a contiguous series."""
+    store = PriceStore(str(tmp_path), "4169")
+    timestamps = [START + i * QUARTER_HOUR for i in range(96)]
+    prices = [float(i) for i in range(96)]
+
+    assert store.append(timestamps, prices) == 96
+    assert len(store) == 96
+
+    ts, values = store.range(START + 4 * QUARTER_HOUR, START + 8 * QUARTER_HOUR)
+    assert ts.tolist() == timestamps[4:8]
+    assert values.tolist() == prices[4:8]
+
+    # boundaries between slots, before and after the stored data
+    assert store.range(START + 4 * QUARTER_HOUR + 1, START + 5 * QUARTER_HOUR + 1)[1].tolist() == [5.0]
+    assert store.range(START - 10 * QUARTER_HOUR, START + QUARTER_HOUR)[1].tolist() == [0.0]
+    assert len(store.range(START + 100 * QUARTER_HOUR, START + 200 * QUARTER_HOUR)[0]) == 0
+    assert len(store.range(START + 8 * QUARTER_HOUR, START + 4 * QUARTER_HOUR)[0]) == 0
+
+
+def test_store_range_is_zero_copy(tmp_path: Path):
+    """Test that range queries are views on the memory-mapped files."""
+    store = PriceStore(str(tmp_path), "4169")
+    store.append([START + i * QUARTER_HOUR for i in range(10)], [1.0] * 10)
+
+    ts, values = store.range(START, START + 5 * QUARTER_HOUR)
+
+    assert isinstance(ts.base, np.memmap) or isinstance(ts, np.memmap)
+    assert not values.flags.writeable
+    assert np.shares_memory(values, store.range(START, START + 10 * QUARTER_HOUR)[1])
+
+
+def test_store_with_gaps(tmp_path: Path):
+    """Test range queries and appends on a series with gaps."""
+    store = PriceStore(str(tmp_path), "4169")
+    store.append([START, START + QUARTER_HOUR], [1.0, 2.0])
+    store.append([START + QUARTER_HOUR, START + 10 * QUARTER_HOUR, START + 11 * QUARTER_HOUR], [9.0, 3.0, 4.0])
+
+    assert len(store) == 4
+    assert store.range(START + QUARTER_HOUR, START + 11 * QUARTER_HOUR)[1].tolist() == [2.0, 3.0]
+    assert store.last_timestamp == START + 11 * QUARTER_HOUR
+
+
+def test_store_persists(tmp_path: Path):
+    """Test that a new store on the same directory sees the data."""
+    PriceStore(str(tmp_path), "4169", "hour").append([START], [42.0])
+
+    assert PriceStore(str(tmp_path), "4169", "hour").range(START, START + 1)[1].tolist() == [42.0]
+    assert len(PriceStore(str(tmp_path), "4169")) == 0
+    assert len(PriceStore(str(tmp_path), "254", "hour")) == 0
+
+
+def test_store_recovers_from_interrupted_append(tmp_path: Path):
+    """Test that a price without timestamp left by an interrupted append is dropped."""
+    store = PriceStore(str(tmp_path), "4169")
+    store.append([START], [1.0])
+    with open(os.path.join(tmp_path, "4169", "quarterhour", "prices.f8"), "ab") as file:
+        file.write(np.array([99.0]).tobytes())
+
+    store = PriceStore(str(tmp_path), "4169")
+    assert len(store) == 1
+    store.append([START + QUARTER_HOUR], [2.0])
+    assert store.range(START, START + 2 * QUARTER_HOUR)[1].tolist() == [1.0, 2.0]
+
+
+def test_store_rejects_foreign_files(tmp_path: Path):
+    """Test that files of another resolution are not misread."""
+    PriceStore(str(tmp_path), "4169").append([START], [1.0])
+    os.rename(os.path.join(tmp_path, "4169", "quarterhour"), os.path.join(tmp_path, "4169", "hour"))
+
+    with pytest.raises(ValueError):
+        len(PriceStore(str(tmp_path), "4169", "hour"))
+    with pytest.raises(ValueError):
+        PriceStore(str(tmp_path), "4169", "day")
+
+
+def test_store_import_chunk_files(tmp_path: Path):
+    """Test importing the chunk files of a backfill."""
+    chunk_directory = tmp_path / "backfill" / "4169" / "quarterhour"
+    chunk_directory.mkdir(parents=True)
+    (chunk_directory / f"{START + 96 * QUARTER_HOUR}.json").write_text(
+        json.dumps({"series": [[START + 96 * QUARTER_HOUR, 3.0], [START + 97 * QUARTER_HOUR, None]]})
+    )
+    (chunk_directory / f"{START}.json").write_text(json.dumps({"series": [[START, 1.0], [START + QUARTER_HOUR, 2.0]]}))
+    store = PriceStore(str(tmp_path / "store"), "4169")
+
+    assert store.import_chunk_files(str(tmp_path / "backfill")) == 3
+    assert store.range(START, START + 100 * QUARTER_HOUR)[1].tolist() == [1.0, 2.0, 3.0]
+    assert store.import_chunk_files(str(tmp_path / "backfill")) == 0